@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Колоночный архив ТЖ 1С в Parquet
+
+convert - преобразует каталоги, полученные tj_unpack.sh (<процесс>_<PID>/ГГММДДЧЧ.log),
+в Parquet с разбиением date=ГГГГ-ММ-ДД/hour=ЧЧ/process=<тип процесса>.
+Часто повторяющиеся поля (event, Context, Usr...) хранятся со словарным кодированием.
+Уже преобразованные файлы (тот же размер и время изменения) пропускаются.
+
+query - читает только нужные колонки, условия по разбиению и колонкам
+передаются в pyarrow и отсекают лишние файлы и группы строк.
+
+Требует pyarrow (и pandas для вывода результатов запроса).
+"""
+
+import os
+import sys
+import json
+import re
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.dataset as ds
+import pyarrow.compute as pc
+from tj_parser import iter_file_events, find_log_files, split_process_dir, parse_file_hour
+
+# Файл со списком преобразованных файлов (имена на _ pyarrow не читает как данные)
+MANIFEST_NAME = '_manifest.json'
+
+# Количество событий в группе строк Parquet
+ROW_GROUP_SIZE = 100000
+
+# Строковые свойства, выносимые в отдельные колонки
+STRING_PROPERTIES = [
+    'Context', 'Usr', 'p:processName', 't:applicationName', 't:computerName',
+    'SessionID', 'Sql', 'Descr', 'Regions', 'Locks', 'WaitConnections',
+]
+
+# Числовые свойства, выносимые в отдельные колонки
+INT_PROPERTIES = [
+    't:clientID', 't:connectID', 'Memory', 'MemoryPeak', 'InBytes', 'OutBytes', 'CpuTime', 'Rows', 'RowsAffected',
+]
+
+# Колонки со словарным кодированием
+DICTIONARY_COLUMNS = ['event', 'pid_dir', 'Context', 'Usr', 'p:processName', 't:applicationName', 't:computerName']
+
+# Разбиение архива
+PARTITIONING = ds.partitioning(
+    pa.schema([('date', pa.string()), ('hour', pa.int8()), ('process', pa.string())]),
+    flavor='hive'
+)
+
+def archive_schema():
+    fields = [
+        ('timestamp', pa.timestamp('us')),
+        ('duration', pa.int64()),
+        ('event', pa.dictionary(pa.int32(), pa.string())),
+        ('level', pa.int16()),
+        ('pid', pa.int32()),
+        ('pid_dir', pa.dictionary(pa.int32(), pa.string())),
+    ]
+    for name in STRING_PROPERTIES:
+        value_type = pa.dictionary(pa.int32(), pa.string()) if name in DICTIONARY_COLUMNS else pa.string()
+        fields.append((name, value_type))
+    fields.extend((name, pa.int64()) for name in INT_PROPERTIES)
+    fields.append(('properties', pa.string()))   # исходный текст свойств события
+    return pa.schema(fields)
+
+SCHEMA = archive_schema()
+
+# ============================================================================
+# Манифест
+# ============================================================================
+def load_manifest(archive):
+    path = os.path.join(archive, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_manifest(archive, manifest):
+    """
+    Атомарная запись манифеста (через временный файл)
+    """
+    path = os.path.join(archive, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+def source_signature(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def partition_path(archive, path):
+    """
+    Файл Parquet для исходного файла ТЖ: date=.../hour=.../process=.../<процесс>_<PID>.parquet
+    :return: Путь или None, если имя файла не в формате ГГММДДЧЧ.log
+    """
+    hour = parse_file_hour(path)
+    if hour is None:
+        return None
+    process_type, _ = split_process_dir(path)
+    pid_dir = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    return os.path.join(
+        archive, f"date={hour:%Y-%m-%d}", f"hour={hour.hour}", f"process={process_type}", f"{pid_dir}.parquet"
+    )
+
+# ============================================================================
+# Преобразование
+# ============================================================================
+def new_batch():
+    return {field.name: [] for field in SCHEMA}
+
+def append_event(batch, event, pid, pid_dir):
+    properties = event.properties
+    batch['timestamp'].append(event.timestamp)
+    batch['duration'].append(event.duration)
+    batch['event'].append(event.name)
+    batch['level'].append(event.level)
+    batch['pid'].append(pid)
+    batch['pid_dir'].append(pid_dir)
+    for name in STRING_PROPERTIES:
+        batch[name].append(properties.get(name))
+    for name in INT_PROPERTIES:
+        value = properties.get(name)
+        try:
+            batch[name].append(int(value) if value else None)
+        except ValueError:
+            batch[name].append(None)
+    batch['properties'].append(event.raw.rstrip(b'\r\n').decode('utf-8', 'replace'))
+
+def convert_file(path, target, compression='zstd'):
+    """
+    Преобразует один файл ТЖ в Parquet (запись во временный файл и переименование)
+    :return: Количество событий
+    """
+    _, pid = split_process_dir(path)
+    pid_dir = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_path = os.path.join(os.path.dirname(target), '.' + os.path.basename(target) + '.tmp')
+
+    event_count = 0
+    batch = new_batch()
+    with pq.ParquetWriter(tmp_path, SCHEMA, compression=compression, use_dictionary=DICTIONARY_COLUMNS) as writer:
+        for event in iter_file_events(path):
+            append_event(batch, event, pid, pid_dir)
+            event_count += 1
+            if len(batch['event']) >= ROW_GROUP_SIZE:
+                writer.write_batch(pa.RecordBatch.from_pydict(batch, schema=SCHEMA))
+                batch = new_batch()
+        if batch['event'] or not event_count:
+            writer.write_batch(pa.RecordBatch.from_pydict(batch, schema=SCHEMA))
+
+    os.replace(tmp_path, target)
+    return event_count
+
+def convert_tree(root, archive, pattern='*/*.log', workers=None, force=False):
+    """
+    Инкрементальное преобразование каталога ТЖ в архив Parquet
+    :param root: Каталог с логами ТЖ
+    :param archive: Каталог архива
+    :param force: Преобразовать заново все файлы
+    :return: Кортеж (преобразовано файлов, пропущено, событий записано)
+    """
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+    os.makedirs(archive, exist_ok=True)
+    manifest = load_manifest(archive)
+
+    tasks = []
+    skipped = 0
+    for path in find_log_files(root, pattern):
+        target = partition_path(archive, path)
+        if target is None:
+            print(f"Пропущен файл с именем не в формате ГГММДДЧЧ.log: {path}", file=sys.stderr)
+            continue
+        key = os.path.abspath(path)
+        signature = source_signature(path)
+        entry = manifest.get(key)
+        if not force and entry and entry['size'] == signature['size'] \
+                and entry['mtime_ns'] == signature['mtime_ns'] and os.path.exists(entry['part']):
+            skipped += 1
+            continue
+        tasks.append((key, target, signature))
+
+    converted = 0
+    event_count = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(convert_file, key, target): (key, target, signature)
+                   for key, target, signature in sorted(tasks, key=lambda t: -t[2]['size'])}
+        for future in as_completed(futures):
+            key, target, signature = futures[future]
+            try:
+                count = future.result()
+            except Exception as e:
+                print(f"Ошибка преобразования {key}: {e}", file=sys.stderr)
+                continue
+            manifest[key] = dict(signature, part=target, events=count)
+            converted += 1
+            event_count += count
+            # Манифест сохраняется после каждого файла, прерванный запуск продолжится с места остановки
+            save_manifest(archive, manifest)
+            print(f"\rПреобразовано {converted}/{len(tasks)} файлов", end='', file=sys.stderr)
+
+    if tasks:
+        print(file=sys.stderr)
+    return converted, skipped, event_count
+
+# ============================================================================
+# Запросы
+# ============================================================================
+# колонка, оператор (двухсимвольные раньше односимвольных), значение - как есть (может содержать = < > ! ~)
+CONDITION_PATTERN = re.compile(r'^\s*([^\s=!<>~]+)\s*(>=|<=|!=|=|>|<|~)\s*(.*)$', re.DOTALL)
+
+# Колонки, доступные в условиях (включая колонки разбиения)
+CONDITION_COLUMNS = set(SCHEMA.names) | set(PARTITIONING.schema.names)
+
+def parse_condition(expression):
+    """
+    Условие вида колонка<оператор>значение, операторы: = != > >= < <= ~ (regex)
+    Оператор - первый после имени колонки, в значении операторные символы допустимы
+    :return: Выражение pyarrow.dataset
+    """
+    match = CONDITION_PATTERN.match(expression)
+    if not match:
+        raise ValueError(f"Неверное условие: {expression}")
+    name, operator, value = match.groups()
+    if name not in CONDITION_COLUMNS:
+        raise ValueError(f"Неизвестная колонка в условии {expression!r}: {name}")
+
+    field = ds.field(name)
+    if operator == '~':
+        return pc.match_substring_regex(field, value, ignore_case=True)
+
+    if name in INT_PROPERTIES or name in ('duration', 'level', 'pid', 'hour'):
+        value = int(value)
+    elif name == 'timestamp':
+        value = pa.scalar(value).cast(pa.timestamp('us'))
+
+    return {
+        '=': field == value, '!=': field != value,
+        '>': field > value, '>=': field >= value,
+        '<': field < value, '<=': field <= value,
+    }[operator]
+
+def build_filter(conditions=None, date_from=None, date_to=None, events=None):
+    expressions = [parse_condition(condition) for condition in conditions or []]
+    if date_from:
+        expressions.append(ds.field('date') >= date_from)
+    if date_to:
+        expressions.append(ds.field('date') <= date_to)
+    if events:
+        expressions.append(ds.field('event').isin(list(events)))
+    if not expressions:
+        return None
+    result = expressions[0]
+    for expression in expressions[1:]:
+        result = result & expression
+    return result
+
+def open_archive(archive):
+    return ds.dataset(archive, format='parquet', partitioning=PARTITIONING)
+
+def query_archive(archive, columns=None, conditions=None, date_from=None, date_to=None, events=None, limit=0):
+    """
+    Запрос к архиву: читаются только указанные колонки, условия отсекают разбиения и группы строк
+    :param archive: Каталог архива
+    :param columns: Список колонок (None - все)
+    :param conditions: Список условий (см. parse_condition)
+    :param date_from: Начальная дата ГГГГ-ММ-ДД (включительно)
+    :param date_to: Конечная дата ГГГГ-ММ-ДД (включительно)
+    :param events: Имена событий
+    :param limit: Максимум строк (0 - все)
+    :return: pyarrow.Table
+    """
+    dataset = open_archive(archive)
+    expression = build_filter(conditions, date_from, date_to, events)
+    if limit:
+        return dataset.head(limit, columns=columns, filter=expression)
+    return dataset.to_table(columns=columns, filter=expression)
+
+# ============================================================================
+# Основная функция
+# ============================================================================
+def main():
+    parser = argparse.ArgumentParser(
+        description='Колоночный архив ТЖ 1С в Parquet',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  %(prog)s convert /data/tj /data/tj_archive                    # повторный запуск преобразует только новые файлы
+  %(prog)s query /data/tj_archive --from 2024-01-01 --to 2024-01-07 --events CALL \\
+      --columns timestamp,duration,Context,Usr,Memory --where "Memory>1000000000"
+  %(prog)s query /data/tj_archive --events DBPOSTGRS --where "Sql~FROM _Document" --output sql.parquet
+        """
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    convert_parser = subparsers.add_parser('convert', help='Преобразование логов ТЖ в архив')
+    convert_parser.add_argument('root', help='Каталог с логами ТЖ (результат tj_unpack.sh)')
+    convert_parser.add_argument('archive', help='Каталог архива Parquet')
+    convert_parser.add_argument('--pattern', type=str, default='*/*.log', help='Маска файлов (по умолчанию: */*.log)')
+    convert_parser.add_argument('--workers', type=int, default=None,
+                                help='Количество процессов (по умолчанию: половина ядер)')
+    convert_parser.add_argument('--force', action='store_true', help='Преобразовать заново все файлы')
+
+    query_parser = subparsers.add_parser('query', help='Запрос к архиву')
+    query_parser.add_argument('archive', help='Каталог архива Parquet')
+    query_parser.add_argument('--columns', type=str, default='timestamp,duration,event,process,Context,Usr',
+                              help='Колонки через запятую, * - все')
+    query_parser.add_argument('--where', action='append', default=[],
+                              help='Условие: колонка=значение, !=, >, >=, <, <=, ~regex (можно несколько)')
+    query_parser.add_argument('--from', dest='date_from', type=str, help='Начальная дата ГГГГ-ММ-ДД')
+    query_parser.add_argument('--to', dest='date_to', type=str, help='Конечная дата ГГГГ-ММ-ДД')
+    query_parser.add_argument('--events', type=str, help='События через запятую')
+    query_parser.add_argument('--limit', type=int, default=0, help='Максимум строк (0 - все)')
+    query_parser.add_argument('--output', type=str, help='Файл результата .csv или .parquet (по умолчанию: CSV в stdout)')
+    args = parser.parse_args()
+
+    start_time = time.time()
+
+    if args.command == 'convert':
+        converted, skipped, event_count = convert_tree(args.root, args.archive, args.pattern, args.workers, args.force)
+        print(f"Преобразовано файлов: {converted}, пропущено (без изменений): {skipped}, событий: {event_count}")
+        print(f"Время: {time.time() - start_time:.2f} сек")
+        return
+
+    columns = None if args.columns == '*' else [name.strip() for name in args.columns.split(',')]
+    events = args.events.split(',') if args.events else None
+    try:
+        table = query_archive(args.archive, columns, args.where, args.date_from, args.date_to, events, args.limit)
+    except (ValueError, pa.ArrowInvalid) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.output and args.output.endswith('.parquet'):
+        pq.write_table(table, args.output)
+    else:
+        table.to_pandas().to_csv(args.output or sys.stdout, index=False)
+    print(f"Строк: {table.num_rows}, время: {time.time() - start_time:.2f} сек", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
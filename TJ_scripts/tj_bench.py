@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Генератор синтетических логов ТЖ 1С и замеры производительности Python-инструментов
+
+generate - создает каталог, похожий на рабочий ТЖ: несколько процессов (rphost_PID, rmngr_PID),
+почасовые файлы ГГММДДЧЧ.log с BOM, заданная смесь событий (CALL, DBPOSTGRS с многострочным Sql,
+SDBL, TLOCK с ожиданиями, TTIMEOUT, TDEADLOCK, EXCP) и объем.
+
+run - замеряет скорость разбора (МБ/с), ТОП-N, группировки и отчета по SQL при разном
+количестве процессов, а также пиковую память (RSS) основного процесса и рабочих процессов.
+Каждый замер выполняется в отдельном процессе, чтобы пиковая память не смешивалась.
+Результаты сохраняются в JSON; с --baseline сравниваются с прошлым запуском.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import platform
+import resource
+import argparse
+import subprocess
+from datetime import datetime, timedelta
+
+# Смесь событий по умолчанию (доли)
+DEFAULT_MIX = 'CALL=40,DBPOSTGRS=30,SDBL=15,TLOCK=10,EXCP=3,TTIMEOUT=1,TDEADLOCK=1'
+
+# Замеры: имя -> зависит ли от количества процессов
+CASES = {
+    'parse': False,
+    'top': True,
+    'groupby': True,
+    'sql': True,
+}
+
+# Отклонение скорости от базового запуска, считающееся регрессией, %
+DEFAULT_TOLERANCE = 10
+
+USERS = ['Иванов', 'Петров', 'Сидорова', 'Администратор', 'Обмен', 'РегламентноеЗадание']
+CONTEXTS = [
+    'Форма.Вызов : Документ.РеализацияТоваровУслуг.МодульОбъекта : 1520 : Движения.Записать();',
+    'Форма.Вызов : Документ.ПоступлениеТоваровУслуг.Форма.ФормаДокумента.Модуль : 48 : ЗаписатьНаСервере();',
+    'Отчет.ВаловаяПрибыль.МодульОбъекта : 312 : СКД.Вывести();',
+    'ОбщийМодуль.ОбменДаннымиСервер.Модуль : 4410 : ВыполнитьОбмен();',
+    'Обработка.ЗакрытиеМесяца.МодульОбъекта : 877 : РассчитатьСебестоимость();\n'
+    'ОбщийМодуль.РасчетСебестоимости.Модуль : 1290 : ЗаполнитьТаблицу();',
+]
+TABLES = ['_Document123', '_Document456', '_AccumRg789', '_InfoRg1011', '_Reference12', '_AccRg1314']
+REGIONS = ['AccumRg789.DIMS', 'InfoRg1011.DIMS', 'Document123', 'AccRg1314.DIMS']
+
+# ============================================================================
+# Генератор
+# ============================================================================
+def parse_mix(mix):
+    """
+    Разбирает смесь событий вида CALL=40,DBPOSTGRS=30
+    :return: Кортеж (имена, веса)
+    """
+    names, weights = [], []
+    for item in mix.split(','):
+        name, _, weight = item.partition('=')
+        names.append(name.strip())
+        weights.append(float(weight or 1))
+    return names, weights
+
+def quote(value):
+    """
+    Значение свойства в формате ТЖ: в кавычках, если содержит запятую, кавычку или перевод строки
+    """
+    if any(char in value for char in ",'\"\n="):
+        return "'" + value.replace("'", "''") + "'"
+    return value
+
+def event_properties(name, rng, connect_id, infobase):
+    user = rng.choice(USERS)
+    context = rng.choice(CONTEXTS)
+    common = [('process', 'rphost'), ('p:processName', infobase), ('OSThread', str(rng.randint(1000, 30000))),
+              ('t:clientID', str(connect_id + 1000)), ('t:applicationName', '1CV8C'),
+              ('t:computerName', f"pc{connect_id % 50:03d}"), ('t:connectID', str(connect_id)),
+              ('SessionID', str(connect_id + 5000)), ('Usr', user)]
+
+    if name == 'CALL':
+        memory = int(rng.lognormvariate(14, 2))
+        return common + [('Context', context), ('Interface', 'IContextMngr'), ('Method', '1'),
+                         ('CallID', str(rng.randint(1, 10 ** 6))), ('Memory', str(memory)),
+                         ('MemoryPeak', str(memory * 2)), ('InBytes', str(rng.randint(100, 10 ** 6))),
+                         ('OutBytes', str(rng.randint(100, 10 ** 6))), ('CpuTime', str(rng.randint(0, 10 ** 6)))]
+    if name == 'DBPOSTGRS':
+        table = rng.choice(TABLES)
+        sql = (f"SELECT\nT1._IDRRef,\nT1._Fld{rng.randint(100, 120)}\nFROM {table} T1\n"
+               f"WHERE T1._Fld{rng.randint(100, 120)} = '\\\\x{rng.getrandbits(64):016x}'::bytea "
+               f"AND T1._Date_Time >= '2024-01-{rng.randint(1, 28):02d} 00:00:00'::timestamp "
+               f"AND T1._Marked = {rng.randint(0, 1)}")
+        if rng.random() < 0.3:
+            sql = f"INSERT INTO pg_temp.tt{rng.randint(1, 99)} (_Q_000_F_000) {sql}"
+        return common + [('Trans', str(rng.randint(0, 1))), ('dbpid', str(rng.randint(1000, 9000))),
+                         ('Sql', sql), ('Rows', str(rng.randint(0, 1000))),
+                         ('RowsAffected', str(rng.randint(-1, 100))), ('Context', context)]
+    if name == 'SDBL':
+        sdbl = (f"ВЫБРАТЬ Т.Ссылка ИЗ Документ.РеализацияТоваровУслуг КАК Т "
+                f"ГДЕ Т.Номер = \"{rng.randint(1, 99999):08d}\" И Т.Проведен = ИСТИНА")
+        return common + [('Trans', '0'), ('Sdbl', sdbl), ('Rows', str(rng.randint(0, 10))), ('Context', context)]
+    if name == 'TLOCK':
+        properties = common + [('Regions', rng.choice(REGIONS)),
+                               ('Locks', f"{rng.choice(REGIONS)} Exclusive Fld{rng.randint(1, 9)}=\"x\"")]
+        if rng.random() < 0.2:
+            properties.append(('WaitConnections', str(rng.randint(1, 200))))
+        return properties + [('Context', context)]
+    if name == 'TTIMEOUT':
+        return common + [('Regions', rng.choice(REGIONS)), ('WaitConnections', str(rng.randint(1, 200))),
+                         ('Context', context)]
+    if name == 'TDEADLOCK':
+        other = rng.randint(1, 200)
+        region = rng.choice(REGIONS)
+        return common + [('DeadlockConnectionIntersections',
+                          f"{connect_id} {other} {region} Exclusive Fld1=1,{other} {connect_id} {region} Shared"),
+                         ('Context', context)]
+    return common + [('Exception', 'DataBaseException'),
+                     ('Descr', f"Ошибка СУБД:\nERROR: could not serialize access \"{rng.choice(TABLES)}\"")]
+
+def format_event(name, rng, offset_us, infobase):
+    minutes, rest = divmod(offset_us, 60000000)
+    seconds, micro = divmod(rest, 1000000)
+    duration = int(rng.lognormvariate(8, 2.5))
+    properties = event_properties(name, rng, rng.randint(1, 500), infobase)
+    body = ','.join(f"{key}={quote(value)}" for key, value in properties)
+    return f"{minutes:02d}:{seconds:02d}.{micro:06d}-{duration},{name},{rng.randint(1, 5)},{body}\n"
+
+def generate_file(path, size, names, weights, rng, infobase):
+    """
+    Пишет файл ТЖ примерно заданного размера, время событий растет в пределах часа
+    :return: Кортеж (событий, байт)
+    """
+    events = []
+    written = 0
+    offset_us = 0
+    while written < size:
+        offset_us = min(offset_us + rng.randint(1, 20000), 3599999999)
+        line = format_event(rng.choices(names, weights)[0], rng, offset_us, infobase)
+        events.append(line)
+        written += len(line.encode('utf-8'))
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        f.writelines(events)
+    return len(events), os.path.getsize(path)
+
+def generate_logs(output, size_mb=100, processes=4, hours=4, mix=DEFAULT_MIX, seed=1, start=None):
+    """
+    Создает синтетический каталог ТЖ
+    :param output: Каталог результата
+    :param size_mb: Общий объем, МБ
+    :param processes: Количество процессов rphost (плюс один rmngr с малым объемом)
+    :param hours: Количество часов (файлов на процесс)
+    :param mix: Смесь событий (см. DEFAULT_MIX)
+    :param seed: Начальное значение генератора случайных чисел
+    :param start: datetime первого часа
+    :return: Словарь: files, events, bytes
+    """
+    rng = random.Random(seed)
+    names, weights = parse_mix(mix)
+    start = start or datetime(2024, 1, 1, 9)
+    size_per_file = size_mb * 1048576 // (processes * hours)
+
+    directories = [f"rphost_{2000 + index}" for index in range(processes)] + ['rmngr_1000']
+    totals = {'files': 0, 'events': 0, 'bytes': 0}
+    for directory in directories:
+        os.makedirs(os.path.join(output, directory), exist_ok=True)
+        for hour in range(hours):
+            moment = start + timedelta(hours=hour)
+            path = os.path.join(output, directory, moment.strftime('%y%m%d%H') + '.log')
+            size = size_per_file if directory.startswith('rphost') else size_per_file // 100
+            events, written = generate_file(path, size, names, weights, rng, f"ib{hour % 2}")
+            totals['files'] += 1
+            totals['events'] += events
+            totals['bytes'] += written
+    return totals
+
+# ============================================================================
+# Замеры
+# ============================================================================
+def peak_rss_mb():
+    """
+    Пиковая память основного процесса и наибольшая среди завершенных дочерних, МБ (Linux: ru_maxrss в КБ)
+    """
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024)
+
+def run_case(case, root, workers):
+    """
+    Выполняет один замер в текущем процессе
+    :return: Словарь результата
+    """
+    from tj_parser import find_log_files, iter_file_events
+    paths = find_log_files(root)
+    size = sum(os.path.getsize(path) for path in paths)
+
+    start = time.perf_counter()
+    if case == 'parse':
+        events = sum(1 for path in paths for _ in iter_file_events(path))
+    elif case == 'top':
+        from tj_top import top_events
+        _, events, _ = top_events(paths, 'Memory', 10, ('CALL',), None, workers)
+    elif case == 'groupby':
+        from tj_groupby import group_events
+        _, events = group_events(paths, ['Context', 'Usr', 'hour'], 'duration', ('CALL',), None, workers)
+    elif case == 'sql':
+        from tj_sql import query_statistics
+        _, events, _ = query_statistics(paths, workers=workers)
+    else:
+        raise ValueError(f"Неизвестный замер: {case}")
+    seconds = time.perf_counter() - start
+
+    rss_main, rss_worker = peak_rss_mb()
+    return {
+        'case': case,
+        'workers': workers if CASES[case] else 1,
+        'seconds': round(seconds, 3),
+        'mb_per_s': round(size / 1048576 / seconds, 2) if seconds else 0.0,
+        'events': events,
+        'events_per_s': round(events / seconds) if seconds else 0,
+        'rss_main_mb': round(rss_main, 1),
+        'rss_worker_mb': round(rss_worker, 1),
+    }
+
+def run_isolated(case, root, workers):
+    """
+    Замер в отдельном процессе интерпретатора (чистая пиковая память)
+    """
+    script = os.path.abspath(__file__)
+    result = subprocess.run(
+        [sys.executable, script, 'case', case, root, '--workers', str(workers)],
+        cwd=os.path.dirname(script), capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Замер {case} завершился с ошибкой: {result.stderr.strip()}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def run_benchmarks(root, cases, worker_counts, repeat=1):
+    """
+    Все замеры по набору данных; при repeat > 1 берется лучший результат
+    :return: Список словарей результатов
+    """
+    results = []
+    for case in cases:
+        for workers in (worker_counts if CASES[case] else [1]):
+            best = None
+            for _ in range(repeat):
+                result = run_isolated(case, root, workers)
+                if best is None or result['seconds'] < best['seconds']:
+                    best = result
+            print(f"{case:<8} процессов: {best['workers']:<3} {best['seconds']:>8.2f} сек "
+                  f"{best['mb_per_s']:>8.1f} МБ/с {best['events_per_s']:>10} соб/с "
+                  f"RSS {best['rss_main_mb']:.0f}/{best['rss_worker_mb']:.0f} МБ", flush=True)
+            results.append(best)
+    return results
+
+def compare_results(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Сравнение скорости с базовым запуском
+    :return: Список строк с регрессиями
+    """
+    previous = {(item['case'], item['workers']): item for item in baseline.get('results', [])}
+    regressions = []
+    for item in results:
+        old = previous.get((item['case'], item['workers']))
+        if not old or not old['mb_per_s']:
+            continue
+        change = (item['mb_per_s'] - old['mb_per_s']) * 100 / old['mb_per_s']
+        if change < -tolerance:
+            regressions.append(f"{item['case']} ({item['workers']} проц.): {old['mb_per_s']} -> "
+                               f"{item['mb_per_s']} МБ/с ({change:+.1f}%)")
+    return regressions
+
+# ============================================================================
+# Основная функция
+# ============================================================================
+def main():
+    parser = argparse.ArgumentParser(
+        description='Синтетические логи ТЖ 1С и замеры производительности',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  %(prog)s generate /tmp/tj_bench --size-mb 500 --processes 8 --hours 6
+  %(prog)s run /tmp/tj_bench --workers 1,2,4,8 --output bench.json
+  %(prog)s run /tmp/tj_bench --baseline bench.json          # код возврата 1 при замедлении больше 10%%
+        """
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = subparsers.add_parser('generate', help='Создать синтетический ТЖ')
+    generate_parser.add_argument('output', help='Каталог результата')
+    generate_parser.add_argument('--size-mb', type=int, default=100, help='Общий объем, МБ (по умолчанию: 100)')
+    generate_parser.add_argument('--processes', type=int, default=4, help='Процессов rphost (по умолчанию: 4)')
+    generate_parser.add_argument('--hours', type=int, default=4, help='Часов (по умолчанию: 4)')
+    generate_parser.add_argument('--mix', type=str, default=DEFAULT_MIX,
+                                 help=f'Смесь событий (по умолчанию: {DEFAULT_MIX})')
+    generate_parser.add_argument('--seed', type=int, default=1, help='Начальное значение генератора (по умолчанию: 1)')
+
+    run_parser = subparsers.add_parser('run', help='Выполнить замеры')
+    run_parser.add_argument('root', help='Каталог с логами ТЖ')
+    run_parser.add_argument('--cases', type=str, default=','.join(CASES),
+                            help=f"Замеры через запятую (по умолчанию: {','.join(CASES)})")
+    run_parser.add_argument('--workers', type=str, default='1,2,4',
+                            help='Количество процессов через запятую (по умолчанию: 1,2,4)')
+    run_parser.add_argument('--repeat', type=int, default=1, help='Повторов, берется лучший (по умолчанию: 1)')
+    run_parser.add_argument('--output', type=str, default=None,
+                            help='Файл результатов JSON (по умолчанию: tj_bench_ГГГГММДД_ЧЧММСС.json)')
+    run_parser.add_argument('--baseline', type=str, default=None, help='Файл результатов прошлого запуска')
+    run_parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                            help=f'Допустимое замедление, %% (по умолчанию: {DEFAULT_TOLERANCE})')
+
+    case_parser = subparsers.add_parser('case')   # служебная: один замер в отдельном процессе
+    case_parser.add_argument('case')
+    case_parser.add_argument('root')
+    case_parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.command == 'case':
+        print(json.dumps(run_case(args.case, args.root, args.workers)))
+        return
+
+    if args.command == 'generate':
+        start = time.time()
+        totals = generate_logs(args.output, args.size_mb, args.processes, args.hours, args.mix, args.seed)
+        print(f"Создано файлов: {totals['files']}, событий: {totals['events']}, "
+              f"объем: {totals['bytes'] / 1048576:.1f} МБ, время: {time.time() - start:.2f} сек")
+        return
+
+    cases = [case.strip() for case in args.cases.split(',')]
+    unknown = [case for case in cases if case not in CASES]
+    if unknown:
+        print(f"Неизвестные замеры: {', '.join(unknown)}")
+        sys.exit(1)
+    worker_counts = [int(value) for value in args.workers.split(',')]
+
+    from tj_parser import find_log_files
+    paths = find_log_files(args.root)
+    if not paths:
+        print(f"Файлы */*.log не найдены в {args.root}")
+        sys.exit(1)
+
+    dataset = {'root': os.path.abspath(args.root), 'files': len(paths),
+               'bytes': sum(os.path.getsize(path) for path in paths)}
+    print(f"Набор данных: {dataset['files']} файлов, {dataset['bytes'] / 1048576:.1f} МБ")
+
+    try:
+        results = run_benchmarks(args.root, cases, worker_counts, args.repeat)
+    except RuntimeError as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'dataset': dataset,
+        'results': results,
+    }
+    output = args.output or f"tj_bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"Результаты сохранены в {output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_results(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n=== Замедление больше {args.tolerance}% относительно {args.baseline} ===")
+            for line in regressions:
+                print(line)
+            sys.exit(1)
+        print(f"Регрессий относительно {args.baseline} нет")
+
+if __name__ == "__main__":
+    main()
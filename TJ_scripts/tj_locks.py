@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+Анализ управляемых блокировок 1С по событиям TLOCK/TTIMEOUT/TDEADLOCK
+
+Для каждого ожидания (TLOCK с WaitConnections, TTIMEOUT) находятся соединения-виновники
+и их контекст: вызов (CALL), выполнявшийся на соединении-виновнике в момент начала ожидания,
+или последняя блокировка, которую оно установило. Из ожиданий строится граф "кто кого ждет"
+и восстанавливаются цепочки (A ждет B, B ждет C...). Области блокировок ранжируются
+по суммарному времени ожидания.
+
+События читаются по часам, файлы одного часа объединяются по времени. В памяти хранятся
+только события последних секунд (--horizon) и агрегаты, поэтому объем логов не ограничен.
+Длительности в ТЖ 8.3.12+ - в микросекундах.
+"""
+
+import sys
+import json
+import time
+import heapq
+import argparse
+from collections import defaultdict, deque, Counter
+from datetime import timedelta
+from tj_parser import iter_file_events, find_log_files, parse_file_hour
+
+LOCK_EVENTS = {'TLOCK', 'TTIMEOUT', 'TDEADLOCK', 'CALL'}
+
+# Сколько контекстов-виновников хранить по области
+TOP_CULPRITS_PER_REGION = 5
+
+# Сколько взаимоблокировок хранить для отчета (остальные только считаются)
+MAX_DEADLOCKS = 100
+
+# ============================================================================
+# Вспомогательные функции
+# ============================================================================
+def connection_key(event):
+    """
+    Соединение: информационная база (p:processName) + t:connectID
+    """
+    return value_of(event, 'p:processName'), value_of(event, 't:connectID')
+
+def value_of(event, name):
+    """
+    Значение одного свойства без полного разбора события ('' если свойства нет)
+    """
+    value = event.raw_value(name)
+    return value.decode('utf-8', 'replace') if value is not None else ''
+
+def split_connections(value):
+    return [item for item in value.replace(' ', ',').split(',') if item]
+
+def parse_deadlock_intersections(value):
+    """
+    Разбирает DeadlockConnectionIntersections: "жертва виновник область режим поля, ..."
+    :return: Список кортежей (жертва, виновник, область)
+    """
+    result = []
+    for part in value.split(','):
+        tokens = part.split()
+        if len(tokens) >= 3 and tokens[0].isdigit() and tokens[1].isdigit():
+            result.append((tokens[0], tokens[1], tokens[2]))
+    return result
+
+def iter_events_by_time(paths, events=LOCK_EVENTS):
+    """
+    События файлов в порядке времени: файлы группируются по часу,
+    файлы одного часа объединяются слиянием (открыты только файлы текущего часа)
+    """
+    by_hour = defaultdict(list)
+    for path in paths:
+        hour = parse_file_hour(path)
+        if hour is not None:
+            by_hour[hour].append(path)
+
+    for hour in sorted(by_hour):
+        streams = [iter_file_events(path, events=events) for path in by_hour[hour]]
+        yield from heapq.merge(*streams, key=lambda event: event.offset_us)
+
+# ============================================================================
+# Анализатор
+# ============================================================================
+class Wait:
+    """
+    Ожидание блокировки: соединение waiter ждало соединения holders с start по end
+    """
+
+    __slots__ = ('start', 'end', 'waiter', 'holders', 'region', 'kind', 'context', 'user')
+
+    def __init__(self, start, end, waiter, holders, region, kind, context, user):
+        self.start = start
+        self.end = end
+        self.waiter = waiter
+        self.holders = holders
+        self.region = region
+        self.kind = kind          # wait - дождался, timeout - TTIMEOUT
+        self.context = context
+        self.user = user
+
+    @property
+    def seconds(self):
+        return (self.end - self.start).total_seconds()
+
+class Deadlock:
+    """
+    Взаимоблокировка (TDEADLOCK): разбирается вместе с ожиданиями, когда записаны вызовы виновников
+    """
+
+    __slots__ = ('end', 'key', 'user', 'context', 'intersections')
+
+    def __init__(self, end, key, user, context, intersections):
+        self.end = end
+        self.key = key
+        self.user = user
+        self.context = context
+        self.intersections = intersections
+
+class RegionStats:
+    __slots__ = ('waits', 'wait_seconds', 'timeouts', 'deadlocks', 'culprits')
+
+    def __init__(self):
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+        self.deadlocks = 0
+        self.culprits = Counter()   # контекст виновника -> секунды ожидания
+
+class LockAnalyzer:
+    """
+    Потоковый анализатор блокировок
+    События подаются в порядке времени; ожидание разбирается, когда время потока
+    ушло на horizon секунд дальше его окончания (к этому моменту записаны события виновников)
+    """
+
+    def __init__(self, horizon=30, chain_depth=6, top=20):
+        self.horizon = timedelta(seconds=horizon)
+        self.retention = self.horizon * 3
+        self.chain_depth = chain_depth
+        self.top = top
+        self.now = None
+        self.last_prune = None
+
+        self.pending = deque()                          # ожидания и взаимоблокировки, еще не разобранные
+        self.calls = defaultdict(deque)                 # соединение -> (начало, конец, контекст, пользователь)
+        self.locks = defaultdict(deque)                 # соединение -> (время, область, контекст, пользователь)
+        self.waits_by_connection = defaultdict(deque)   # соединение -> Wait
+
+        self.regions = defaultdict(RegionStats)
+        self.culprits = defaultdict(lambda: [0, 0.0, Counter()])   # контекст -> [ожиданий, секунд, области]
+        self.chains = Counter()                         # цепочка контекстов -> секунд ожидания
+        self.chain_counts = Counter()
+        self.deadlocks = []
+        self.deadlock_count = 0
+        self.event_count = 0
+
+    # --- прием событий --------------------------------------------------------
+    def process(self, event):
+        end = event.timestamp
+        if end is None:
+            return
+        self.event_count += 1
+        if self.now is None or end > self.now:
+            self.now = end
+        start = end - timedelta(microseconds=event.duration)
+        key = connection_key(event)
+
+        if event.name == 'CALL':
+            self.calls[key].append((start, end, value_of(event, 'Context'), value_of(event, 'Usr')))
+        elif event.name == 'TLOCK':
+            region = value_of(event, 'Regions')
+            holders = split_connections(value_of(event, 'WaitConnections'))
+            if holders:
+                self.add_wait(event, start, end, key, holders, region, 'wait')
+            # После ожидания блокировка тоже установлена
+            self.locks[key].append((end, region, value_of(event, 'Context'), value_of(event, 'Usr')))
+        elif event.name == 'TTIMEOUT':
+            holders = split_connections(value_of(event, 'WaitConnections'))
+            self.add_wait(event, start, end, key, holders, value_of(event, 'Regions'), 'timeout')
+        elif event.name == 'TDEADLOCK':
+            self.add_deadlock(event, end, key)
+
+        self.resolve(self.now - self.horizon)
+
+    def add_wait(self, event, start, end, key, holders, region, kind):
+        wait = Wait(start, end, key, [(key[0], holder) for holder in holders], region, kind,
+                    value_of(event, 'Context'), value_of(event, 'Usr'))
+        self.pending.append(wait)
+        self.waits_by_connection[key].append(wait)
+
+    def add_deadlock(self, event, end, key):
+        self.deadlock_count += 1
+        intersections = parse_deadlock_intersections(value_of(event, 'DeadlockConnectionIntersections'))
+        for _, _, region in intersections:
+            self.regions[region].deadlocks += 1
+        # CALL виновника записывается по его окончанию - пары разбираются через horizon, как ожидания
+        self.pending.append(Deadlock(end, key, value_of(event, 'Usr'), value_of(event, 'Context'), intersections))
+
+    def resolve_deadlock(self, deadlock):
+        if len(self.deadlocks) >= MAX_DEADLOCKS:
+            return
+        key = deadlock.key
+        pairs = []
+        for victim, holder, region in deadlock.intersections:
+            culprit_context, culprit_user = self.culprit_of((key[0], holder), deadlock.end, region)
+            pairs.append({'victim': victim, 'culprit': holder, 'region': region,
+                          'culprit_context': culprit_context, 'culprit_user': culprit_user})
+        self.deadlocks.append({
+            'time': deadlock.end.isoformat(), 'infobase': key[0], 'connection': key[1],
+            'user': deadlock.user, 'context': deadlock.context, 'pairs': pairs,
+        })
+
+    def resolve_item(self, item):
+        if isinstance(item, Deadlock):
+            self.resolve_deadlock(item)
+        else:
+            self.resolve_wait(item)
+
+    # --- разбор ожиданий ------------------------------------------------------
+    def culprit_of(self, holder, moment, region):
+        """
+        Контекст соединения-виновника в момент moment: вызов, выполнявшийся в этот момент,
+        иначе его собственное ожидание в этот момент, иначе последняя блокировка области (или любая) до него
+        """
+        for call_start, call_end, context, user in self.calls.get(holder, ()):
+            if call_start <= moment <= call_end:
+                return context, user
+        wait = self.active_wait(holder, moment)
+        if wait is not None and wait.context:
+            return wait.context, wait.user
+        best = None
+        for lock_time, lock_region, context, user in self.locks.get(holder, ()):
+            if lock_time > moment:
+                break
+            if lock_region == region or best is None or best[0] != region:
+                best = (lock_region, context, user)
+        if best is not None:
+            return best[1], best[2]
+        return '', ''
+
+    def active_wait(self, connection, moment, exclude=None):
+        for wait in self.waits_by_connection.get(connection, ()):
+            if wait.start <= moment <= wait.end and wait is not exclude:
+                return wait
+        return None
+
+    def build_chain(self, wait):
+        """
+        Цепочка ожиданий: waiter -> виновник -> виновник виновника... на момент начала ожидания
+        :return: Список соединений
+        """
+        chain = [wait.waiter]
+        current = wait
+        while current is not None and current.holders and len(chain) < self.chain_depth:
+            holder = current.holders[0]
+            if holder in chain:
+                chain.append(holder)   # цикл - взаимоблокировка
+                break
+            chain.append(holder)
+            current = self.active_wait(holder, wait.start, exclude=current)
+        return chain
+
+    def resolve_wait(self, wait):
+        seconds = wait.seconds
+        region_stats = self.regions[wait.region]
+        region_stats.waits += 1
+        region_stats.wait_seconds += seconds
+        if wait.kind == 'timeout':
+            region_stats.timeouts += 1
+
+        culprit_contexts = []
+        for holder in wait.holders:
+            context, user = self.culprit_of(holder, wait.start, wait.region)
+            label = context or f"<соединение {holder[1]}>"
+            culprit_contexts.append(label)
+            region_stats.culprits[label] += seconds
+            stats = self.culprits[label]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2][wait.region] += 1
+
+        # Ограничиваем число виновников по области, чтобы память не росла
+        if len(region_stats.culprits) > TOP_CULPRITS_PER_REGION * 20:
+            region_stats.culprits = Counter(dict(region_stats.culprits.most_common(TOP_CULPRITS_PER_REGION * 10)))
+
+        chain = self.build_chain(wait)
+        if len(chain) >= 3:
+            labels = [wait.context or f"<соединение {wait.waiter[1]}>"] + [
+                self.culprit_of(connection, wait.start, wait.region)[0] or f"<соединение {connection[1]}>"
+                for connection in chain[1:]
+            ]
+            signature = ' -> '.join(label[:120] for label in labels)
+            self.chains[signature] += seconds
+            self.chain_counts[signature] += 1
+
+    def resolve(self, until):
+        while self.pending and self.pending[0].end <= until:
+            self.resolve_item(self.pending.popleft())
+        # Очистка индексов не чаще раза в секунду времени потока
+        if self.last_prune is None or (self.now - self.last_prune).total_seconds() >= 1:
+            self.prune(self.now - self.retention)
+            self.last_prune = self.now
+
+    def prune(self, before):
+        for index in (self.calls, self.locks):
+            for key in list(index):
+                items = index[key]
+                while items and items[0][1 if index is self.calls else 0] < before:
+                    items.popleft()
+                if not items:
+                    del index[key]
+        for key in list(self.waits_by_connection):
+            items = self.waits_by_connection[key]
+            while items and items[0].end < before:
+                items.popleft()
+            if not items:
+                del self.waits_by_connection[key]
+        if len(self.chains) > self.top * 100:
+            self.chains = Counter(dict(self.chains.most_common(self.top * 10)))
+            self.chain_counts = Counter({key: self.chain_counts[key] for key in self.chains})
+
+    def finish(self):
+        while self.pending:
+            self.resolve_item(self.pending.popleft())
+
+    # --- отчет ----------------------------------------------------------------
+    def report(self):
+        regions = sorted(self.regions.items(), key=lambda item: -item[1].wait_seconds)[:self.top]
+        culprits = sorted(self.culprits.items(), key=lambda item: -item[1][1])[:self.top]
+        return {
+            'events': self.event_count,
+            'regions': [
+                {'region': region, 'waits': stats.waits, 'wait_seconds': round(stats.wait_seconds, 3),
+                 'timeouts': stats.timeouts, 'deadlocks': stats.deadlocks,
+                 'culprits': [{'context': context, 'wait_seconds': round(seconds, 3)}
+                              for context, seconds in stats.culprits.most_common(TOP_CULPRITS_PER_REGION)]}
+                for region, stats in regions
+            ],
+            'culprits': [
+                {'context': context, 'waits': count, 'wait_seconds': round(seconds, 3),
+                 'regions': [region for region, _ in region_counter.most_common(3)]}
+                for context, (count, seconds, region_counter) in culprits
+            ],
+            'chains': [
+                {'chain': signature, 'waits': self.chain_counts[signature], 'wait_seconds': round(seconds, 3)}
+                for signature, seconds in self.chains.most_common(self.top)
+            ],
+            'deadlock_count': self.deadlock_count,
+            'deadlocks': self.deadlocks[:self.top],
+        }
+
+def analyze_locks(paths, horizon=30, chain_depth=6, top=20):
+    """
+    Анализ блокировок по файлам ТЖ
+    :param paths: Список файлов ТЖ
+    :param horizon: Запас времени (сек) на запись событий виновника после окончания ожидания
+    :param chain_depth: Максимальная длина цепочки
+    :param top: Количество строк в разделах отчета
+    :return: Словарь отчета
+    """
+    analyzer = LockAnalyzer(horizon, chain_depth, top)
+    for event in iter_events_by_time(paths):
+        analyzer.process(event)
+    analyzer.finish()
+    return analyzer.report()
+
+# ============================================================================
+# Вывод результатов
+# ============================================================================
+def print_report(report):
+    print("\n=== Области блокировок по времени ожидания ===")
+    print(f"{'Область':<40}| {'Ожиданий':>9}| {'Сек':>10}| {'Таймаутов':>10}| {'Deadlock':>9}| Главный виновник")
+    print(f"{'-' * 40}|{'-' * 10}|{'-' * 11}|{'-' * 11}|{'-' * 10}|{'-' * 30}")
+    for row in report['regions']:
+        culprit = row['culprits'][0]['context'].split('\n', 1)[0][:80] if row['culprits'] else ''
+        print(f"{row['region'][:40]:<40}| {row['waits']:>9}| {row['wait_seconds']:>10.1f}| "
+              f"{row['timeouts']:>10}| {row['deadlocks']:>9}| {culprit}")
+
+    print("\n=== Виновники (контекст соединения, которое держало блокировку) ===")
+    for rank, row in enumerate(report['culprits'], 1):
+        print(f"{rank}. {row['wait_seconds']:.1f} сек, ожиданий {row['waits']}, области {', '.join(row['regions'])}")
+        print(f"   {row['context'][:200]}")
+
+    print("\n=== Цепочки ожиданий (ждущий -> виновник -> ...) ===")
+    if not report['chains']:
+        print("Цепочек длиной больше 2 не найдено")
+    for rank, row in enumerate(report['chains'], 1):
+        print(f"{rank}. {row['wait_seconds']:.1f} сек, раз: {row['waits']}")
+        print(f"   {row['chain']}")
+
+    print(f"\n=== Взаимоблокировки: {report['deadlock_count']} ===")
+    for deadlock in report['deadlocks']:
+        print(f"{deadlock['time']} {deadlock['infobase']} соединение {deadlock['connection']} {deadlock['user']}")
+        for pair in deadlock['pairs']:
+            print(f"   {pair['victim']} ждет {pair['culprit']} по {pair['region']}: {pair['culprit_context'][:150]}")
+
+# ============================================================================
+# Основная функция
+# ============================================================================
+def main():
+    parser = argparse.ArgumentParser(
+        description='Анализ управляемых блокировок 1С по ТЖ',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Настройка ТЖ: события TLOCK, TTIMEOUT, TDEADLOCK и CALL со свойствами t:connectID,
+p:processName, Context, Usr, Regions, Locks, WaitConnections.
+
+Примеры использования:
+  %(prog)s /data/tj
+  %(prog)s /data/tj --top 50 --json > locks.json
+        """
+    )
+    parser.add_argument('root', nargs='?', default='.', help='Каталог с логами ТЖ (по умолчанию: текущий)')
+    parser.add_argument('--pattern', type=str, default='*/*.log', help='Маска файлов (по умолчанию: */*.log)')
+    parser.add_argument('--horizon', type=int, default=30,
+                        help='Запас времени на запись событий виновника, сек (по умолчанию: 30)')
+    parser.add_argument('--depth', type=int, default=6, help='Максимальная длина цепочки (по умолчанию: 6)')
+    parser.add_argument('--top', type=int, default=20, help='Строк в разделах отчета (по умолчанию: 20)')
+    parser.add_argument('--json', action='store_true', help='Вывод отчета в JSON')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    paths = find_log_files(args.root, args.pattern)
+    if not paths:
+        print(f"Файлы {args.pattern} не найдены в {args.root}")
+        sys.exit(1)
+
+    report = analyze_locks(paths, args.horizon, args.depth, args.top)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=1))
+    else:
+        print_report(report)
+        print(f"\nФайлов: {len(paths)}, событий: {report['events']}, время: {time.time() - start_time:.2f} сек")
+
+if __name__ == "__main__":
+    main()
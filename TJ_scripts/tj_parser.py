@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Потоковый парсер файлов технологического журнала (ТЖ) 1С
+
+Файл ТЖ лежит в каталоге процесса (rphost_1234/) и называется по часу: ГГММДДЧЧ.log.
+Каждое событие начинается со строки вида
+    mm:ss.ffffff-длительность,СОБЫТИЕ,уровень,свойство=значение,...
+Значения в кавычках ('...' или "...") могут содержать запятые и переводы строк,
+кавычка внутри значения удваивается.
+
+Парсер читает файл блоками в один буфер, границы событий ищет регулярным выражением
+по байтам, а свойства события разбирает только при первом обращении к ним.
+"""
+
+import os
+import re
+import sys
+import json
+import fnmatch
+import argparse
+from datetime import datetime, timedelta
+
+# Размер блока чтения файла
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# Заголовок события в начале строки: минуты, секунды, доли секунды, длительность, имя, уровень
+EVENT_HEADER = re.compile(rb'(?m)^(\d\d):(\d\d)\.(\d+)-(\d+),([^,\r\n]+),(\d+)')
+
+# Имя файла ТЖ: ГГММДДЧЧ.log
+LOG_NAME = re.compile(r'^(\d\d)(\d\d)(\d\d)(\d\d)\.log$')
+
+QUOTES = (0x22, 0x27)   # " и '
+COMMA = 0x2c
+NEWLINE = 0x0a
+UTF8_BOM = b'\xef\xbb\xbf'
+
+# ============================================================================
+# Вспомогательные функции
+# ============================================================================
+def parse_file_hour(file_name):
+    """
+    Час, к которому относится файл ТЖ, по его имени
+    :param file_name: Имя или путь файла (ГГММДДЧЧ.log)
+    :return: datetime начала часа или None, если имя не в формате ТЖ
+    """
+    match = LOG_NAME.match(os.path.basename(file_name))
+    if not match:
+        return None
+    year, month, day, hour = (int(part) for part in match.groups())
+    return datetime(2000 + year, month, day, hour)
+
+def split_process_dir(path):
+    """
+    Тип и PID процесса по каталогу файла ТЖ: rphost_1234/24010112.log -> ('rphost', 1234)
+    :return: Кортеж (тип процесса, PID или None)
+    """
+    name = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    process_type, _, pid = name.rpartition('_')
+    if process_type and pid.isdigit():
+        return process_type, int(pid)
+    return name, None
+
+def scan_value_end(buf, pos, end):
+    """
+    Позиция сразу после значения свойства, начинающегося в pos
+    :return: Кортеж (позиция конца значения, закрыты ли кавычки)
+    """
+    if pos < end and buf[pos] in QUOTES:
+        quote = buf[pos]
+        i = pos + 1
+        while True:
+            j = buf.find(quote, i, end)
+            if j == -1:
+                return end, False
+            if j + 1 < end and buf[j + 1] == quote:
+                i = j + 2
+                continue
+            return j + 1, True
+
+    j = buf.find(COMMA, pos, end)
+    if j == -1:
+        j = buf.find(NEWLINE, pos, end)
+    return (end if j == -1 else j), True
+
+def quotes_closed(buf, start, end):
+    """
+    Проверяет, что все значения в кавычках между start и end закрыты,
+    т.е. позиция end не находится внутри многострочного значения
+    """
+    pos = start
+    while pos < end:
+        eq = buf.find(b'=', pos, end)
+        if eq == -1:
+            return True
+        value_end, closed = scan_value_end(buf, eq + 1, end)
+        if not closed:
+            return False
+        pos = value_end + 1
+    return True
+
+def is_event_boundary(buf, previous_end, start):
+    """
+    Проверяет, что заголовок в позиции start - начало нового события, а не строка
+    многострочного значения в кавычках предыдущего события (заголовок которого кончается в previous_end).
+    Нечетное число кавычек - признак незакрытого значения, тогда проверяем точно
+    """
+    if buf.count(b'"', previous_end, start) & 1 or buf.count(b"'", previous_end, start) & 1:
+        return quotes_closed(buf, previous_end, start)
+    return True
+
+def last_event_start(buf):
+    """
+    Позиция начала последнего события в буфере (оно может быть еще не дописано)
+    :return: Позиция или -1, если заголовков событий нет
+    """
+    current = None
+    for match in EVENT_HEADER.finditer(buf):
+        if current is None or is_event_boundary(buf, current.end(), match.start()):
+            current = match
+    return current.start() if current is not None else -1
+
+def parse_properties(raw):
+    """
+    Разбирает свойства события
+    :param raw: Байты события после заголовка (начиная с запятой или пустые)
+    :return: Словарь {имя свойства: значение (str)}
+    """
+    properties = {}
+    end = len(raw)
+    pos = 1 if end and raw[0] == COMMA else 0
+
+    while pos < end:
+        eq = raw.find(b'=', pos, end)
+        if eq == -1:
+            break
+        name = raw[pos:eq].strip().decode('utf-8', 'replace')
+        value_end, _ = scan_value_end(raw, eq + 1, end)
+        value = raw[eq + 1:value_end]
+
+        if value and value[0] in QUOTES:
+            quote = bytes(value[:1])
+            value = value[1:-1] if value.endswith(quote) and len(value) > 1 else value[1:]
+            value = value.replace(quote + quote, quote)
+        properties[name] = bytes(value).rstrip(b'\r\n').decode('utf-8', 'replace')
+        pos = value_end + 1
+
+    return properties
+
+# ============================================================================
+# Событие ТЖ
+# ============================================================================
+class TJEvent:
+    """
+    Событие технологического журнала
+    Свойства (properties) разбираются при первом обращении
+    """
+
+    __slots__ = ('hour', 'offset_us', 'duration', 'name', 'level', 'path', 'raw', '_properties')
+
+    def __init__(self, hour, offset_us, duration, name, level, path, raw):
+        self.hour = hour              # datetime начала часа (из имени файла) или None
+        self.offset_us = offset_us    # смещение от начала часа, мкс
+        self.duration = duration      # длительность в единицах ТЖ (мкс для 8.3.12+)
+        self.name = name              # имя события: CALL, DBPOSTGRS, TLOCK...
+        self.level = level            # уровень вложенности
+        self.path = path              # файл, из которого прочитано событие
+        self.raw = raw                # байты свойств события
+        self._properties = None
+
+    @property
+    def timestamp(self):
+        if self.hour is None:
+            return None
+        return self.hour + timedelta(microseconds=self.offset_us)
+
+    @property
+    def properties(self):
+        if self._properties is None:
+            self._properties = parse_properties(self.raw)
+        return self._properties
+
+    def get(self, name, default=None):
+        return self.properties.get(name, default)
+
+    def raw_value(self, name):
+        """
+        Быстрое извлечение значения свойства без полного разбора (только байты)
+        :param name: Имя свойства (str или bytes)
+        :return: bytes значения или None
+        """
+        key = (name.encode() if isinstance(name, str) else name) + b'='
+        raw = self.raw
+        pos = raw.find(b',' + key)
+        if pos == -1:
+            return None
+        start = pos + 1 + len(key)
+        value_end, closed = scan_value_end(raw, start, len(raw))
+        if start < len(raw) and raw[start] in QUOTES:
+            quote = raw[start:start + 1]
+            value = raw[start + 1:value_end - 1 if closed else value_end]
+            return value.replace(quote + quote, quote).rstrip(b'\r\n')
+        return raw[start:value_end].rstrip(b'\r\n')
+
+    def get_int(self, name, default=0):
+        """
+        Числовое значение свойства (Memory, MemoryPeak, CpuTime, Rows...)
+        """
+        value = self.raw_value(name)
+        if not value:
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            return default
+
+    def to_line(self):
+        """
+        Текст события в исходном формате ТЖ (без перевода строки в конце)
+        """
+        seconds, micro = divmod(self.offset_us, 1000000)
+        minutes, seconds = divmod(seconds, 60)
+        properties = self.raw.rstrip(b'\r\n').decode('utf-8', 'replace')
+        return f"{minutes:02d}:{seconds:02d}.{micro:06d}-{self.duration},{self.name},{self.level}{properties}"
+
+    def to_dict(self):
+        timestamp = self.timestamp
+        return {
+            'timestamp': timestamp.isoformat() if timestamp else None,
+            'duration': self.duration,
+            'event': self.name,
+            'level': self.level,
+            'file': self.path,
+            'properties': self.properties,
+        }
+
+# ============================================================================
+# Чтение событий
+# ============================================================================
+def iter_stream_events(stream, path='', hour=None, events=None, chunk_size=CHUNK_SIZE):
+    """
+    Читает события из открытого бинарного потока
+    :param stream: Бинарный поток (файл, член tar-архива и т.д.)
+    :param path: Имя файла для событий (по нему же определяется час, если hour не задан)
+    :param hour: datetime начала часа
+    :param events: Множество имен событий для отбора (None - все)
+    :param chunk_size: Размер блока чтения
+    :return: Генератор TJEvent
+    """
+    if hour is None and path:
+        hour = parse_file_hour(path)
+    wanted = {name.encode() if isinstance(name, str) else name for name in events} if events else None
+
+    buf = bytearray()
+    chunk = bytearray(chunk_size)
+    view = memoryview(chunk)
+    first = True
+    eof = False
+
+    while not eof:
+        size = stream.readinto(view) if hasattr(stream, 'readinto') else None
+        if size is None:
+            data = stream.read(chunk_size)
+            size = len(data)
+            buf += data
+        else:
+            buf += view[:size]
+        eof = size == 0
+
+        if first and buf.startswith(UTF8_BOM):
+            del buf[:len(UTF8_BOM)]
+        first = False
+
+        current = None      # match текущего (еще не завершенного) события
+        consumed = 0
+        for match in EVENT_HEADER.finditer(buf):
+            if current is not None:
+                start = match.start()
+                # Кандидат внутри многострочного значения в кавычках - не граница
+                if not is_event_boundary(buf, current.end(), start):
+                    continue
+                event = build_event(current, buf, start, hour, path, wanted)
+                if event is not None:
+                    yield event
+                consumed = start
+            current = match
+
+        if eof:
+            if current is not None:
+                event = build_event(current, buf, len(buf), hour, path, wanted)
+                if event is not None:
+                    yield event
+            break
+
+        if current is not None:
+            consumed = current.start()
+        elif len(buf) > chunk_size:
+            # Длинный хвост без заголовков (начало файла без событий) - отбрасываем
+            consumed = buf.rfind(NEWLINE) + 1
+        del buf[:consumed]
+
+def build_event(match, buf, end, hour, path, wanted):
+    name = match.group(5)
+    if wanted is not None and name not in wanted:
+        return None
+    minutes, seconds, fraction = match.group(1), match.group(2), match.group(3)
+    offset_us = (int(minutes) * 60 + int(seconds)) * 1000000 + int(fraction.ljust(6, b'0')[:6])
+    return TJEvent(
+        hour, offset_us, int(match.group(4)), name.decode('utf-8', 'replace'),
+        int(match.group(6)), path, bytes(buf[match.end():end])
+    )
+
+def iter_file_events(path, events=None, chunk_size=CHUNK_SIZE):
+    """
+    Читает события из файла ТЖ
+    :param path: Путь к файлу ГГММДДЧЧ.log
+    :param events: Множество имен событий для отбора (None - все)
+    :return: Генератор TJEvent
+    """
+    with open(path, 'rb', buffering=0) as stream:
+        yield from iter_stream_events(stream, path, events=events, chunk_size=chunk_size)
+
+def find_log_files(root, pattern='*/*.log'):
+    """
+    Файлы ТЖ в каталоге (по умолчанию ./<процесс>/<час>.log, как в find_max_memory.sh)
+    :return: Отсортированный список путей
+    """
+    depth = pattern.count('/')
+    result = []
+    root = os.path.abspath(root)
+    for directory, dirs, files in os.walk(root):
+        level = directory[len(root):].count(os.sep)
+        if level >= depth:
+            dirs[:] = []
+        for name in files:
+            relative = os.path.relpath(os.path.join(directory, name), root)
+            if fnmatch.fnmatch(relative.replace(os.sep, '/'), pattern):
+                result.append(os.path.join(directory, name))
+    return sorted(result)
+
+def iter_tree_events(root, pattern='*/*.log', events=None):
+    """
+    Читает события всех файлов ТЖ в каталоге
+    :return: Генератор TJEvent
+    """
+    for path in find_log_files(root, pattern):
+        yield from iter_file_events(path, events=events)
+
+# ============================================================================
+# Основная функция
+# ============================================================================
+def main():
+    parser = argparse.ArgumentParser(description='Вывод событий ТЖ 1С в формате JSON Lines')
+    parser.add_argument('paths', nargs='+', help='Файлы .log или каталоги ТЖ')
+    parser.add_argument('--events', type=str, default=None,
+                        help='Имена событий через запятую (например CALL,DBPOSTGRS)')
+    parser.add_argument('--limit', type=int, default=0, help='Максимум событий (0 - все)')
+    args = parser.parse_args()
+
+    events = set(args.events.split(',')) if args.events else None
+    count = 0
+    try:
+        for path in args.paths:
+            source = iter_tree_events(path, events=events) if os.path.isdir(path) else \
+                iter_file_events(path, events=events)
+            for event in source:
+                print(json.dumps(event.to_dict(), ensure_ascii=False))
+                count += 1
+                if args.limit and count >= args.limit:
+                    return
+    except BrokenPipeError:
+        sys.stderr.close()
+
+if __name__ == "__main__":
+    main()
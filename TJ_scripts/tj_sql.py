@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Отчет по медленным запросам из событий DBPOSTGRS/SDBL (по образцу pg_stat_statements)
+
+Текст запроса (Sql= для DBPOSTGRS/DBMSSQL, Sdbl= для SDBL) нормализуется в отпечаток:
+строковые и числовые литералы и параметры заменяются на ?, суффиксы временных таблиц
+(#tt12, pg_temp.tt12) отбрасываются, списки IN (?, ?, ...) сворачиваются, пробелы схлопываются.
+Результат нормализации кэшируется - одни и те же тексты в логах повторяются тысячи раз.
+По каждому отпечатку считаются вызовы, суммарное/среднее/максимальное время, p95 и строки.
+"""
+
+import re
+import os
+import sys
+import csv
+import json
+import time
+import hashlib
+import argparse
+from collections import Counter
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tj_tar import iter_path_events, find_sources
+from tj_top import parse_filters, event_matches, shard_files
+from tj_groupby import LogSketch
+
+SQL_EVENTS = ('DBPOSTGRS', 'DBMSSQL', 'SDBL')
+
+# Размер кэша нормализации (различных текстов запросов)
+NORMALIZE_CACHE_SIZE = 200000
+
+# Сколько контекстов хранить по отпечатку
+TOP_CONTEXTS = 3
+
+# Литералы и элементы, заменяемые при нормализации (порядок важен)
+NORMALIZE_RULES = [
+    (re.compile(r"[EeNn]?'(?:[^']|'')*'"), '?'),                     # строки, E'\\x..', N'...'
+    (re.compile(r'0x[0-9A-Fa-f]+'), '?'),                             # двоичные литералы MS SQL
+    (re.compile(r'(?<![\w$#.])\d+(?:\.\d+)?(?:[eE][-+]?\d+)?(?![\w])'), '?'),   # числа, но не _Fld123
+    (re.compile(r'\$\d+|@P\d+|&\w+'), '?'),                          # параметры $1, @P1, &Параметр
+    (re.compile(r'(#tt|\btt|pg_temp\.tt)\d+', re.IGNORECASE), r'\1'),   # временные таблицы
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)'), '(?...)'),            # списки IN (?, ?, ?)
+    (re.compile(r'\s+'), ' '),
+]
+
+# Строковые литералы языка запросов 1С (в SDBL), в SQL двойные кавычки - имена, их не трогаем
+SDBL_STRING = re.compile(r'"(?:[^"]|"")*"')
+
+# ============================================================================
+# Нормализация
+# ============================================================================
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def normalize_sql(sql, sdbl=False):
+    """
+    Нормализованный текст запроса и его отпечаток
+    :param sql: Текст запроса из ТЖ
+    :param sdbl: Текст на языке запросов 1С (событие SDBL)
+    :return: Кортеж (отпечаток - 16 hex символов, нормализованный текст)
+    """
+    text = SDBL_STRING.sub('?', sql) if sdbl else sql
+    for pattern, replacement in NORMALIZE_RULES:
+        text = pattern.sub(replacement, text)
+    text = text.strip()
+    fingerprint = hashlib.md5(text.encode('utf-8')).hexdigest()[:16]
+    return fingerprint, text
+
+def event_sql(event):
+    value = event.raw_value('Sql')
+    if value is None:
+        value = event.raw_value('Sdbl')
+    return value.decode('utf-8', 'replace') if value is not None else None
+
+# ============================================================================
+# Агрегация
+# ============================================================================
+class QueryStats:
+    """
+    Показатели одного отпечатка запроса
+    """
+
+    __slots__ = ('query', 'events', 'calls', 'total', 'max', 'rows', 'rows_affected', 'sketch', 'contexts')
+
+    def __init__(self, query):
+        self.query = query
+        self.events = Counter()
+        self.calls = 0
+        self.total = 0
+        self.max = 0
+        self.rows = 0
+        self.rows_affected = 0
+        self.sketch = LogSketch()
+        self.contexts = Counter()
+
+    def add(self, event):
+        self.calls += 1
+        self.total += event.duration
+        self.max = max(self.max, event.duration)
+        self.rows += event.get_int('Rows')
+        self.rows_affected += event.get_int('RowsAffected')
+        self.sketch.add(event.duration)
+        self.events[event.name] += 1
+        context = event.raw_value('Context')
+        if context:
+            self.contexts[context.decode('utf-8', 'replace').strip()] += 1
+            self.trim_contexts()
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.rows += other.rows
+        self.rows_affected += other.rows_affected
+        self.sketch.merge(other.sketch)
+        self.events.update(other.events)
+        self.contexts.update(other.contexts)
+        self.trim_contexts()
+        return self
+
+    def trim_contexts(self):
+        if len(self.contexts) > TOP_CONTEXTS * 20:
+            self.contexts = Counter(dict(self.contexts.most_common(TOP_CONTEXTS * 5)))
+
+    def row(self, fingerprint, grand_total):
+        return {
+            'fingerprint': fingerprint,
+            'events': ','.join(sorted(self.events)),
+            'calls': self.calls,
+            'total_ms': self.total / 1000,
+            'mean_ms': self.total / self.calls / 1000 if self.calls else 0.0,
+            'p95_ms': self.sketch.quantile(0.95) / 1000,
+            'max_ms': self.max / 1000,
+            'rows': self.rows,
+            'rows_affected': self.rows_affected,
+            'percent': self.total * 100 / grand_total if grand_total else 0.0,
+            'context': self.contexts.most_common(1)[0][0] if self.contexts else '',
+            'query': self.query,
+        }
+
+def scan_files(paths, events, filter_expressions):
+    """
+    Агрегирует группу файлов в рабочем процессе
+    :return: Кортеж (словарь {отпечаток: QueryStats}, количество событий, попаданий в кэш)
+    """
+    filters = parse_filters(filter_expressions)
+    queries = {}
+    event_count = 0
+    hits_before = normalize_sql.cache_info().hits
+
+    for path in paths:
+        try:
+            for event in iter_path_events(path, events=events):
+                sql = event_sql(event)
+                if not sql:
+                    continue
+                if filters and not event_matches(event, filters):
+                    continue
+                event_count += 1
+                fingerprint, text = normalize_sql(sql, event.name == 'SDBL')
+                stats = queries.get(fingerprint)
+                if stats is None:
+                    stats = queries[fingerprint] = QueryStats(text)
+                stats.add(event)
+        except OSError as e:
+            print(f"\nОшибка чтения {path}: {e}", file=sys.stderr)
+
+    return queries, event_count, normalize_sql.cache_info().hits - hits_before
+
+def query_statistics(paths, events=SQL_EVENTS, filters=None, workers=None):
+    """
+    Статистика запросов по отпечаткам из набора файлов
+    :param paths: Список файлов ТЖ (или архивов .tar.gz)
+    :param events: Имена событий
+    :param filters: Список выражений фильтров (см. tj_top.parse_filters)
+    :param workers: Количество процессов
+    :return: Кортеж (словарь {отпечаток: QueryStats}, количество событий, попаданий в кэш нормализации)
+    """
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+    parse_filters(filters)
+
+    queries = {}
+    event_count = 0
+    cache_hits = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(scan_files, group, set(events), filters)
+                   for group in shard_files(paths, workers * 4)]
+        for future in as_completed(futures):
+            partial, count, hits = future.result()
+            event_count += count
+            cache_hits += hits
+            for fingerprint, stats in partial.items():
+                if fingerprint in queries:
+                    queries[fingerprint].merge(stats)
+                else:
+                    queries[fingerprint] = stats
+    return queries, event_count, cache_hits
+
+def result_rows(queries, sort_by='total_ms', top=0):
+    grand_total = sum(stats.total for stats in queries.values())
+    rows = [stats.row(fingerprint, grand_total) for fingerprint, stats in queries.items()]
+    rows.sort(key=lambda row: row[sort_by], reverse=True)
+    return rows[:top] if top else rows
+
+# ============================================================================
+# Вывод результатов
+# ============================================================================
+OUTPUT_COLUMNS = ['fingerprint', 'events', 'calls', 'total_ms', 'mean_ms', 'p95_ms', 'max_ms',
+                  'rows', 'rows_affected', 'percent', 'context', 'query']
+
+def print_report(rows, query_width):
+    print(f"\n{'№':<4}| {'Вызовов':>9}| {'Всего, мс':>12}| {'Сред, мс':>10}| {'p95, мс':>10}| "
+          f"{'Макс, мс':>10}| {'Строк':>10}| {'%':>6}| Запрос")
+    print(f"{'-' * 4}|{'-' * 10}|{'-' * 13}|{'-' * 11}|{'-' * 11}|{'-' * 11}|{'-' * 11}|{'-' * 7}|{'-' * 30}")
+    for rank, row in enumerate(rows, 1):
+        print(f"{rank:<4}| {row['calls']:>9}| {row['total_ms']:>12.1f}| {row['mean_ms']:>10.2f}| "
+              f"{row['p95_ms']:>10.2f}| {row['max_ms']:>10.1f}| {row['rows']:>10}| {row['percent']:>6.2f}| "
+              f"{row['query'][:query_width]}")
+
+    print("\n=== Полные тексты ===")
+    for rank, row in enumerate(rows, 1):
+        print(f"{rank}. [{row['fingerprint']}] {row['events']}, контекст: {row['context'][:150]}")
+        print(f"   {row['query']}")
+        print("")
+
+def write_rows(rows, output_format, output):
+    stream = open(output, 'w', encoding='utf-8', newline='') if output else sys.stdout
+    try:
+        if output_format == 'csv':
+            writer = csv.DictWriter(stream, fieldnames=OUTPUT_COLUMNS)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({name: round(value, 3) if isinstance(value, float) else value
+                                 for name, value in row.items()})
+        else:
+            for row in rows:
+                stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+    finally:
+        if output:
+            stream.close()
+
+# ============================================================================
+# Основная функция
+# ============================================================================
+def main():
+    parser = argparse.ArgumentParser(
+        description='Отчет по запросам DBPOSTGRS/SDBL из ТЖ 1С с нормализацией текста',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Сортировка: total_ms (по умолчанию), mean_ms, p95_ms, max_ms, calls, rows.
+
+Примеры использования:
+  %(prog)s /data/tj                                   # ТОП-20 по суммарному времени
+  %(prog)s /data/tj --events DBPOSTGRS --sort mean_ms --top 50
+  %(prog)s /data/tj --filter "Context~Документ\\.Реализация" --format csv --output sql.csv
+        """
+    )
+    parser.add_argument('root', nargs='?', default='.', help='Каталог с логами ТЖ (по умолчанию: текущий)')
+    parser.add_argument('--events', type=str, default=','.join(SQL_EVENTS),
+                        help=f"События через запятую (по умолчанию: {','.join(SQL_EVENTS)})")
+    parser.add_argument('--filter', action='append', default=[],
+                        help='Фильтр: Свойство=значение, Свойство!=значение или Свойство~regex')
+    parser.add_argument('--sort', choices=['total_ms', 'mean_ms', 'p95_ms', 'max_ms', 'calls', 'rows'],
+                        default='total_ms', help='Сортировка (по умолчанию: total_ms)')
+    parser.add_argument('--top', type=int, default=20, help='Количество запросов, 0 - все (по умолчанию: 20)')
+    parser.add_argument('--format', choices=['text', 'csv', 'json'], default='text',
+                        help='Формат вывода (по умолчанию: text)')
+    parser.add_argument('--output', type=str, default=None, help='Файл результата для csv/json')
+    parser.add_argument('--width', type=int, default=100, help='Ширина текста запроса в таблице (по умолчанию: 100)')
+    parser.add_argument('--pattern', type=str, default='*/*.log', help='Маска файлов (по умолчанию: */*.log)')
+    parser.add_argument('--archives', action='store_true',
+                        help='Читать также архивы *.tar.gz из каталога без распаковки')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Количество процессов (по умолчанию: половина ядер)')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    paths = find_sources(args.root, args.pattern, args.archives)
+    if not paths:
+        print(f"Файлы {args.pattern} не найдены в {args.root}")
+        sys.exit(1)
+
+    try:
+        queries, event_count, cache_hits = query_statistics(
+            paths, args.events.split(','), args.filter, args.workers
+        )
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+
+    rows = result_rows(queries, args.sort, args.top)
+    if args.format == 'text':
+        print_report(rows, args.width)
+    else:
+        write_rows(rows, args.format, args.output)
+
+    print(f"Файлов: {len(paths)}, запросов: {event_count}, отпечатков: {len(queries)}, "
+          f"повторных текстов (кэш): {cache_hits}, время: {time.time() - start_time:.2f} сек", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
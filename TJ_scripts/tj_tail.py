@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+"""
+Слежение за рабочим каталогом ТЖ 1С в реальном времени с оповещениями
+
+Новые байты файлов читаются с сохраненных смещений и разбираются по мере записи;
+почасовая смена файлов (новый ГГММДДЧЧ.log, удаление старых) обрабатывается автоматически.
+Изменения отслеживаются через inotify (пакет inotify_simple), при его отсутствии - опросом.
+
+По скользящему окну считаются: CALL с наибольшей памятью, ожидания и таймауты
+управляемых блокировок (TLOCK/TTIMEOUT/TDEADLOCK), исключения EXCP.
+При превышении порогов оповещения выводятся в stdout (текстом или JSON Lines).
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import heapq
+import signal
+import argparse
+from collections import deque
+from datetime import datetime
+from tj_parser import iter_stream_events, find_log_files, last_event_start, CHUNK_SIZE
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+# Файл, не изменявшийся дольше этого времени и не последний в каталоге процесса, больше не читается
+ROTATED_AFTER_SECONDS = 2 * 3600
+
+# Незавершенное событие выводится, если файл не менялся столько секунд
+IDLE_FLUSH_SECONDS = 2
+
+# Как часто сохранять смещения
+STATE_SAVE_SECONDS = 10
+
+# ============================================================================
+# Чтение файлов с сохраненных смещений
+# ============================================================================
+class TailedFile:
+    """
+    Состояние одного файла: смещение прочитанного и недописанный хвост
+    """
+
+    __slots__ = ('path', 'offset', 'pending', 'last_change')
+
+    def __init__(self, path, offset=0):
+        self.path = path
+        self.offset = offset          # позиция в файле, до которой байты прочитаны
+        self.pending = b''            # прочитанные байты последнего (возможно недописанного) события
+        self.last_change = time.time()
+
+    @property
+    def consumed(self):
+        """
+        Смещение, с которого нужно продолжить чтение после перезапуска
+        """
+        return self.offset - len(self.pending)
+
+class LogFollower:
+    """
+    Читает новые события из файлов каталога ТЖ
+    """
+
+    def __init__(self, root, pattern='*/*.log', state_path=None, from_start=False, events=None):
+        self.root = root
+        self.pattern = pattern
+        self.state_path = state_path
+        self.events = set(events) if events else None
+        self.files = {}
+
+        saved = self.load_state()
+        for path in find_log_files(root, pattern):
+            if path in saved:
+                offset = saved[path]
+            else:
+                # Файлы, существовавшие до запуска, читаются с конца (как tail -f)
+                offset = 0 if from_start else os.path.getsize(path)
+            self.files[path] = TailedFile(path, offset)
+
+    def load_state(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_state(self):
+        if not self.state_path:
+            return
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({path: tailed.consumed for path, tailed in self.files.items()}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def discover(self):
+        """
+        Добавляет новые файлы (смена часа, новый процесс) и забывает удаленные и завершенные
+        """
+        for path in find_log_files(self.root, self.pattern):
+            if path not in self.files:
+                self.files[path] = TailedFile(path)
+
+        newest = {}
+        for path in self.files:
+            directory = os.path.dirname(path)
+            newest[directory] = max(newest.get(directory, ''), path)
+
+        now = time.time()
+        for path in list(self.files):
+            if not os.path.exists(path):
+                del self.files[path]
+            elif path != newest[os.path.dirname(path)] and now - self.files[path].last_change > ROTATED_AFTER_SECONDS:
+                del self.files[path]
+
+    def read_new(self, tailed):
+        """
+        Читает новые байты файла и возвращает завершенные события
+        Последнее событие держится в хвосте, пока за ним не появится следующее
+        (или файл не будет неизменен IDLE_FLUSH_SECONDS)
+        """
+        try:
+            size = os.path.getsize(tailed.path)
+        except OSError:
+            return []
+
+        if size < tailed.offset:
+            # Файл пересоздан или обрезан - читаем сначала
+            tailed.offset = 0
+            tailed.pending = b''
+
+        events = []
+        if size > tailed.offset:
+            tailed.last_change = time.time()
+            with open(tailed.path, 'rb') as f:
+                f.seek(tailed.offset)
+                while True:
+                    data = f.read(CHUNK_SIZE)
+                    if not data:
+                        break
+                    tailed.offset += len(data)
+                    events.extend(self.split_events(tailed, tailed.pending + data))
+        elif tailed.pending and time.time() - tailed.last_change > IDLE_FLUSH_SECONDS \
+                and tailed.pending.endswith(b'\n'):
+            events.extend(self.parse(tailed.path, tailed.pending))
+            tailed.pending = b''
+        return events
+
+    def split_events(self, tailed, buf):
+        start = last_event_start(buf)
+        if start == -1:
+            # Заголовков нет: начало файла без событий или продолжение уже выведенного события
+            tailed.pending = b'' if len(buf) > CHUNK_SIZE else buf
+            return []
+        tailed.pending = buf[start:]
+        return self.parse(tailed.path, buf[:start]) if start else []
+
+    def parse(self, path, data):
+        return list(iter_stream_events(io.BytesIO(data), path, events=self.events))
+
+    def poll(self, paths=None):
+        """
+        Новые события из указанных файлов (None - из всех известных)
+        :return: Список TJEvent
+        """
+        events = []
+        for path in list(self.files) if paths is None else paths:
+            if path not in self.files:
+                if not os.path.isfile(path) or not path.endswith('.log'):
+                    continue
+                self.files[path] = TailedFile(path)
+            events.extend(self.read_new(self.files[path]))
+        return events
+
+# ============================================================================
+# Отслеживание изменений
+# ============================================================================
+class PollingWatcher:
+    """
+    Опрос каталога с интервалом
+    """
+
+    def __init__(self, root, interval):
+        self.root = root
+        self.interval = interval
+
+    def wait(self):
+        """
+        :return: Множество измененных файлов или None (проверить все)
+        """
+        time.sleep(self.interval)
+        return None
+
+    def close(self):
+        pass
+
+class InotifyWatcher:
+    """
+    Ожидание изменений через inotify: корневой каталог и каталоги процессов
+    """
+
+    def __init__(self, root, interval):
+        self.root = os.path.abspath(root)
+        self.interval = interval
+        self.inotify = INotify()
+        self.directories = {}
+        self.watch(self.root)
+        for entry in os.scandir(self.root):
+            if entry.is_dir():
+                self.watch(entry.path)
+
+    def watch(self, directory):
+        mask = flags.CREATE | flags.MOVED_TO | flags.DELETE
+        if directory != self.root:
+            mask |= flags.MODIFY
+        self.directories[self.inotify.add_watch(directory, mask)] = directory
+
+    def wait(self):
+        changed = set()
+        for event in self.inotify.read(timeout=int(self.interval * 1000)):
+            directory = self.directories.get(event.wd)
+            if directory is None or not event.name:
+                continue
+            path = os.path.join(directory, event.name)
+            if directory == self.root:
+                if event.mask & flags.ISDIR and os.path.isdir(path):
+                    # Новый процесс: следим за его каталогом и читаем уже созданные файлы
+                    self.watch(path)
+                    changed.update(entry.path for entry in os.scandir(path) if entry.is_file())
+            else:
+                changed.add(path)
+        return changed
+
+    def close(self):
+        self.inotify.close()
+
+def create_watcher(root, interval, polling=False):
+    if INotify is None or polling:
+        return PollingWatcher(root, interval)
+    return InotifyWatcher(root, interval)
+
+# ============================================================================
+# Скользящие окна и оповещения
+# ============================================================================
+class RollingWindow:
+    """
+    Элементы за последние seconds секунд (по времени событий)
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.items = deque()
+
+    def add(self, timestamp, item=None):
+        self.items.append((timestamp, item))
+
+    def prune(self, now):
+        while self.items and (now - self.items[0][0]).total_seconds() > self.seconds:
+            self.items.popleft()
+
+    def __len__(self):
+        return len(self.items)
+
+class AlertMonitor:
+    """
+    Агрегаты по скользящему окну и проверка порогов
+    """
+
+    # Сколько CALL с наибольшей памятью хранить в окне
+    TOP_CALLS = 5
+
+    def __init__(self, window_seconds=300, memory_mb=1024, lock_waits=50, timeouts=1, exceptions=20):
+        self.window_seconds = window_seconds
+        self.memory_threshold = memory_mb * 1048576
+        self.thresholds = {'lock_waits': lock_waits, 'timeouts': timeouts, 'exceptions': exceptions}
+        self.windows = {name: RollingWindow(window_seconds)
+                        for name in ('calls', 'lock_waits', 'timeouts', 'deadlocks', 'exceptions')}
+        self.last_alert = {}
+        self.now = None
+
+    def process(self, event):
+        """
+        Учитывает событие в окнах
+        :return: Список оповещений (словари)
+        """
+        timestamp = event.timestamp
+        if timestamp is None:
+            return []
+        if self.now is None or timestamp > self.now:
+            self.now = timestamp
+            for window in self.windows.values():
+                window.prune(timestamp)
+
+        alerts = []
+        if event.name == 'CALL':
+            memory = event.get_int('Memory')
+            if memory > 0:
+                self.windows['calls'].add(timestamp, (memory, event.get('Context', ''), event.get('Usr', '')))
+            if memory >= self.memory_threshold:
+                alerts.append(self.alert(
+                    'memory', event, memory, self.memory_threshold,
+                    f"CALL занял {memory / 1048576:.0f} МБ: Usr={event.get('Usr', '')} Context={event.get('Context', '')}"
+                ))
+
+        elif event.name == 'TLOCK':
+            if event.raw_value('WaitConnections'):
+                self.windows['lock_waits'].add(timestamp)
+                alerts.extend(self.check_window('lock_waits', event, 'ожиданий блокировок'))
+
+        elif event.name == 'TTIMEOUT':
+            self.windows['timeouts'].add(timestamp)
+            alerts.extend(self.check_window('timeouts', event, 'таймаутов блокировок'))
+
+        elif event.name == 'TDEADLOCK':
+            self.windows['deadlocks'].add(timestamp)
+            alerts.append(self.alert(
+                'deadlock', event, 1, 1,
+                f"Взаимоблокировка: Usr={event.get('Usr', '')} DeadlockConnectionIntersections="
+                f"{event.get('DeadlockConnectionIntersections', '')}"
+            ))
+
+        elif event.name == 'EXCP':
+            self.windows['exceptions'].add(timestamp)
+            alerts.extend(self.check_window('exceptions', event, 'исключений EXCP'))
+
+        return alerts
+
+    def check_window(self, name, event, title):
+        count = len(self.windows[name])
+        threshold = self.thresholds[name]
+        if not threshold or count < threshold:
+            return []
+        # Оповещение по окну повторяется не чаще одного раза за окно
+        last = self.last_alert.get(name)
+        if last is not None and (event.timestamp - last).total_seconds() < self.window_seconds:
+            return []
+        self.last_alert[name] = event.timestamp
+        return [self.alert(name, event, count, threshold, f"{count} {title} за {self.window_seconds} сек")]
+
+    def alert(self, rule, event, value, threshold, message):
+        return {
+            'time': event.timestamp.isoformat(),
+            'rule': rule,
+            'value': value,
+            'threshold': threshold,
+            'message': message,
+            'file': event.path,
+            'event': event.to_line()[:1000],
+        }
+
+    def summary(self):
+        """
+        Текущие значения окон и CALL с наибольшей памятью
+        """
+        top_calls = heapq.nlargest(self.TOP_CALLS, (item for _, item in self.windows['calls'].items))
+        return {
+            'time': self.now.isoformat() if self.now else None,
+            'window_seconds': self.window_seconds,
+            'calls_with_memory': len(self.windows['calls']),
+            'lock_waits': len(self.windows['lock_waits']),
+            'timeouts': len(self.windows['timeouts']),
+            'deadlocks': len(self.windows['deadlocks']),
+            'exceptions': len(self.windows['exceptions']),
+            'top_memory_calls': [
+                {'memory': memory, 'context': context, 'user': user} for memory, context, user in top_calls
+            ],
+        }
+
+# ============================================================================
+# Вывод
+# ============================================================================
+def print_alert(alert, as_json):
+    if as_json:
+        print(json.dumps(alert, ensure_ascii=False), flush=True)
+    else:
+        print(f"[{alert['time']}] ОПОВЕЩЕНИЕ {alert['rule']}: {alert['message']}", flush=True)
+
+def print_summary(summary, as_json):
+    if as_json:
+        print(json.dumps(dict(summary, rule='summary'), ensure_ascii=False), flush=True)
+        return
+    print(f"\n=== Окно {summary['window_seconds']} сек на {summary['time']} ===")
+    print(f"CALL с памятью: {summary['calls_with_memory']}, ожиданий блокировок: {summary['lock_waits']}, "
+          f"таймаутов: {summary['timeouts']}, взаимоблокировок: {summary['deadlocks']}, "
+          f"EXCP: {summary['exceptions']}")
+    for rank, call in enumerate(summary['top_memory_calls'], 1):
+        print(f"  {rank}. {call['memory'] / 1048576:.1f} МБ  {call['user']}  {call['context'][:100]}")
+    sys.stdout.flush()
+
+# ============================================================================
+# Основная функция
+# ============================================================================
+def main():
+    parser = argparse.ArgumentParser(
+        description='Слежение за ТЖ 1С в реальном времени с оповещениями',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  %(prog)s /var/log/1c/tj
+  %(prog)s /var/log/1c/tj --memory-mb 2048 --window 600 --json >> /var/log/tj_alerts.jsonl
+  %(prog)s /var/log/1c/tj --state /var/lib/tj_tail.json   # продолжить с места остановки после перезапуска
+        """
+    )
+    parser.add_argument('root', help='Рабочий каталог ТЖ (с каталогами процессов)')
+    parser.add_argument('--pattern', type=str, default='*/*.log', help='Маска файлов (по умолчанию: */*.log)')
+    parser.add_argument('--window', type=int, default=300, help='Скользящее окно, сек (по умолчанию: 300)')
+    parser.add_argument('--memory-mb', type=int, default=1024,
+                        help='Порог памяти CALL, МБ (по умолчанию: 1024)')
+    parser.add_argument('--lock-waits', type=int, default=50,
+                        help='Порог ожиданий блокировок (TLOCK с WaitConnections) за окно, 0 - выкл. (по умолчанию: 50)')
+    parser.add_argument('--timeouts', type=int, default=1,
+                        help='Порог TTIMEOUT за окно, 0 - выкл. (по умолчанию: 1)')
+    parser.add_argument('--exceptions', type=int, default=20,
+                        help='Порог EXCP за окно, 0 - выкл. (по умолчанию: 20)')
+    parser.add_argument('--report', type=int, default=60,
+                        help='Вывод сводки по окну каждые N сек, 0 - выкл. (по умолчанию: 60)')
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='Интервал опроса / ожидания inotify, сек (по умолчанию: 1)')
+    parser.add_argument('--state', type=str, default=None, help='Файл сохранения смещений')
+    parser.add_argument('--from-start', action='store_true', help='Читать существующие файлы с начала')
+    parser.add_argument('--polling', action='store_true', help='Опрос вместо inotify')
+    parser.add_argument('--json', action='store_true', help='Вывод в JSON Lines')
+    args = parser.parse_args()
+
+    follower = LogFollower(args.root, args.pattern, args.state, args.from_start,
+                           events={'CALL', 'TLOCK', 'TTIMEOUT', 'TDEADLOCK', 'EXCP'})
+    monitor = AlertMonitor(args.window, args.memory_mb, args.lock_waits, args.timeouts, args.exceptions)
+    watcher = create_watcher(args.root, args.interval, args.polling)
+
+    mode = 'опрос' if isinstance(watcher, PollingWatcher) else 'inotify'
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Слежение за {args.root} ({mode}), "
+          f"файлов: {len(follower.files)}", file=sys.stderr)
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    last_report = last_save = last_discover = time.time()
+
+    try:
+        while True:
+            changed = watcher.wait()
+            now = time.time()
+            if changed is None or now - last_discover >= args.interval * 10:
+                follower.discover()
+                last_discover = now
+                changed = None
+
+            for event in follower.poll(changed):
+                for alert in monitor.process(event):
+                    print_alert(alert, args.json)
+
+            # Дописанные, но не завершенные следующим событием хвосты
+            if changed is not None:
+                for event in follower.poll([path for path, tailed in follower.files.items() if tailed.pending]):
+                    for alert in monitor.process(event):
+                        print_alert(alert, args.json)
+
+            if args.report and now - last_report >= args.report:
+                print_summary(monitor.summary(), args.json)
+                last_report = now
+            if now - last_save >= STATE_SAVE_SECONDS:
+                follower.save_state()
+                last_save = now
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        follower.save_state()
+        watcher.close()
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Слежение остановлено", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Чтение событий ТЖ 1С прямо из архивов *.tar.gz без распаковки на диск
+
+Архив читается потоково (tarfile, режим r|gz): члены .log разбираются по мере
+распаковки, файлы меньше 10 байт пропускаются (как в tj_unpack.sh).
+При необходимости прочитанные файлы одновременно сохраняются на диск.
+Архивы обрабатываются параллельно, по одному на процесс.
+"""
+
+import os
+import sys
+import time
+import fnmatch
+import tarfile
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tj_parser import iter_stream_events, iter_file_events, find_log_files
+
+# Файлы меньше этого размера пропускаются (как в tj_unpack.sh)
+MIN_MEMBER_SIZE = 10
+
+ARCHIVE_SUFFIXES = ('.tar.gz', '.tgz')
+
+# ============================================================================
+# Чтение архивов
+# ============================================================================
+class TeeReader:
+    """
+    Поток, который при чтении одновременно пишет прочитанные байты в файл
+    """
+
+    def __init__(self, stream, output):
+        self.stream = stream
+        self.output = output
+
+    def readinto(self, buffer):
+        data = self.stream.read(len(buffer))
+        size = len(data)
+        buffer[:size] = data
+        self.output.write(data)
+        return size
+
+def is_archive(path):
+    return path.endswith(ARCHIVE_SUFFIXES)
+
+def find_archives(root):
+    """
+    Архивы ТЖ в каталоге (*.tar.gz, *.tgz), как их ищет tj_unpack.sh
+    :return: Отсортированный список путей
+    """
+    return sorted(
+        os.path.join(root, name) for name in os.listdir(root)
+        if is_archive(name) and os.path.isfile(os.path.join(root, name))
+    )
+
+def safe_member_path(directory, name):
+    """
+    Путь распаковки члена архива; члены с абсолютными путями или .. отклоняются
+    """
+    target = os.path.abspath(os.path.join(directory, name))
+    if os.path.commonpath([target, os.path.abspath(directory)]) != os.path.abspath(directory):
+        raise ValueError(f"Недопустимый путь в архиве: {name}")
+    return target
+
+def iter_archive_members(archive, pattern='*.log', min_size=MIN_MEMBER_SIZE, stats=None):
+    """
+    Потоково перебирает файлы архива
+    Поток члена нужно прочитать до перехода к следующему (режим r|gz не позволяет вернуться)
+    :param archive: Путь к архиву .tar.gz
+    :param pattern: Маска имени файла
+    :param min_size: Минимальный размер файла, меньшие пропускаются
+    :param stats: Словарь для счетчиков members/skipped/bytes (необязательно)
+    :return: Генератор кортежей (TarInfo, поток)
+    """
+    stats = stats if stats is not None else {}
+    for key in ('members', 'skipped', 'bytes'):
+        stats.setdefault(key, 0)
+
+    with tarfile.open(archive, mode='r|gz') as tar:
+        for member in tar:
+            if not member.isfile() or not fnmatch.fnmatch(os.path.basename(member.name), pattern):
+                continue
+            if member.size < min_size:
+                stats['skipped'] += 1
+                continue
+            stats['members'] += 1
+            stats['bytes'] += member.size
+            yield member, tar.extractfile(member)
+
+def iter_archive_events(archive, events=None, min_size=MIN_MEMBER_SIZE, extract_to=None, stats=None):
+    """
+    События всех файлов .log архива
+    :param archive: Путь к архиву .tar.gz
+    :param events: Множество имен событий для отбора (None - все)
+    :param min_size: Минимальный размер файла
+    :param extract_to: Каталог, в который одновременно сохраняются прочитанные файлы (None - не сохранять)
+    :param stats: Словарь для счетчиков (см. iter_archive_members)
+    :return: Генератор TJEvent; путь события - <архив>/<имя в архиве>
+    """
+    for member, stream in iter_archive_members(archive, min_size=min_size, stats=stats):
+        path = os.path.join(archive, member.name)
+        if extract_to is None:
+            yield from iter_stream_events(stream, path, events=events)
+            continue
+
+        target = safe_member_path(extract_to, member.name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as output:
+            yield from iter_stream_events(TeeReader(stream, output), path, events=events)
+        os.utime(target, (member.mtime, member.mtime))
+
+def iter_path_events(path, events=None):
+    """
+    События файла ТЖ или архива .tar.gz
+    """
+    if is_archive(path):
+        return iter_archive_events(path, events=events)
+    return iter_file_events(path, events=events)
+
+def find_sources(root, pattern='*/*.log', archives=False):
+    """
+    Файлы ТЖ в каталоге и, если archives, архивы *.tar.gz в нем же
+    """
+    paths = find_log_files(root, pattern)
+    if archives:
+        paths += find_archives(root)
+    return paths
+
+# ============================================================================
+# Обработка в процессах
+# ============================================================================
+def scan_archive(archive, events, extract_to):
+    """
+    Читает один архив в рабочем процессе
+    :return: Словарь счетчиков архива
+    """
+    stats = {'archive': archive, 'events': 0}
+    start = time.perf_counter()
+    for _ in iter_archive_events(archive, events=events, extract_to=extract_to, stats=stats):
+        stats['events'] += 1
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+def scan_archives(archives, events=None, extract_to=None, workers=None):
+    """
+    Параллельное чтение архивов, по одному архиву на процесс
+    :return: Генератор словарей счетчиков в порядке завершения
+    """
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+    events = set(events) if events else None
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(scan_archive, archive, events, extract_to)
+                   for archive in sorted(archives, key=lambda p: -os.path.getsize(p))]
+        for future in as_completed(futures):
+            yield future.result()
+
+# ============================================================================
+# Основная функция
+# ============================================================================
+def main():
+    parser = argparse.ArgumentParser(
+        description='Чтение событий ТЖ 1С из архивов *.tar.gz без распаковки',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Анализ архивов без распаковки доступен также в tj_top.py и tj_groupby.py (ключ --archives).
+
+Примеры использования:
+  %(prog)s                                  # статистика по *.tar.gz в текущем каталоге
+  %(prog)s /data/tj --events CALL,DBPOSTGRS
+  %(prog)s /data/tj --extract /data/tj/unpacked   # сохранить прочитанные файлы >= 10 байт
+        """
+    )
+    parser.add_argument('root', nargs='?', default='.', help='Каталог с архивами (по умолчанию: текущий)')
+    parser.add_argument('--events', type=str, default=None, help='События через запятую (по умолчанию: все)')
+    parser.add_argument('--extract', type=str, default=None, help='Каталог для сохранения прочитанных файлов')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Количество процессов (по умолчанию: половина ядер)')
+    args = parser.parse_args()
+
+    archives = find_archives(args.root)
+    if not archives:
+        print(f"Архивы *.tar.gz не найдены в {args.root}")
+        sys.exit(1)
+
+    start_time = time.time()
+    events = args.events.split(',') if args.events else None
+    totals = {'members': 0, 'skipped': 0, 'bytes': 0, 'events': 0}
+
+    print(f"{'Архив':<40}| {'Файлов':>8}| {'Пропущено':>10}| {'МБ':>10}| {'Событий':>12}| {'МБ/с':>8}")
+    for stats in scan_archives(archives, events, args.extract, args.workers):
+        for key in totals:
+            totals[key] += stats[key]
+        speed = stats['bytes'] / 1048576 / stats['seconds'] if stats['seconds'] else 0
+        print(f"{os.path.basename(stats['archive']):<40}| {stats['members']:>8}| {stats['skipped']:>10}| "
+              f"{stats['bytes'] / 1048576:>10.1f}| {stats['events']:>12}| {speed:>8.1f}")
+
+    total_time = time.time() - start_time
+    print("\n=== Статистика выполнения ===")
+    print(f"Архивов:               {len(archives)}")
+    print(f"Файлов прочитано:      {totals['members']} (пропущено меньше {MIN_MEMBER_SIZE} байт: {totals['skipped']})")
+    print(f"Событий:               {totals['events']}")
+    print(f"Распаковано:           {totals['bytes'] / 1048576:.1f} МБ "
+          f"({totals['bytes'] / 1048576 / total_time if total_time else 0:.1f} МБ/с)")
+    print(f"Общее время работы:    {total_time:.2f} секунд")
+
+if __name__ == "__main__":
+    main()
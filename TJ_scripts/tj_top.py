@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+ТОП-N событий ТЖ 1С по числовому свойству (Memory, MemoryPeak, InBytes, OutBytes, CpuTime, duration)
+
+Замена find_max_memory.sh без временного файла и сортировки всех строк:
+файлы */*.log распределяются по пулу процессов, каждый процесс держит кучу
+из N лучших событий, результаты процессов объединяются.
+"""
+
+import os
+import re
+import sys
+import time
+import heapq
+import itertools
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tj_tar import iter_path_events, find_sources
+
+# Свойства, значения которых выводятся в МБ
+MEMORY_PROPERTIES = {'Memory', 'MemoryPeak', 'InBytes', 'OutBytes'}
+
+# ============================================================================
+# Фильтры событий
+# ============================================================================
+def parse_filters(expressions):
+    """
+    Разбирает фильтры вида Свойство=значение (точное совпадение) и Свойство~regex
+    :return: Список кортежей (свойство, оператор, значение или regex)
+    """
+    filters = []
+    for expression in expressions or []:
+        match = re.match(r'^([^=~!]+)(!=|=|~)(.*)$', expression)
+        if not match:
+            raise ValueError(f"Неверный фильтр: {expression}")
+        name, operator, value = match.groups()
+        if operator == '~':
+            value = re.compile(value, re.IGNORECASE)
+        filters.append((name, operator, value))
+    return filters
+
+def event_matches(event, filters):
+    for name, operator, value in filters:
+        actual = event.get(name)
+        if operator == '=':
+            if actual != value:
+                return False
+        elif operator == '!=':
+            if actual == value:
+                return False
+        elif actual is None or not value.search(actual):
+            return False
+    return True
+
+def event_value(event, prop):
+    """
+    Значение свойства для ранжирования: duration - длительность события, иначе числовое свойство
+    """
+    if prop == 'duration':
+        return event.duration
+    return event.get_int(prop)
+
+# ============================================================================
+# Обработка в процессах
+# ============================================================================
+def push_top(heap, n, entry):
+    """
+    Добавляет запись в кучу из n лучших (минимальный элемент в вершине)
+    """
+    if len(heap) < n:
+        heapq.heappush(heap, entry)
+    elif entry[0] > heap[0][0]:
+        heapq.heappushpop(heap, entry)
+
+def scan_files(paths, prop, n, events, filter_expressions):
+    """
+    Обрабатывает группу файлов в рабочем процессе
+    :return: Кортеж (ТОП-N записей (значение, файл, строка), количество событий, байт прочитано)
+    """
+    filters = parse_filters(filter_expressions)
+    heap = []
+    seq = 0
+    event_count = 0
+    bytes_read = 0
+
+    for path in paths:
+        try:
+            bytes_read += os.path.getsize(path)
+            for event in iter_path_events(path, events=events):
+                event_count += 1
+                value = event_value(event, prop)
+                if value <= 0:
+                    continue
+                if len(heap) >= n and value <= heap[0][0]:
+                    continue
+                if filters and not event_matches(event, filters):
+                    continue
+                seq += 1
+                push_top(heap, n, (value, seq, path, event.to_line()))
+        except OSError as e:
+            print(f"\nОшибка чтения {path}: {e}", file=sys.stderr)
+
+    return [(value, path, line) for value, _, path, line in heap], event_count, bytes_read
+
+def shard_files(paths, shards):
+    """
+    Распределяет файлы по группам примерно равного объема (крупные файлы первыми)
+    """
+    groups = [[] for _ in range(shards)]
+    sizes = [0] * shards
+    for path in sorted(paths, key=lambda p: -os.path.getsize(p)):
+        index = sizes.index(min(sizes))
+        groups[index].append(path)
+        sizes[index] += os.path.getsize(path)
+    return [group for group in groups if group]
+
+def top_events(paths, prop='Memory', n=3, events=('CALL',), filters=None, workers=None):
+    """
+    ТОП-N событий по свойству из набора файлов
+    :param paths: Список файлов ТЖ
+    :param prop: Имя числового свойства или duration
+    :param n: Количество записей
+    :param events: Имена событий (None - все)
+    :param filters: Список выражений фильтров (см. parse_filters)
+    :param workers: Количество процессов
+    :return: Кортеж (список (значение, файл, строка) по убыванию, событий просмотрено, байт прочитано)
+    """
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+    events = set(events) if events else None
+    parse_filters(filters)   # проверка синтаксиса до запуска процессов
+
+    merged = []
+    counter = itertools.count()
+    event_count = 0
+    bytes_read = 0
+    # Групп больше, чем процессов, чтобы выровнять нагрузку
+    groups = shard_files(paths, workers * 4)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(scan_files, group, prop, n, events, filters) for group in groups]
+        for future in as_completed(futures):
+            top, count, size = future.result()
+            event_count += count
+            bytes_read += size
+            for value, path, line in top:
+                push_top(merged, n, (value, next(counter), path, line))
+
+    result = sorted(((value, path, line) for value, _, path, line in merged), reverse=True)
+    return result, event_count, bytes_read
+
+# ============================================================================
+# Вывод результатов
+# ============================================================================
+def format_value(prop, value):
+    if prop in MEMORY_PROPERTIES:
+        return f"{value / 1048576:.2f} MB ({value} bytes)"
+    return str(value)
+
+def print_results(prop, top, root):
+    print(f"\n=== Топ-{len(top)} максимальных значений {prop} ===")
+    print(f"{'Рейтинг':<8}| {'Значение':<32}| {'Файл':<40}| Строка (первые 100 символов)")
+    print(f"{'-' * 8}|{'-' * 33}|{'-' * 41}|{'-' * 30}")
+    for rank, (value, path, line) in enumerate(top, 1):
+        relative = os.path.relpath(path, root)
+        first_line = line.split('\n', 1)[0][:100]
+        print(f"{rank:<8}| {format_value(prop, value):<32}| {relative:<40}| {first_line}")
+
+    print("\n=== Полное содержание строк ===")
+    for rank, (value, path, line) in enumerate(top, 1):
+        print(f"Место {rank}:")
+        print(f"Файл:     {os.path.relpath(path, root)}")
+        print(f"{prop}: {format_value(prop, value)}")
+        print(f"Строка:   {line}")
+        print("")
+
+# ============================================================================
+# Основная функция
+# ============================================================================
+def main():
+    parser = argparse.ArgumentParser(
+        description='ТОП-N событий ТЖ 1С по числовому свойству',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  %(prog)s                                    # как find_max_memory.sh: ТОП-3 CALL по Memory
+  %(prog)s --prop MemoryPeak -n 10
+  %(prog)s --prop duration --events CALL,SCALL -n 20
+  %(prog)s --prop CpuTime --filter Usr=Иванов --filter "Context~Документ\\.Реализация"
+        """
+    )
+    parser.add_argument('root', nargs='?', default='.', help='Каталог с логами ТЖ (по умолчанию: текущий)')
+    parser.add_argument('--prop', type=str, default='Memory',
+                        help='Свойство для ранжирования: Memory, MemoryPeak, InBytes, OutBytes, CpuTime, duration...')
+    parser.add_argument('-n', type=int, default=3, help='Количество записей (по умолчанию: 3)')
+    parser.add_argument('--events', type=str, default='CALL',
+                        help='События через запятую, * - все (по умолчанию: CALL)')
+    parser.add_argument('--filter', action='append', default=[],
+                        help='Фильтр: Свойство=значение, Свойство!=значение или Свойство~regex (можно несколько)')
+    parser.add_argument('--pattern', type=str, default='*/*.log', help='Маска файлов (по умолчанию: */*.log)')
+    parser.add_argument('--archives', action='store_true',
+                        help='Читать также архивы *.tar.gz из каталога без распаковки')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Количество процессов (по умолчанию: половина ядер)')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Начало обработки логов...")
+
+    paths = find_sources(args.root, args.pattern, args.archives)
+    if not paths:
+        print(f"Файлы {args.pattern} не найдены в {args.root}")
+        sys.exit(1)
+
+    events = None if args.events == '*' else args.events.split(',')
+    try:
+        top, event_count, bytes_read = top_events(
+            paths, args.prop, args.n, events, args.filter, args.workers
+        )
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+
+    print_results(args.prop, top, args.root)
+
+    total_time = time.time() - start_time
+    print("=== Статистика выполнения ===")
+    print(f"Файлов:                {len(paths)}")
+    print(f"Событий просмотрено:   {event_count}")
+    print(f"Прочитано:             {bytes_read / 1048576:.1f} МБ "
+          f"({bytes_read / 1048576 / total_time if total_time else 0:.1f} МБ/с)")
+    print(f"Общее время работы:    {total_time:.2f} секунд")
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Обработка завершена")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Распаковка архивов ТЖ 1С (*.tar.gz) - замена tj_unpack.sh
+
+Архивы распаковываются пулом процессов (по умолчанию половина ядер), фильтры
+применяются во время распаковки: файлы меньше 10 байт не записываются, каталоги
+создаются только для записываемых файлов, поэтому пустых каталогов не остается и
+отдельные проходы удаления не нужны. После успешной распаковки архивы удаляются.
+Структура каталогов та же, что у tj_unpack.sh (<процесс>_<PID>/ГГММДДЧЧ.log в текущем каталоге).
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tj_tar import find_archives, iter_archive_members, safe_member_path, MIN_MEMBER_SIZE
+
+# Буфер копирования члена архива в файл
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# ============================================================================
+# Вспомогательные функции
+# ============================================================================
+def format_time(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+def progress(current, total, message, width=50):
+    filled = current * width // total if total else width
+    bar = '=' * filled + ('>' if filled < width else '') + ' ' * (width - filled - 1)
+    print(f"\r{message} [{bar}] {current * 100 // total if total else 100:3d}%", end='', flush=True)
+
+# ============================================================================
+# Распаковка
+# ============================================================================
+def extract_archive(archive, target, min_size=MIN_MEMBER_SIZE):
+    """
+    Распаковывает архив в рабочем процессе, пропуская файлы меньше min_size
+    :return: Словарь счетчиков: archive, files, skipped, bytes, seconds, error
+    """
+    stats = {'archive': archive, 'error': None}
+    start = time.perf_counter()
+    try:
+        for member, stream in iter_archive_members(archive, pattern='*', min_size=min_size, stats=stats):
+            path = safe_member_path(target, member.name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as output:
+                shutil.copyfileobj(stream, output, COPY_BUFFER_SIZE)
+            os.utime(path, (member.mtime, member.mtime))
+    except Exception as e:
+        stats['error'] = str(e)
+    stats['files'] = stats.pop('members', 0)
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+def unpack_archives(archives, target='.', workers=None, min_size=MIN_MEMBER_SIZE, on_done=None):
+    """
+    Параллельная распаковка архивов
+    :param archives: Список путей к архивам
+    :param target: Каталог распаковки
+    :param workers: Количество процессов
+    :param min_size: Минимальный размер записываемого файла
+    :param on_done: Функция (номер, всего, счетчики архива), вызывается по завершении каждого архива
+    :return: Список счетчиков по архивам
+    """
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Крупные архивы первыми, чтобы не остались в хвосте
+        futures = [executor.submit(extract_archive, archive, target, min_size)
+                   for archive in sorted(archives, key=lambda p: -os.path.getsize(p))]
+        for future in as_completed(futures):
+            results.append(future.result())
+            if on_done:
+                on_done(len(results), len(futures), results[-1])
+    return results
+
+# ============================================================================
+# Основная функция
+# ============================================================================
+def main():
+    parser = argparse.ArgumentParser(
+        description='Распаковка архивов ТЖ 1С с фильтрацией малых файлов (замена tj_unpack.sh)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  %(prog)s                               # как tj_unpack.sh: *.tar.gz текущего каталога
+  %(prog)s /data/tj --workers 8 --keep   # не удалять архивы
+  %(prog)s /data/tj --target /data/tj/unpacked --min-size 1
+        """
+    )
+    parser.add_argument('root', nargs='?', default='.', help='Каталог с архивами (по умолчанию: текущий)')
+    parser.add_argument('--target', type=str, default=None, help='Каталог распаковки (по умолчанию: каталог архивов)')
+    parser.add_argument('--min-size', type=int, default=MIN_MEMBER_SIZE,
+                        help=f'Не распаковывать файлы меньше N байт (по умолчанию: {MIN_MEMBER_SIZE})')
+    parser.add_argument('--keep', action='store_true', help='Не удалять архивы после распаковки')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Количество процессов (по умолчанию: половина ядер)')
+    args = parser.parse_args()
+
+    total_cores = os.cpu_count() or 1
+    workers = args.workers or max(1, total_cores // 2)
+    target = args.target or args.root
+    print(f"Используем {workers} ядер из {total_cores} доступных")
+
+    archives = find_archives(args.root)
+    if not archives:
+        print(f"Архивы *.tar.gz не найдены в {args.root}")
+        sys.exit(1)
+
+    start_time = time.time()
+    print("Распаковка архивов *.tar.gz...")
+    results = unpack_archives(
+        archives, target, workers, args.min_size,
+        on_done=lambda current, total, stats: progress(current, total, "Распаковка")
+    )
+    extract_time = time.time() - start_time
+
+    failed = [stats for stats in results if stats['error']]
+    files = sum(stats['files'] for stats in results)
+    skipped = sum(stats['skipped'] for stats in results)
+    size = sum(stats['bytes'] for stats in results)
+    compressed = sum(os.path.getsize(stats['archive']) for stats in results)
+
+    print(f"\nРаспаковано {len(results) - len(failed)} архивов. Время: {format_time(extract_time)}")
+    for stats in failed:
+        print(f"ОШИБКА: {stats['archive']}: {stats['error']}")
+    print(f"Записано файлов: {files}, пропущено меньше {args.min_size} байт: {skipped}")
+    print(f"Объем: {compressed / 1048576:.1f} МБ в архивах -> {size / 1048576:.1f} МБ "
+          f"({size / 1048576 / extract_time if extract_time else 0:.1f} МБ/с)")
+
+    if not args.keep:
+        print("Удаление исходных архивов...")
+        removed = 0
+        for stats in results:
+            if not stats['error']:
+                os.remove(stats['archive'])
+                removed += 1
+        print(f"Удалено {removed} архивных файлов" + (f", оставлено с ошибками: {len(failed)}" if failed else ""))
+
+    print("======================================")
+    print("Все операции завершены успешно!" if not failed else "Операции завершены с ошибками")
+    print(f"Общее время выполнения: {format_time(time.time() - start_time)}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
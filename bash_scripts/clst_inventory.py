@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Опись каталога кластера 1С (srvinfo/reg_XXXX) - замена dir_clst.sh и check_missing_folders.sh
+
+Файл 1CV8Clst.lst разбирается один раз в индекс (ID папки -> имя базы, описание), затем все
+каталоги баз измеряются одним параллельным проходом os.scandir (без du на каждую папку).
+Из этого прохода строятся оба отчета: список баз кластера по размеру и список папок-сирот,
+которых нет в 1CV8Clst.lst, с итогами.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Файл списка баз кластера
+CLUSTER_LIST = '1CV8Clst.lst'
+
+# Строка базы в 1CV8Clst.lst: {ID,"Имя","Описание",... (кавычки внутри строк удваиваются)
+LIST_ENTRY = re.compile(r'^\{([^,{}"]+),\s*"((?:[^"]|"")*)"(?:,\s*"((?:[^"]|"")*)")?')
+
+# Папка базы: 5 блоков через "-" (как в check_missing_folders.sh), служебные snccntx* не учитываются
+FOLDER_PATTERN = re.compile(r'^[^-]+-[^-]+-[^-]+-[^-]+-[^-]+$')
+SERVICE_PREFIX = 'snccntx'
+
+# ============================================================================
+# Список баз кластера
+# ============================================================================
+def parse_cluster_list(path):
+    """
+    Разбирает 1CV8Clst.lst
+    :param path: Путь к файлу
+    :return: Словарь {ID папки: {'name': имя базы, 'description': описание}}
+    """
+    index = {}
+    with open(path, 'r', encoding='utf-8-sig', errors='replace') as f:
+        for line in f:
+            match = LIST_ENTRY.match(line.strip())
+            if not match or match.group(1).strip() in index:
+                continue
+            index[match.group(1).strip()] = {
+                'name': match.group(2).replace('""', '"'),
+                'description': (match.group(3) or '').replace('""', '"'),
+            }
+    return index
+
+def is_infobase_folder(name):
+    return bool(FOLDER_PATTERN.match(name)) and not name.startswith(SERVICE_PREFIX)
+
+# ============================================================================
+# Размеры
+# ============================================================================
+def format_size(size):
+    """
+    Размер в удобочитаемом виде (как du -h), допускается отрицательный (изменение размера)
+    """
+    sign = '-' if size < 0 else ''
+    size = abs(size)
+    for unit, factor in (('ГБ', 1 << 30), ('МБ', 1 << 20), ('КБ', 1 << 10)):
+        if size >= factor:
+            return f"{sign}{size / factor:.2f} {unit}"
+    return f"{sign}{size:.0f} Б"
+
+def scan_directory(path, cached=None, max_age=None):
+    """
+    Один уровень каталога: файлы суммируются, подкаталоги возвращаются для обхода
+    Ссылки не раскрываются (как du)
+    :param cached: Запись кэша каталога (mtime_ns, имена файлов, имена подкаталогов, время проверки) или None
+    :param max_age: Возраст записи кэша, после которого каталог перечитывается, сек (None - без ограничения)
+    :return: Кортеж (байт, файлов, список подкаталогов, ошибка или None, новая запись кэша, взят ли из кэша)
+    """
+    now = time.time()
+    try:
+        mtime_ns = os.stat(path, follow_symlinks=False).st_mtime_ns
+    except OSError as e:
+        return 0, 0, [], str(e), None, False
+    # Время изменения каталога меняется только при создании/удалении/переименовании записей в нем,
+    # поэтому у неизмененного каталога не перечитывается только список записей; размеры файлов
+    # запрашиваются всегда - дозапись в существующий файл (рост .1CD) время каталога не меняет
+    if cached and cached[0] == mtime_ns and (max_age is None or now - cached[3] < max_age):
+        _, names, subdir_names, _ = cached
+        size = files = 0
+        for name in names:
+            try:
+                size += os.stat(os.path.join(path, name), follow_symlinks=False).st_size
+                files += 1
+            except OSError:
+                continue
+        return size, files, [os.path.join(path, name) for name in subdir_names], None, cached, True
+
+    size = 0
+    names = []
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    else:
+                        size += entry.stat(follow_symlinks=False).st_size
+                        names.append(entry.name)
+                except OSError:
+                    continue
+    except OSError as e:
+        return size, len(names), subdirs, str(e), None, False
+    entry = (mtime_ns, names, [os.path.basename(subdir) for subdir in subdirs], now)
+    return size, len(names), subdirs, None, entry, False
+
+def measure_folders(folders, workers=None, cache=None, max_age=None):
+    """
+    Размеры деревьев каталогов одним параллельным проходом
+    Каждый каталог любого уровня - отдельная задача пула потоков, поэтому крупные базы
+    обходятся всеми потоками, а не одним
+    :param folders: Список путей к корневым каталогам
+    :param workers: Количество потоков
+    :param cache: Кэш каталогов {путь: запись} (см. scan_directory); заменяется записями этого прохода
+    :param max_age: Возраст записи кэша, после которого каталог перечитывается, сек
+    :return: Словарь {путь: {'bytes', 'files', 'dirs', 'cached_dirs', 'errors'}}
+    """
+    workers = workers or min(32, (os.cpu_count() or 1) * 4)
+    previous = dict(cache) if cache is not None else {}
+    if cache is not None:
+        cache.clear()
+    totals = {folder: {'bytes': 0, 'files': 0, 'dirs': 0, 'cached_dirs': 0, 'errors': 0} for folder in folders}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(scan_directory, folder, previous.get(folder), max_age): (folder, folder)
+                   for folder in folders}
+        while pending:
+            # Завершенные каталоги учитываются, их подкаталоги ставятся в очередь
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                root, path = pending.pop(future)
+                size, files, subdirs, error, entry, reused = future.result()
+                stats = totals[root]
+                stats['bytes'] += size
+                stats['files'] += files
+                stats['dirs'] += 1
+                stats['cached_dirs'] += 1 if reused else 0
+                stats['errors'] += 1 if error else 0
+                if cache is not None and entry:
+                    cache[path] = entry
+                for subdir in subdirs:
+                    pending[executor.submit(scan_directory, subdir, previous.get(subdir), max_age)] = (root, subdir)
+    return totals
+
+# ============================================================================
+# Опись
+# ============================================================================
+def take_inventory(cluster_dir='.', list_file=None, workers=None, cache=None, max_age=None):
+    """
+    Опись каталога кластера за один проход
+    :param cluster_dir: Каталог кластера (reg_XXXX), где лежат 1CV8Clst.lst и папки баз
+    :param list_file: Путь к 1CV8Clst.lst (по умолчанию в cluster_dir)
+    :param workers: Количество потоков
+    :param cache: Кэш каталогов (см. measure_folders), обновляется
+    :param max_age: Возраст записи кэша, после которого каталог перечитывается, сек
+    :return: Словарь: listed (базы кластера), orphans (папки не из списка), absent (ID из списка без папки)
+    """
+    cluster_dir = os.path.abspath(cluster_dir)
+    index = parse_cluster_list(list_file or os.path.join(cluster_dir, CLUSTER_LIST))
+    with os.scandir(cluster_dir) as entries:
+        folders = sorted(entry.name for entry in entries
+                         if entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.'))
+
+    listed_folders = [name for name in folders if name in index]
+    orphan_folders = [name for name in folders if name not in index and is_infobase_folder(name)]
+    sizes = measure_folders([os.path.join(cluster_dir, name) for name in listed_folders + orphan_folders],
+                            workers, cache, max_age)
+
+    def rows(names, with_index):
+        result = []
+        for name in names:
+            row = {'folder': name, **sizes[os.path.join(cluster_dir, name)]}
+            if with_index:
+                row.update(index[name])
+            result.append(row)
+        return sorted(result, key=lambda row: -row['bytes'])
+
+    return {
+        'cluster_dir': cluster_dir,
+        'listed': rows(listed_folders, True),
+        'orphans': rows(orphan_folders, False),
+        'absent': sorted(name for name in index if name not in set(folders)),
+    }
+
+def print_inventory(inventory, show_listed=True, show_orphans=True):
+    if show_listed:
+        print(f"📋 Существующие папки из {CLUSTER_LIST} (отсортировано по размеру ↓):")
+        print('-' * 50)
+        for row in inventory['listed']:
+            description = f" {row['description']}" if row['description'] else ''
+            print(f"{row['folder']:<40} {'(' + format_size(row['bytes']) + ')':<12} \"{row['name']}\"{description}")
+        print('-' * 50)
+        total = sum(row['bytes'] for row in inventory['listed'])
+        print(f"📊 Баз в кластере: {len(inventory['listed'])}, общий размер: {format_size(total)}")
+        if inventory['absent']:
+            print(f"⚠️  В списке без папки на диске: {len(inventory['absent'])}")
+        print()
+
+    if show_orphans:
+        if not inventory['orphans']:
+            print(f"✅ Все папки (соответствующие правилам) присутствуют в {CLUSTER_LIST}.")
+            return
+        print(f"📂 Папки, отсутствующие в {CLUSTER_LIST} (отсортировано по размеру ↓):")
+        print('-' * 50)
+        for row in inventory['orphans']:
+            print(f"➖ {row['folder']} (размер: {format_size(row['bytes'])}, файлов: {row['files']})")
+        print('-' * 50)
+        total = sum(row['bytes'] for row in inventory['orphans'])
+        print(f"📊 Общий размер отсутствующих папок: {format_size(total)}")
+        print(f"🔢 Всего отсутствует в списке: {len(inventory['orphans'])} папок.")
+
+# ============================================================================
+# Основная функция
+# ============================================================================
+def main():
+    parser = argparse.ArgumentParser(
+        description='Опись каталога кластера 1С: базы по размеру и папки-сироты (замена dir_clst.sh '
+                    'и check_missing_folders.sh)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  cd /home/usr1cv8/.1cv8/1C/1cv8/reg_1541 && %(prog)s
+  %(prog)s /home/usr1cv8/.1cv8/1C/1cv8/reg_1541 --orphans
+  %(prog)s /home/usr1cv8/.1cv8/1C/1cv8/reg_1541 --json > inventory.json
+  %(prog)s /home/usr1cv8/.1cv8/1C/1cv8/reg_1541 --db /var/lib/1c/clst_sizes.db   # снимок + кэш каталогов
+        """
+    )
+    parser.add_argument('cluster_dir', nargs='?', default='.', help='Каталог кластера (по умолчанию: текущий)')
+    parser.add_argument('--list', type=str, default=None, help=f'Файл списка баз (по умолчанию: {CLUSTER_LIST})')
+    parser.add_argument('--listed', action='store_true', help='Только список баз кластера')
+    parser.add_argument('--orphans', action='store_true', help='Только папки-сироты')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Количество потоков обхода (по умолчанию: ядер x 4, не больше 32)')
+    parser.add_argument('--json', action='store_true', help='Вывод в JSON')
+    parser.add_argument('--db', type=str, default=None,
+                        help='База SQLite снимков (clst_snapshots.py): сохранить снимок и использовать кэш каталогов')
+    parser.add_argument('--max-age', type=float, default=24,
+                        help='Перечитывать каталоги из кэша не реже, чем раз в N часов (по умолчанию: 24)')
+    parser.add_argument('--full', action='store_true', help='Перечитать все каталоги, не используя кэш')
+    args = parser.parse_args()
+
+    list_file = args.list or os.path.join(args.cluster_dir, CLUSTER_LIST)
+    if not os.path.isfile(list_file):
+        print(f"❌ Ошибка: Файл {list_file} не найден!")
+        sys.exit(1)
+
+    start_time = time.time()
+    store = cache = None
+    if args.db:
+        from clst_snapshots import SnapshotStore
+        store = SnapshotStore(args.db)
+        cache = {} if args.full else store.load_cache(os.path.abspath(args.cluster_dir))
+    try:
+        inventory = take_inventory(args.cluster_dir, list_file, args.workers, cache, args.max_age * 3600)
+        if store:
+            store.save_cache(inventory['cluster_dir'], cache)
+            store.add_snapshot(inventory, start_time, time.time() - start_time)
+    finally:
+        if store:
+            store.close()
+    if args.json:
+        print(json.dumps(inventory, ensure_ascii=False, indent=1))
+        return
+
+    both = not args.listed and not args.orphans
+    print_inventory(inventory, both or args.listed, both or args.orphans)
+    folders = len(inventory['listed']) + len(inventory['orphans'])
+    rows = inventory['listed'] + inventory['orphans']
+    dirs = sum(row['dirs'] for row in rows)
+    cached = sum(row['cached_dirs'] for row in rows)
+    print(f"⏱  Обход {folders} папок ({dirs} каталогов" + (f", без изменений: {cached}" if args.db else "") +
+          f"): {time.time() - start_time:.2f} сек")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Освобождение места от папок-сирот кластера 1С (замена rm -rf в check_missing_folders.sh)
+
+quarantine - папки из отчета о сиротах мгновенно переносятся (rename) в карантин на той же файловой
+системе: <кластер>/.quarantine/<ГГГГММДД_ЧЧММСС>/<папка>. Перед переносом 1CV8Clst.lst перечитывается,
+папки, появившиеся в списке, пропускаются.
+purge - партии карантина старше срока хранения удаляются параллельно (каждый подкаталог - отдельная задача).
+restore - возврат папки из карантина, list - содержимое карантина.
+
+Каждое действие записывается в журнал .quarantine/reclaim_journal.jsonl (JSON Lines).
+Имена папок передаются только списками путей, без оболочки.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from clst_inventory import CLUSTER_LIST, parse_cluster_list, is_infobase_folder, take_inventory, format_size
+
+# Каталог карантина внутри каталога кластера (скрытый - опись его не учитывает)
+QUARANTINE_DIR = '.quarantine'
+JOURNAL_FILE = 'reclaim_journal.jsonl'
+
+# Формат имени партии карантина
+BATCH_FORMAT = '%Y%m%d_%H%M%S'
+
+DEFAULT_RETENTION_DAYS = 7
+
+# ============================================================================
+# Журнал
+# ============================================================================
+def append_journal(journal_file, journal_lock, record):
+    """
+    Дописывает запись в журнал и сбрасывает на диск (журнал читается после сбоя)
+    """
+    record = {'time': datetime.now().isoformat(timespec='seconds'), **record}
+    with journal_lock:
+        journal_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        journal_file.flush()
+        os.fsync(journal_file.fileno())
+
+def load_journal(journal_path):
+    """
+    :return: Список записей журнала (поврежденные строки пропускаются)
+    """
+    records = []
+    if not os.path.exists(journal_path):
+        return records
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+def quarantined_sizes(journal_path):
+    """
+    Размеры папок на момент переноса в карантин (чтобы не обходить дерево перед удалением)
+    :return: Словарь {путь в карантине: байт}
+    """
+    return {record['to']: record.get('bytes', 0) for record in load_journal(journal_path)
+            if record.get('action') == 'quarantine' and record.get('status') == 'ok'}
+
+# ============================================================================
+# Карантин
+# ============================================================================
+def select_orphans(orphans, folders=None, min_size=0):
+    """
+    Отбор папок из отчета о сиротах
+    :param orphans: Список словарей отчета (folder, bytes, ...)
+    :param folders: Только эти папки (None - все)
+    :param min_size: Только папки не меньше min_size байт
+    """
+    wanted = set(folders) if folders else None
+    return [row for row in orphans
+            if (wanted is None or row['folder'] in wanted) and row['bytes'] >= min_size]
+
+def check_same_filesystem(cluster_dir, quarantine):
+    """
+    Перенос должен быть rename в пределах одной файловой системы, иначе это копирование
+    """
+    parent = quarantine if os.path.isdir(quarantine) else os.path.dirname(os.path.abspath(quarantine))
+    if os.stat(cluster_dir).st_dev != os.stat(parent).st_dev:
+        raise ValueError(f"Карантин {quarantine} на другой файловой системе, чем {cluster_dir}")
+
+def quarantine_folders(cluster_dir, orphans, quarantine, journal_file, journal_lock, list_file=None, dry_run=False):
+    """
+    Переносит папки в новую партию карантина
+    :param orphans: Список словарей отчета (folder, bytes)
+    :return: Словарь счетчиков: moved, skipped, errors, bytes, batch
+    """
+    batch = os.path.join(quarantine, datetime.now().strftime(BATCH_FORMAT))
+    result = {'moved': 0, 'skipped': 0, 'errors': 0, 'bytes': 0, 'batch': batch}
+    # Список перечитывается непосредственно перед переносом: база могла быть зарегистрирована после отчета
+    listed = parse_cluster_list(list_file or os.path.join(cluster_dir, CLUSTER_LIST))
+    if not dry_run:
+        os.makedirs(batch, exist_ok=True)
+
+    for row in orphans:
+        folder = row['folder']
+        source = os.path.join(cluster_dir, folder)
+        target = os.path.join(batch, folder)
+        record = {'action': 'quarantine', 'folder': folder, 'from': source, 'to': target, 'bytes': row['bytes']}
+        if folder in listed or not is_infobase_folder(folder) or not os.path.isdir(source):
+            reason = 'в списке кластера' if folder in listed else 'не папка базы'
+            print(f"⏭  {folder}: пропущена ({reason})")
+            result['skipped'] += 1
+            if not dry_run:
+                append_journal(journal_file, journal_lock, {**record, 'status': 'skipped', 'error': reason})
+            continue
+        if dry_run:
+            print(f"➖ {folder} ({format_size(row['bytes'])}) -> {target}")
+            result['moved'] += 1
+            result['bytes'] += row['bytes']
+            continue
+        try:
+            os.rename(source, target)
+        except OSError as e:
+            print(f"❌ {folder}: {e}")
+            result['errors'] += 1
+            append_journal(journal_file, journal_lock, {**record, 'status': 'error', 'error': str(e)})
+            continue
+        print(f"➖ {folder} ({format_size(row['bytes'])}) -> карантин")
+        result['moved'] += 1
+        result['bytes'] += row['bytes']
+        append_journal(journal_file, journal_lock, {**record, 'status': 'ok'})
+    return result
+
+def quarantine_batches(quarantine):
+    """
+    Партии карантина
+    :return: Список (путь партии, время создания, список папок) по возрастанию времени
+    """
+    batches = []
+    if not os.path.isdir(quarantine):
+        return batches
+    with os.scandir(quarantine) as entries:
+        for entry in entries:
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            try:
+                created = datetime.strptime(entry.name, BATCH_FORMAT).timestamp()
+            except ValueError:
+                continue
+            folders = sorted(name for name in os.listdir(entry.path))
+            batches.append((entry.path, created, folders))
+    return sorted(batches, key=lambda batch: batch[1])
+
+def restore_folder(cluster_dir, quarantine, folder, journal_file, journal_lock):
+    """
+    Возвращает папку из самой новой партии карантина, где она есть
+    """
+    for batch, _, folders in reversed(quarantine_batches(quarantine)):
+        if folder not in folders:
+            continue
+        source = os.path.join(batch, folder)
+        target = os.path.join(cluster_dir, folder)
+        if os.path.exists(target):
+            raise ValueError(f"{target} уже существует")
+        os.rename(source, target)
+        append_journal(journal_file, journal_lock,
+                       {'action': 'restore', 'folder': folder, 'from': source, 'to': target, 'status': 'ok'})
+        if len(folders) == 1:
+            os.rmdir(batch)
+        return source
+    raise ValueError(f"Папка {folder} в карантине не найдена")
+
+# ============================================================================
+# Удаление
+# ============================================================================
+def remove_path(path):
+    """
+    Удаляет файл или дерево
+    :return: Текст ошибки или None
+    """
+    try:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.unlink(path)
+    except OSError as e:
+        return str(e)
+    return None
+
+def purge_quarantine(quarantine, retention_days, journal_file, journal_lock, workers=None, dry_run=False):
+    """
+    Параллельно удаляет партии карантина старше retention_days
+    Задачи пула - элементы первого уровня каждой папки, поэтому крупная база удаляется несколькими потоками
+    :return: Словарь счетчиков: folders, bytes, errors, batches
+    """
+    workers = workers or min(16, (os.cpu_count() or 1) * 2)
+    deadline = time.time() - retention_days * 86400
+    sizes = quarantined_sizes(os.path.join(quarantine, JOURNAL_FILE))
+    expired = [(batch, folders) for batch, created, folders in quarantine_batches(quarantine) if created <= deadline]
+    result = {'folders': 0, 'bytes': 0, 'errors': 0, 'batches': 0}
+
+    for batch, folders in expired:
+        for folder in folders:
+            print(f"🗑  {os.path.join(batch, folder)} ({format_size(sizes.get(os.path.join(batch, folder), 0))})")
+    if dry_run or not expired:
+        result['folders'] = sum(len(folders) for _, folders in expired)
+        result['bytes'] = sum(sizes.get(os.path.join(batch, folder), 0) for batch, folders in expired for folder in folders)
+        result['batches'] = len(expired)
+        return result
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for batch, folders in expired:
+            for folder in folders:
+                path = os.path.join(batch, folder)
+                children = [os.path.join(path, name) for name in os.listdir(path)] if os.path.isdir(path) else [path]
+                futures.update({executor.submit(remove_path, child): path for child in children})
+        folder_errors = {}
+        for future in as_completed(futures):
+            error = future.result()
+            if error:
+                folder_errors.setdefault(futures[future], []).append(error)
+
+    for batch, folders in expired:
+        for folder in folders:
+            path = os.path.join(batch, folder)
+            error = '; '.join(folder_errors.get(path, [])) or None
+            if not error and os.path.isdir(path):
+                try:
+                    os.rmdir(path)
+                except OSError as e:
+                    error = str(e)
+            record = {'action': 'purge', 'folder': folder, 'from': path, 'bytes': sizes.get(path, 0)}
+            if error:
+                result['errors'] += 1
+                print(f"❌ {path}: {error}")
+                append_journal(journal_file, journal_lock, {**record, 'status': 'error', 'error': error})
+            else:
+                result['folders'] += 1
+                result['bytes'] += sizes.get(path, 0)
+                append_journal(journal_file, journal_lock, {**record, 'status': 'ok'})
+        try:
+            os.rmdir(batch)
+            result['batches'] += 1
+        except OSError:
+            pass
+    return result
+
+# ============================================================================
+# Основная функция
+# ============================================================================
+def confirm(question):
+    answer = input(f"{question} (y/N) ")
+    return answer.strip().lower() in ('y', 'yes', 'д', 'да')
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Освобождение места от папок-сирот кластера 1С через карантин',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  %(prog)s quarantine /home/usr1cv8/.1cv8/1C/1cv8/reg_1541 --dry-run
+  %(prog)s quarantine /home/usr1cv8/.1cv8/1C/1cv8/reg_1541 --from inventory.json --min-size-mb 100
+  %(prog)s quarantine . --folders 0c2c...-...,1f3e...-... --yes
+  %(prog)s list .
+  %(prog)s restore . 0c2c5b9e-1c7a-4b7e-9a43-1b2f3c4d5e6f
+  %(prog)s purge . --retention-days 7 --workers 8 --yes     # в cron
+        """
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    quarantine_parser = subparsers.add_parser('quarantine', help='Перенести папки-сироты в карантин')
+    quarantine_parser.add_argument('--from', dest='report', type=str, default=None,
+                                   help='Отчет clst_inventory.py --json (по умолчанию: опись выполняется заново)')
+    quarantine_parser.add_argument('--folders', type=str, default=None, help='Только эти папки (через запятую)')
+    quarantine_parser.add_argument('--min-size-mb', type=float, default=0, help='Только папки не меньше N МБ')
+    quarantine_parser.add_argument('--list', type=str, default=None,
+                                   help=f'Файл списка баз (по умолчанию: {CLUSTER_LIST})')
+
+    purge_parser = subparsers.add_parser('purge', help='Удалить партии карантина старше срока хранения')
+    purge_parser.add_argument('--retention-days', type=float, default=DEFAULT_RETENTION_DAYS,
+                              help=f'Срок хранения в карантине, дней (по умолчанию: {DEFAULT_RETENTION_DAYS})')
+    purge_parser.add_argument('--workers', type=int, default=None, help='Потоков удаления (по умолчанию: ядер x 2)')
+
+    restore_parser = subparsers.add_parser('restore', help='Вернуть папку из карантина')
+
+    list_parser = subparsers.add_parser('list', help='Содержимое карантина')
+
+    for subparser in (quarantine_parser, purge_parser, restore_parser, list_parser):
+        subparser.add_argument('cluster_dir', nargs='?', default='.', help='Каталог кластера (по умолчанию: текущий)')
+        subparser.add_argument('--quarantine', type=str, default=None,
+                               help=f'Каталог карантина (по умолчанию: <кластер>/{QUARANTINE_DIR})')
+    for subparser in (quarantine_parser, purge_parser):
+        subparser.add_argument('--dry-run', action='store_true', help='Только показать, что будет сделано')
+        subparser.add_argument('--yes', action='store_true', help='Не спрашивать подтверждение')
+    # Папка - после каталога кластера: restore <каталог кластера> <папка> (или restore <папка>)
+    restore_parser.add_argument('folder', help='Папка базы')
+    args = parser.parse_args()
+
+    cluster_dir = os.path.abspath(args.cluster_dir)
+    quarantine = os.path.abspath(args.quarantine or os.path.join(cluster_dir, QUARANTINE_DIR))
+    journal_path = os.path.join(quarantine, JOURNAL_FILE)
+
+    if args.command == 'list':
+        sizes = quarantined_sizes(journal_path)
+        batches = quarantine_batches(quarantine)
+        if not batches:
+            print("Карантин пуст")
+            return
+        for batch, created, folders in batches:
+            age = (time.time() - created) / 86400
+            total = sum(sizes.get(os.path.join(batch, folder), 0) for folder in folders)
+            print(f"📦 {os.path.basename(batch)} (возраст {age:.1f} дн., {len(folders)} папок, {format_size(total)})")
+            for folder in folders:
+                print(f"    {folder} ({format_size(sizes.get(os.path.join(batch, folder), 0))})")
+        return
+
+    if args.command == 'quarantine':
+        if args.report:
+            with open(args.report, 'r', encoding='utf-8') as f:
+                report = json.load(f)
+            # Отчет другого кластера (reg_XXXX) к этому не применяется
+            report_dir = report.get('cluster_dir')
+            if not report_dir or os.path.realpath(report_dir) != os.path.realpath(cluster_dir):
+                print(f"❌ Ошибка: Отчет {args.report} составлен для {report_dir or 'неизвестного каталога'}, "
+                      f"а не для {cluster_dir}")
+                sys.exit(1)
+            orphans = report['orphans']
+        else:
+            list_file = args.list or os.path.join(cluster_dir, CLUSTER_LIST)
+            if not os.path.isfile(list_file):
+                print(f"❌ Ошибка: Файл {list_file} не найден!")
+                sys.exit(1)
+            orphans = take_inventory(cluster_dir, list_file)['orphans']
+        folders = [name.strip() for name in args.folders.split(',') if name.strip()] if args.folders else None
+        orphans = select_orphans(orphans, folders, int(args.min_size_mb * 1048576))
+        if not orphans:
+            print("✅ Папок-сирот для переноса нет.")
+            return
+        total = sum(row['bytes'] for row in orphans)
+        try:
+            check_same_filesystem(cluster_dir, quarantine)
+        except ValueError as e:
+            print(f"❌ Ошибка: {e}")
+            sys.exit(1)
+        if not args.dry_run and not args.yes and not confirm(
+                f"Перенести {len(orphans)} папок ({format_size(total)}) в карантин {quarantine}?"):
+            print("Отменено")
+            return
+    elif args.command == 'purge' and not args.dry_run and not args.yes and not confirm(
+            f"Удалить партии карантина старше {args.retention_days} дн. из {quarantine}?"):
+        print("Отменено")
+        return
+
+    dry_run = getattr(args, 'dry_run', False)
+    if args.command == 'quarantine' and not dry_run:
+        os.makedirs(quarantine, exist_ok=True)
+    elif args.command == 'restore' and not os.path.isdir(quarantine):
+        print(f"❌ Ошибка: Карантин {quarantine} не найден, папка {args.folder} не возвращена")
+        sys.exit(1)
+    elif args.command != 'quarantine' and not os.path.isdir(quarantine):
+        print("Карантин пуст")
+        return
+
+    start_time = time.time()
+    journal_lock = threading.Lock()
+    # При --dry-run журнал не ведется
+    with open(os.devnull if dry_run else journal_path, 'a', encoding='utf-8') as journal_file:
+        if args.command == 'restore':
+            try:
+                source = restore_folder(cluster_dir, quarantine, args.folder, journal_file, journal_lock)
+            except (ValueError, OSError) as e:
+                print(f"❌ Ошибка: {e}")
+                sys.exit(1)
+            print(f"✅ {args.folder} возвращена из {source}")
+            return
+
+        if args.command == 'quarantine':
+            result = quarantine_folders(cluster_dir, orphans, quarantine, journal_file, journal_lock,
+                                        args.list, dry_run)
+            prefix = "Будет перенесено" if dry_run else "Перенесено в карантин"
+            print(f"📊 {prefix}: {result['moved']} папок, {format_size(result['bytes'])}; "
+                  f"пропущено: {result['skipped']}, ошибок: {result['errors']}")
+        else:
+            result = purge_quarantine(quarantine, args.retention_days, journal_file, journal_lock,
+                                      args.workers, dry_run)
+            prefix = "Будет удалено" if dry_run else "Удалено"
+            print(f"📊 {prefix}: {result['folders']} папок из {result['batches']} партий, "
+                  f"{format_size(result['bytes'])}; ошибок: {result['errors']}")
+    print(f"⏱  Время: {time.time() - start_time:.2f} сек")
+    sys.exit(1 if result.get('errors') else 0)
+
+if __name__ == "__main__":
+    main()
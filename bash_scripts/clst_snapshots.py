@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+История размеров папок баз кластера 1С (SQLite) и отчет о росте
+
+Каждый запуск clst_inventory.py --db сохраняет снимок: размер и число файлов каждой папки базы.
+В той же базе хранится кэш каталогов (время изменения, сумма файлов, подкаталоги), по которому
+следующий запуск не перечитывает неизмененные каталоги.
+
+trend - базы, растущие быстрее всего (наклон по снимкам за период), runs - список запусков.
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+from datetime import datetime
+from clst_inventory import format_size
+
+# Файл базы по умолчанию (рядом со скриптом)
+DEFAULT_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'clst_sizes.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cluster_dir TEXT NOT NULL,
+    started REAL NOT NULL,
+    seconds REAL NOT NULL,
+    dirs INTEGER NOT NULL,
+    cached_dirs INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sizes (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    folder TEXT NOT NULL,
+    name TEXT,
+    kind TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    files INTEGER NOT NULL,
+    PRIMARY KEY (run_id, folder)
+);
+CREATE INDEX IF NOT EXISTS sizes_folder ON sizes(folder, run_id);
+CREATE TABLE IF NOT EXISTS dir_cache (
+    cluster_dir TEXT NOT NULL,
+    path TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    files TEXT NOT NULL,
+    subdirs TEXT NOT NULL,
+    checked REAL NOT NULL,
+    PRIMARY KEY (cluster_dir, path)
+);
+"""
+
+SECONDS_PER_DAY = 86400
+
+# Минимальный интервал между первым и последним снимком для расчета роста в день, часов
+MIN_TREND_HOURS = 1
+
+# ============================================================================
+# Хранилище снимков
+# ============================================================================
+class SnapshotStore:
+    """
+    Снимки размеров и кэш каталогов в SQLite
+    Используется только из основного потока
+    """
+
+    def __init__(self, path=DEFAULT_DB):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA foreign_keys=ON')
+        # Кэш прежнего формата (суммы размеров вместо имен файлов) просто пересоздается
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(dir_cache)')]
+        if 'bytes' in columns:
+            self.connection.execute('DROP TABLE dir_cache')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def load_cache(self, cluster_dir):
+        """
+        :return: Кэш каталогов {путь: (mtime_ns, имена файлов, имена подкаталогов, время проверки)}
+        """
+        rows = self.connection.execute(
+            'SELECT path, mtime_ns, files, subdirs, checked FROM dir_cache WHERE cluster_dir = ?',
+            (cluster_dir,)
+        )
+        return {path: (mtime_ns, json.loads(files), json.loads(subdirs), checked)
+                for path, mtime_ns, files, subdirs, checked in rows}
+
+    def save_cache(self, cluster_dir, cache):
+        """
+        Заменяет кэш каталогов кластера (удаленные каталоги из него пропадают)
+        """
+        with self.connection:
+            self.connection.execute('DELETE FROM dir_cache WHERE cluster_dir = ?', (cluster_dir,))
+            self.connection.executemany(
+                'INSERT INTO dir_cache VALUES (?, ?, ?, ?, ?, ?)',
+                ((cluster_dir, path, mtime_ns, json.dumps(files, ensure_ascii=False),
+                  json.dumps(subdirs, ensure_ascii=False), checked)
+                 for path, (mtime_ns, files, subdirs, checked) in cache.items())
+            )
+
+    def add_snapshot(self, inventory, started, seconds):
+        """
+        Сохраняет снимок описи (результат take_inventory)
+        :return: Номер запуска
+        """
+        rows = [(row, 'listed') for row in inventory['listed']] + [(row, 'orphan') for row in inventory['orphans']]
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO runs (cluster_dir, started, seconds, dirs, cached_dirs) VALUES (?, ?, ?, ?, ?)',
+                (inventory['cluster_dir'], started, seconds,
+                 sum(row['dirs'] for row, _ in rows), sum(row['cached_dirs'] for row, _ in rows))
+            )
+            run_id = cursor.lastrowid
+            self.connection.executemany(
+                'INSERT INTO sizes VALUES (?, ?, ?, ?, ?, ?)',
+                ((run_id, row['folder'], row.get('name'), kind, row['bytes'], row['files']) for row, kind in rows)
+            )
+        return run_id
+
+    def runs(self, cluster_dir=None, limit=20):
+        query = 'SELECT r.id, r.cluster_dir, r.started, r.seconds, r.dirs, r.cached_dirs, ' \
+                'COUNT(s.folder), COALESCE(SUM(s.bytes), 0) FROM runs r LEFT JOIN sizes s ON s.run_id = r.id'
+        params = ()
+        if cluster_dir:
+            query += ' WHERE r.cluster_dir = ?'
+            params = (cluster_dir,)
+        query += ' GROUP BY r.id ORDER BY r.id DESC LIMIT ?'
+        return self.connection.execute(query, params + (limit,)).fetchall()
+
+    def history(self, cluster_dir, since):
+        """
+        :return: Список (папка, имя, вид, время запуска, байт, файлов) по возрастанию времени
+        """
+        return self.connection.execute(
+            'SELECT s.folder, s.name, s.kind, r.started, s.bytes, s.files FROM sizes s '
+            'JOIN runs r ON r.id = s.run_id WHERE r.cluster_dir = ? AND r.started >= ? '
+            'ORDER BY r.started', (cluster_dir, since)
+        ).fetchall()
+
+    def prune(self, keep_days):
+        """
+        Удаляет снимки старше keep_days дней
+        :return: Количество удаленных запусков
+        """
+        with self.connection:
+            cursor = self.connection.execute('DELETE FROM runs WHERE started < ?',
+                                             (time.time() - keep_days * SECONDS_PER_DAY,))
+        return cursor.rowcount
+
+# ============================================================================
+# Отчет о росте
+# ============================================================================
+def slope(points):
+    """
+    Наклон прямой по методу наименьших квадратов
+    :param points: Список (x, y)
+    """
+    count = len(points)
+    if count < 2:
+        return 0.0
+    mean_x = sum(x for x, _ in points) / count
+    mean_y = sum(y for _, y in points) / count
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if not variance:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+def growth_trend(store, cluster_dir, days=30):
+    """
+    Рост папок за период
+    :return: Список словарей (folder, name, kind, bytes, first_bytes, change, per_day, percent_per_day, points),
+             по убыванию роста в день
+    """
+    folders = {}
+    for folder, name, kind, started, size, files in store.history(cluster_dir, time.time() - days * SECONDS_PER_DAY):
+        item = folders.setdefault(folder, {'folder': folder, 'name': name, 'kind': kind, 'points': []})
+        item['name'], item['kind'] = name or item['name'], kind
+        item['points'].append((started / SECONDS_PER_DAY, size))
+
+    result = []
+    for item in folders.values():
+        points = item.pop('points')
+        span = points[-1][0] - points[0][0]
+        # На коротком интервале наклон бессмыслен (снимки с разницей в минуты дают гигабайты в день)
+        per_day = slope(points) if span * 24 >= MIN_TREND_HOURS else 0.0
+        first, last = points[0][1], points[-1][1]
+        result.append({
+            **item,
+            'bytes': last,
+            'first_bytes': first,
+            'change': last - first,
+            'per_day': per_day,
+            'percent_per_day': per_day * 100 / first if first else 0.0,
+            'points': len(points),
+            'days': span,
+        })
+    return sorted(result, key=lambda row: -row['per_day'])
+
+def print_trend(rows, days, top=20):
+    print(f"📈 Рост папок баз за {days} дн. (отсортировано по росту в день ↓):")
+    print(f"{'Папка':<38} {'Имя':<20} {'Размер':>11} {'Изменение':>11} {'В день':>11} {'%/день':>7} {'Снимков':>7}")
+    print('-' * 111)
+    for row in rows[:top]:
+        name = (row['name'] or ('(сирота)' if row['kind'] == 'orphan' else ''))[:20]
+        print(f"{row['folder']:<38} {name:<20} {format_size(row['bytes']):>11} {format_size(row['change']):>11} "
+              f"{format_size(row['per_day']):>11} {row['percent_per_day']:>7.2f} {row['points']:>7}")
+    print('-' * 111)
+    total_per_day = sum(row['per_day'] for row in rows)
+    total = sum(row['bytes'] for row in rows)
+    print(f"📊 Всего: {format_size(total)}, рост {format_size(total_per_day)} в день "
+          f"(~{format_size(total_per_day * 30)} в месяц)")
+
+# ============================================================================
+# Основная функция
+# ============================================================================
+def main():
+    parser = argparse.ArgumentParser(
+        description='История размеров папок баз кластера 1С и отчет о росте',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  clst_inventory.py /home/usr1cv8/.1cv8/1C/1cv8/reg_1541 --db /var/lib/1c/clst_sizes.db   # снимок (cron, ежечасно)
+  %(prog)s trend /home/usr1cv8/.1cv8/1C/1cv8/reg_1541 --db /var/lib/1c/clst_sizes.db --days 30
+  %(prog)s runs --db /var/lib/1c/clst_sizes.db
+  %(prog)s prune --db /var/lib/1c/clst_sizes.db --keep-days 365
+        """
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    trend_parser = subparsers.add_parser('trend', help='Базы, растущие быстрее всего')
+    trend_parser.add_argument('cluster_dir', nargs='?', default='.', help='Каталог кластера (по умолчанию: текущий)')
+    trend_parser.add_argument('--days', type=int, default=30, help='Период, дней (по умолчанию: 30)')
+    trend_parser.add_argument('--top', type=int, default=20, help='Количество строк (по умолчанию: 20)')
+    trend_parser.add_argument('--json', action='store_true', help='Вывод в JSON')
+
+    runs_parser = subparsers.add_parser('runs', help='Список запусков')
+    runs_parser.add_argument('--limit', type=int, default=20, help='Количество запусков (по умолчанию: 20)')
+
+    prune_parser = subparsers.add_parser('prune', help='Удалить старые снимки')
+    prune_parser.add_argument('--keep-days', type=int, default=365, help='Хранить дней (по умолчанию: 365)')
+
+    for subparser in (trend_parser, runs_parser, prune_parser):
+        subparser.add_argument('--db', type=str, default=DEFAULT_DB, help=f'Файл базы (по умолчанию: {DEFAULT_DB})')
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.db):
+        print(f"❌ Ошибка: База {args.db} не найдена, сначала выполните clst_inventory.py --db {args.db}")
+        sys.exit(1)
+
+    store = SnapshotStore(args.db)
+    try:
+        if args.command == 'trend':
+            rows = growth_trend(store, os.path.abspath(args.cluster_dir), args.days)
+            if not rows:
+                print(f"Нет снимков для {os.path.abspath(args.cluster_dir)} за {args.days} дн.")
+                sys.exit(1)
+            if args.json:
+                print(json.dumps(rows[:args.top], ensure_ascii=False, indent=1))
+            else:
+                print_trend(rows, args.days, args.top)
+        elif args.command == 'runs':
+            print(f"{'№':>5} {'Время':<19} {'Сек':>7} {'Каталогов':>10} {'Из кэша':>8} {'Папок':>6} {'Размер':>11}  Кластер")
+            for run_id, cluster_dir, started, seconds, dirs, cached, folders, size in store.runs(limit=args.limit):
+                print(f"{run_id:>5} {datetime.fromtimestamp(started):%Y-%m-%d %H:%M:%S} {seconds:>7.2f} "
+                      f"{dirs:>10} {cached:>8} {folders:>6} {format_size(size):>11}  {cluster_dir}")
+        else:
+            print(f"Удалено запусков: {store.prune(args.keep_days)}")
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Каталог выгрузок .dt (SQLite): путь, размер, время изменения, хэш и база-источник
+
+Скрипты восстановления ищут самую новую выгрузку через find ... | sort -n | tail -1 и каждый раз заново
+считают ее размер и MD5. Каталог обновляется инкрементально: быстрый проход scandir пропускает файлы
+с прежними размером и временем изменения, пропавшие файлы удаляет; команда watch следит за каталогами
+через inotify (если установлен inotify_simple) или повторяет проход по интервалу.
+
+Хэши берутся из файлов <выгрузка>.digest.json, которые пишет dt_transfer.py, или считаются по --hash
+(и сохраняются туда же), поэтому копирование сверяет копию с уже известной суммой.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import argparse
+from datetime import datetime
+from dt_transfer import DEFAULT_ALGORITHM, hash_file, load_source_digest, save_source_digest
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+# Файл базы по умолчанию (рядом со скриптом)
+DEFAULT_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dt_catalog.db')
+
+# Код выхода при ошибке (1 у newest - выгрузка не найдена)
+ERROR_EXIT_CODE = 2
+
+# Имя базы из имени выгрузки: <база>_20250101....dt, <база>-2025-01-01....dt
+DEFAULT_IB_PATTERN = r'^(?P<ib>.+?)[_-]\d{4}-?\d{2}-?\d{2}'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dumps (
+    path TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    infobase TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    algorithm TEXT,
+    digest TEXT,
+    scanned REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dumps_dir ON dumps(dir, mtime_ns);
+CREATE INDEX IF NOT EXISTS dumps_infobase ON dumps(infobase, mtime_ns);
+"""
+
+COLUMNS = ('path', 'dir', 'name', 'infobase', 'size', 'mtime_ns', 'algorithm', 'digest', 'scanned')
+
+def infobase_name(path, ib_pattern=DEFAULT_IB_PATTERN):
+    """
+    Имя базы-источника: группа ib шаблона по имени файла, иначе имя каталога выгрузки
+    """
+    match = re.search(ib_pattern, os.path.basename(path)) if ib_pattern else None
+    if match and match.groupdict().get('ib'):
+        return match.group('ib')
+    return os.path.basename(os.path.dirname(os.path.abspath(path)))
+
+def parse_date(value):
+    """
+    Дата для --before: 2025-01-01 или 2025-01-01T03:00
+    :return: Время в наносекундах
+    """
+    return int(datetime.fromisoformat(value).timestamp() * 1e9)
+
+# ============================================================================
+# Каталог
+# ============================================================================
+class DtCatalog:
+    """
+    Выгрузки .dt в SQLite
+    Используется только из основного потока
+    """
+
+    def __init__(self, path=DEFAULT_DB, ib_pattern=DEFAULT_IB_PATTERN, algorithm=DEFAULT_ALGORITHM,
+                 digest_cache=None):
+        self.path = path
+        self.ib_pattern = ib_pattern
+        self.algorithm = algorithm
+        self.digest_cache = digest_cache
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def row(self, values):
+        return dict(zip(COLUMNS, values)) if values else None
+
+    def get(self, path):
+        return self.row(self.connection.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM dumps WHERE path = ?", (os.path.abspath(path),)).fetchone())
+
+    def record(self, path, stat=None, digest=None):
+        """
+        Добавляет или обновляет выгрузку; хэш - переданный или из файла dt_transfer.py
+        :return: Запись
+        """
+        path = os.path.abspath(path)
+        stat = stat or os.stat(path)
+        digest = digest or load_source_digest(path, self.algorithm, self.digest_cache)
+        values = (path, os.path.dirname(path), os.path.basename(path), infobase_name(path, self.ib_pattern),
+                  stat.st_size, stat.st_mtime_ns, self.algorithm if digest else None, digest, time.time())
+        with self.connection:
+            self.connection.execute(f"INSERT OR REPLACE INTO dumps VALUES ({', '.join('?' * len(COLUMNS))})", values)
+        return self.row(values)
+
+    def remove(self, path):
+        with self.connection:
+            self.connection.execute('DELETE FROM dumps WHERE path = ?', (os.path.abspath(path),))
+
+    def set_digest(self, path, size, mtime_ns, digest, algorithm=None):
+        """
+        Сохраняет хэш, если файл в каталоге с теми же размером и временем изменения
+        """
+        with self.connection:
+            self.connection.execute(
+                'UPDATE dumps SET algorithm = ?, digest = ? WHERE path = ? AND size = ? AND mtime_ns = ?',
+                (algorithm or self.algorithm, digest, os.path.abspath(path), size, mtime_ns))
+
+    def digest(self, path):
+        """
+        Хэш из каталога, если файл не изменился с момента записи
+        :return: Хэш или None
+        """
+        row = self.get(path)
+        if not row or not row['digest'] or row['algorithm'] != self.algorithm:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if (stat.st_size, stat.st_mtime_ns) != (row['size'], row['mtime_ns']):
+            return None
+        return row['digest']
+
+    def update_dir(self, directory, compute_hash=False):
+        """
+        Инкрементальный проход каталога: новые и измененные .dt записываются, пропавшие удаляются
+        :param compute_hash: Посчитать хэш выгрузок без хэша (сохраняется и для dt_transfer.py)
+        :return: Словарь: added, changed, removed, unchanged, hashed
+        """
+        directory = os.path.abspath(directory)
+        known = {row[0]: row[1:] for row in self.connection.execute(
+            'SELECT path, size, mtime_ns, algorithm, digest FROM dumps WHERE dir = ?', (directory,))}
+        stats = {'added': 0, 'changed': 0, 'removed': 0, 'unchanged': 0, 'hashed': 0}
+        seen = set()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.dt') or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                path = os.path.join(directory, entry.name)
+                seen.add(path)
+                previous = known.get(path)
+                unchanged = previous and previous[:2] == (stat.st_size, stat.st_mtime_ns)
+                has_digest = unchanged and previous[3] and previous[2] == self.algorithm
+                if has_digest:
+                    stats['unchanged'] += 1
+                    continue
+                digest = load_source_digest(path, self.algorithm, self.digest_cache)
+                if not digest and compute_hash:
+                    digest = hash_file(path, self.algorithm)
+                    save_source_digest(path, digest, self.algorithm, self.digest_cache)
+                    stats['hashed'] += 1
+                if unchanged and not digest:
+                    stats['unchanged'] += 1
+                    continue
+                self.record(path, stat, digest)
+                stats['unchanged' if unchanged else 'changed' if previous else 'added'] += 1
+
+        vanished = [path for path in known if path not in seen]
+        with self.connection:
+            self.connection.executemany('DELETE FROM dumps WHERE path = ?', ((path,) for path in vanished))
+        stats['removed'] = len(vanished)
+        return stats
+
+    def query(self, directory=None, infobase=None, before=None, limit=None):
+        """
+        Выгрузки по убыванию времени изменения
+        :param before: Только измененные раньше этого времени, нс
+        """
+        conditions, params = [], []
+        if directory:
+            conditions.append('dir = ?')
+            params.append(os.path.abspath(directory))
+        if infobase:
+            conditions.append('infobase = ?')
+            params.append(infobase)
+        if before:
+            conditions.append('mtime_ns < ?')
+            params.append(before)
+        query = f"SELECT {', '.join(COLUMNS)} FROM dumps"
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY mtime_ns DESC'
+        if limit:
+            query += f' LIMIT {int(limit)}'
+        return [self.row(values) for values in self.connection.execute(query, params)]
+
+    def newest(self, directory=None, infobase=None, before=None):
+        """
+        Самая новая выгрузка, которая еще существует на диске (вместо find | sort -n | tail -1)
+        Если файл изменился после записи в каталог, хэш не возвращается
+        :return: Запись или None
+        """
+        for row in self.query(directory, infobase, before):
+            try:
+                stat = os.stat(row['path'])
+            except OSError:
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (row['size'], row['mtime_ns']):
+                row.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns, algorithm=None, digest=None)
+            return row
+        return None
+
+# ============================================================================
+# Наблюдение за каталогами
+# ============================================================================
+def watch(catalog, directories, compute_hash=False, interval=60, on_change=None):
+    """
+    Поддерживает каталог в актуальном состоянии: inotify (inotify_simple) или проход каждые interval секунд
+    :param on_change: Функция (действие, путь)
+    """
+    directories = [os.path.abspath(directory) for directory in directories]
+    for directory in directories:
+        catalog.update_dir(directory, compute_hash)
+
+    if INotify is None:
+        while True:
+            time.sleep(interval)
+            for directory in directories:
+                stats = catalog.update_dir(directory, compute_hash)
+                if on_change and (stats['added'] or stats['changed'] or stats['removed']):
+                    on_change('update', f"{directory}: {stats}")
+
+    inotify = INotify()
+    mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.DELETE | flags.MOVED_FROM
+    watches = {inotify.add_watch(directory, mask): directory for directory in directories}
+    while True:
+        for event in inotify.read(timeout=interval * 1000):
+            if event.mask & flags.Q_OVERFLOW:
+                # Очередь событий переполнена - полный проход
+                for directory in directories:
+                    catalog.update_dir(directory, compute_hash)
+                continue
+            if not event.name.endswith('.dt') or event.wd not in watches:
+                continue
+            path = os.path.join(watches[event.wd], event.name)
+            if event.mask & (flags.DELETE | flags.MOVED_FROM):
+                catalog.remove(path)
+                action = 'remove'
+            else:
+                try:
+                    digest = None
+                    if compute_hash:
+                        digest = hash_file(path, catalog.algorithm)
+                        save_source_digest(path, digest, catalog.algorithm, catalog.digest_cache)
+                    catalog.record(path, digest=digest)
+                except OSError:
+                    continue
+                action = 'record'
+            if on_change:
+                on_change(action, path)
+
+# ============================================================================
+# Вывод
+# ============================================================================
+def print_rows(rows):
+    print(f"{'Изменен':<19} {'МБ':>10} {'База':<24} {'Хэш':<34} Файл")
+    for row in rows:
+        print(f"{datetime.fromtimestamp(row['mtime_ns'] / 1e9):%Y-%m-%d %H:%M:%S} {row['size'] / 1048576:>10.1f} "
+              f"{row['infobase'][:24]:<24} {(row['digest'] or '-'):<34} {row['path']}")
+
+# ============================================================================
+# Основная функция
+# ============================================================================
+def main():
+    parser = argparse.ArgumentParser(
+        description='Каталог выгрузок .dt: поиск самой новой выгрузки без find | sort и повторного хэширования',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  %(prog)s update /backups/1c/buh /backups/1c/zup --hash
+  %(prog)s watch /backups/1c/buh /backups/1c/zup                 # inotify или проход каждые 60 сек
+  %(prog)s newest --dir /backups/1c/buh                           # путь самой новой выгрузки
+  %(prog)s newest --ib buh --before 2025-01-01 --json
+  %(prog)s list --ib buh --limit 10
+        """
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    update_parser = subparsers.add_parser('update', help='Инкрементальный проход каталогов')
+    update_parser.add_argument('directories', nargs='+', help='Каталоги с выгрузками')
+    update_parser.add_argument('--hash', action='store_true', help='Посчитать хэш выгрузок без хэша')
+
+    watch_parser = subparsers.add_parser('watch', help='Следить за каталогами')
+    watch_parser.add_argument('directories', nargs='+', help='Каталоги с выгрузками')
+    watch_parser.add_argument('--hash', action='store_true', help='Считать хэш новых выгрузок')
+    watch_parser.add_argument('--interval', type=int, default=60,
+                              help='Интервал прохода без inotify, сек (по умолчанию: 60)')
+
+    newest_parser = subparsers.add_parser('newest', help=f'Самая новая выгрузка (код 1 - не найдена, '
+                                                         f'{ERROR_EXIT_CODE} - ошибка)')
+    newest_parser.add_argument('--no-refresh', action='store_true',
+                               help='Не обновлять каталог --dir перед запросом (работает watch)')
+    newest_parser.add_argument('--json', action='store_true', help='Запись в JSON вместо пути')
+
+    list_parser = subparsers.add_parser('list', help='Список выгрузок')
+    list_parser.add_argument('--limit', type=int, default=50, help='Количество строк (по умолчанию: 50)')
+    list_parser.add_argument('--json', action='store_true', help='Вывод в JSON')
+
+    for subparser in (newest_parser, list_parser):
+        subparser.add_argument('--dir', type=str, default=None, help='Каталог выгрузок (source_dir)')
+        subparser.add_argument('--ib', type=str, default=None, help='База-источник')
+        subparser.add_argument('--before', type=str, default=None, help='Изменена раньше даты (2025-01-01[T03:00])')
+    for subparser in (update_parser, watch_parser, newest_parser, list_parser):
+        subparser.add_argument('--db', type=str, default=DEFAULT_DB, help=f'Файл базы (по умолчанию: {DEFAULT_DB})')
+        subparser.add_argument('--ib-pattern', type=str, default=DEFAULT_IB_PATTERN,
+                               help='Регулярное выражение с группой ib для имени базы по имени файла '
+                                    '(иначе имя каталога)')
+        subparser.add_argument('--algorithm', type=str, default=DEFAULT_ALGORITHM,
+                               help=f'Алгоритм хэша (по умолчанию: {DEFAULT_ALGORITHM})')
+        subparser.add_argument('--digest-cache', type=str, default=None,
+                               help='Каталог кэша хэшей dt_transfer.py (по умолчанию: рядом с выгрузкой)')
+    args = parser.parse_args()
+
+    try:
+        before = parse_date(args.before) if getattr(args, 'before', None) else None
+    except ValueError:
+        print(f"Неверная дата: {args.before}", file=sys.stderr)
+        sys.exit(ERROR_EXIT_CODE)
+
+    catalog = None
+    try:
+        catalog = DtCatalog(args.db, args.ib_pattern, args.algorithm, args.digest_cache)
+        if args.command == 'update':
+            for directory in args.directories:
+                start = time.perf_counter()
+                stats = catalog.update_dir(directory, args.hash)
+                print(f"{directory}: новых {stats['added']}, изменено {stats['changed']}, удалено {stats['removed']}, "
+                      f"без изменений {stats['unchanged']}, посчитано хэшей {stats['hashed']} "
+                      f"({time.perf_counter() - start:.2f} сек)")
+        elif args.command == 'watch':
+            print(f"Наблюдение за {', '.join(args.directories)} "
+                  f"({'inotify' if INotify else f'проход каждые {args.interval} сек'})", flush=True)
+            try:
+                watch(catalog, args.directories, args.hash, args.interval,
+                      on_change=lambda action, path: print(f"{action}: {path}", flush=True))
+            except KeyboardInterrupt:
+                pass
+        elif args.command == 'newest':
+            if args.dir and not args.no_refresh:
+                catalog.update_dir(args.dir)
+            row = catalog.newest(args.dir, args.ib, before)
+            if not row:
+                sys.exit(1)
+            print(json.dumps(row, ensure_ascii=False) if args.json else row['path'])
+        else:
+            rows = catalog.query(args.dir, args.ib, before, args.limit)
+            if args.json:
+                print(json.dumps(rows, ensure_ascii=False, indent=1))
+            else:
+                print_rows(rows)
+    except (OSError, sqlite3.Error) as e:
+        # stdout newest читают скрипты восстановления как путь выгрузки - ошибки только в stderr
+        print(f"Ошибка: {e}", file=sys.stderr)
+        sys.exit(ERROR_EXIT_CODE)
+    finally:
+        if catalog:
+            catalog.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Копирование .dt с проверкой за одно чтение (замена md5sum + rsync + md5sum в restore_1c_db.sh и restoreDB.sh)
+
+Скрипты читают многогигабайтный файл трижды: хэш источника, копирование, хэш копии. Здесь файл
+читается один раз через большой переиспользуемый буфер, хэш считается по ходу записи.
+Режим kernel копирует через copy_file_range/sendfile (без копирования данных в Python), а хэш
+источника параллельно считает отдельный поток.
+
+Копия пишется во временный файл .part, сбрасывается на диск (fsync) и переименовывается после
+сверки хэша. Хэш источника сохраняется рядом с ним (<файл>.digest.json, размер и время изменения),
+поэтому повторное восстановление той же выгрузки не считает хэш источника заново, а сверяет с ним копию.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+
+# Алгоритм по умолчанию - как md5sum в скриптах восстановления
+DEFAULT_ALGORITHM = 'md5'
+
+# Буфер чтения/записи и блок copy_file_range
+BUFFER_SIZE = 16 * 1024 * 1024
+
+# Суффикс файла с хэшем источника
+DIGEST_SUFFIX = '.digest.json'
+
+# Режимы копирования
+MODES = ('buffer', 'kernel')
+
+# ============================================================================
+# Кэш хэша источника
+# ============================================================================
+def sidecar_path(source, cache_dir=None):
+    """
+    Файл с хэшем источника: рядом с источником или в cache_dir (если каталог выгрузок только для чтения)
+    """
+    if not cache_dir:
+        return source + DIGEST_SUFFIX
+    key = hashlib.sha1(os.path.abspath(source).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{key}_{os.path.basename(source)}{DIGEST_SUFFIX}")
+
+def load_source_digest(source, algorithm=DEFAULT_ALGORITHM, cache_dir=None):
+    """
+    Хэш источника из кэша, если размер и время изменения файла не изменились
+    :return: Хэш или None
+    """
+    try:
+        with open(sidecar_path(source, cache_dir), 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        stat = os.stat(source)
+    except (OSError, ValueError):
+        return None
+    if (cached.get('algorithm') == algorithm and cached.get('size') == stat.st_size
+            and cached.get('mtime_ns') == stat.st_mtime_ns):
+        return cached.get('digest')
+    return None
+
+def save_source_digest(source, digest, algorithm=DEFAULT_ALGORITHM, cache_dir=None):
+    """
+    Сохраняет хэш источника
+    :return: True, если удалось записать
+    """
+    stat = os.stat(source)
+    record = {'file': os.path.basename(source), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+              'algorithm': algorithm, 'digest': digest}
+    path = sidecar_path(source, cache_dir)
+    try:
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+    except OSError:
+        return False
+    return True
+
+# ============================================================================
+# Копирование
+# ============================================================================
+def copy_buffered(source, target, algorithm=DEFAULT_ALGORITHM, buffer_size=BUFFER_SIZE, on_progress=None):
+    """
+    Одно чтение источника: блок читается в переиспользуемый буфер, пишется и добавляется в хэш
+    :return: Кортеж (хэш записанных данных, байт)
+    """
+    hasher = hashlib.new(algorithm)
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    copied = 0
+    with open(source, 'rb', buffering=0) as reader, open(target, 'wb', buffering=0) as writer:
+        while True:
+            size = reader.readinto(buffer)
+            if not size:
+                break
+            chunk = view[:size]
+            written = 0
+            while written < size:
+                written += writer.write(chunk[written:])
+            hasher.update(chunk)
+            copied += size
+            if on_progress:
+                on_progress(copied)
+        os.fsync(writer.fileno())
+    return hasher.hexdigest(), copied
+
+def hash_file(path, algorithm=DEFAULT_ALGORITHM, buffer_size=BUFFER_SIZE, drop_cache=False):
+    """
+    Хэш файла через переиспользуемый буфер
+    :param drop_cache: Сбросить файл из кэша страниц перед чтением (проверка того, что реально на диске)
+    """
+    hasher = hashlib.new(algorithm)
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as reader:
+        if drop_cache and hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(reader.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        while True:
+            size = reader.readinto(buffer)
+            if not size:
+                break
+            hasher.update(view[:size])
+    return hasher.hexdigest()
+
+def copy_kernel(source, target, algorithm=DEFAULT_ALGORITHM, buffer_size=BUFFER_SIZE, on_progress=None):
+    """
+    Копирование в ядре (copy_file_range, при ошибке - sendfile), хэш источника - в параллельном потоке
+    Данные не проходят через Python; поток хэша читает источник из кэша страниц, прогретого копированием.
+    Записанные в копию байты не хэшируются: хэш подтверждает только неизменность источника, копию
+    проверяет лишь verify_target
+    :return: Кортеж (хэш источника, байт)
+    """
+    result = {}
+
+    def hash_source():
+        try:
+            result['digest'] = hash_file(source, algorithm, buffer_size)
+        except OSError as e:
+            result['error'] = e
+
+    hasher = threading.Thread(target=hash_source, daemon=True)
+    hasher.start()
+
+    size = os.path.getsize(source)
+    copied = 0
+    use_copy_range = hasattr(os, 'copy_file_range')
+    with open(source, 'rb') as reader, open(target, 'wb') as writer:
+        source_fd, target_fd = reader.fileno(), writer.fileno()
+        while copied < size:
+            count = min(buffer_size, size - copied)
+            if use_copy_range:
+                try:
+                    sent = os.copy_file_range(source_fd, target_fd, count, copied, copied)
+                except OSError:
+                    # Старое ядро или разные файловые системы - переходим на sendfile. copy_file_range
+                    # пишет по явному смещению, а sendfile - с текущей позиции файла, поэтому она
+                    # переносится за уже скопированные байты
+                    use_copy_range = False
+                    os.lseek(target_fd, copied, os.SEEK_SET)
+                    continue
+            else:
+                sent = os.sendfile(target_fd, source_fd, copied, count)
+            if not sent:
+                break
+            copied += sent
+            if on_progress:
+                on_progress(copied)
+        os.fsync(target_fd)
+
+    hasher.join()
+    if 'error' in result:
+        raise result['error']
+    if copied != size:
+        raise RuntimeError(f"Скопировано {copied} байт из {size}: {source}")
+    return result['digest'], copied
+
+def fsync_directory(path):
+    """
+    Сброс на диск записи каталога (переименование файла)
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def transfer(source, target_dir, algorithm=DEFAULT_ALGORITHM, mode='buffer', buffer_size=BUFFER_SIZE,
+             verify_target=False, digest_cache=None, on_progress=None, expected_digest=None,
+             verify_uncached=False):
+    """
+    Копирует .dt в target_dir с проверкой хэша
+    :param source: Исходный файл
+    :param target_dir: Каталог назначения
+    :param algorithm: Алгоритм хэша (md5, sha256, ...)
+    :param mode: buffer - одно чтение через буфер Python, kernel - copy_file_range/sendfile + поток хэша
+                 (в режиме kernel копия проверяется только перечитыванием, см. copy_kernel)
+    :param verify_target: Дополнительно перечитать копию с диска после fsync (минуя кэш страниц)
+    :param digest_cache: Каталог кэша хэшей (по умолчанию рядом с источником)
+    :param on_progress: Функция (скопировано байт)
+    :param expected_digest: Известный хэш источника (из dt_catalog.py) вместо кэша
+    :param verify_uncached: Перечитать копию, если ее нечем проверить иначе: хэш источника еще неизвестен
+                            (первое копирование выгрузки) или режим kernel
+    :return: Словарь: source, target, bytes, digest, cached_digest, verified_target, verified,
+             copy_seconds, verify_seconds, mode
+    """
+    if mode not in MODES:
+        raise ValueError(f"Неизвестный режим копирования: {mode}")
+    os.makedirs(target_dir, exist_ok=True)
+    target = os.path.join(target_dir, os.path.basename(source))
+    part = target + '.part'
+    cached_digest = expected_digest or load_source_digest(source, algorithm, digest_cache)
+    # Сверка с сохраненным хэшем проверяет копию только в режиме buffer (хэшируются записанные байты);
+    # без сохраненного хэша или в режиме kernel сверяется перечитанная копия
+    checks_copy = bool(cached_digest) and mode == 'buffer'
+    verify_target = verify_target or (verify_uncached and not checks_copy)
+    stat = os.stat(source)
+
+    start = time.perf_counter()
+    try:
+        copy = copy_kernel if mode == 'kernel' else copy_buffered
+        digest, copied = copy(source, part, algorithm, buffer_size, on_progress)
+        copy_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if cached_digest and cached_digest != digest:
+            raise RuntimeError(f"Контрольные суммы не совпадают: сохраненная {cached_digest}, прочитанная {digest}")
+        if verify_target:
+            target_digest = hash_file(part, algorithm, buffer_size, drop_cache=True)
+            if target_digest != digest:
+                raise RuntimeError(f"Контрольные суммы не совпадают: исходная {digest}, копия {target_digest}")
+        verify_seconds = time.perf_counter() - start
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+
+    # Время изменения как у источника (rsync -a)
+    os.utime(part, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.replace(part, target)
+    fsync_directory(target_dir)
+    if not cached_digest:
+        save_source_digest(source, digest, algorithm, digest_cache)
+
+    return {
+        'source': source,
+        'target': target,
+        'bytes': copied,
+        'digest': digest,
+        'algorithm': algorithm,
+        'cached_digest': bool(cached_digest),
+        'verified_target': bool(verify_target),
+        'verified': checks_copy or bool(verify_target),
+        'copy_seconds': round(copy_seconds, 3),
+        'verify_seconds': round(verify_seconds, 3),
+        'mode': mode,
+    }
+
+# ============================================================================
+# Основная функция
+# ============================================================================
+def main():
+    parser = argparse.ArgumentParser(
+        description='Копирование .dt с проверкой контрольной суммы за одно чтение',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  %(prog)s /backups/1c/base_20250101.dt /tmp/1c_restore
+  %(prog)s /backups/1c/base_20250101.dt /tmp/1c_restore --mode kernel --verify-target
+  %(prog)s /backups/1c/base_20250101.dt /tmp/1c_restore --verify-uncached
+  %(prog)s /backups/1c/base_20250101.dt /tmp/1c_restore --digest-cache ~/.cache/dt_digest --json
+  %(prog)s /backups/1c/base_20250101.dt /tmp/1c_restore --catalog /var/lib/1c/dt_catalog.db
+        """
+    )
+    parser.add_argument('source', help='Файл .dt')
+    parser.add_argument('target_dir', help='Каталог назначения')
+    parser.add_argument('--algorithm', type=str, default=DEFAULT_ALGORITHM,
+                        help=f'Алгоритм хэша (по умолчанию: {DEFAULT_ALGORITHM})')
+    parser.add_argument('--mode', choices=MODES, default='buffer',
+                        help='buffer - одно чтение через буфер, kernel - copy_file_range/sendfile '
+                             'и параллельный поток хэша (по умолчанию: buffer)')
+    parser.add_argument('--buffer-mb', type=int, default=BUFFER_SIZE // 1048576,
+                        help=f'Размер буфера, МБ (по умолчанию: {BUFFER_SIZE // 1048576})')
+    parser.add_argument('--verify-target', action='store_true',
+                        help='Перечитать копию с диска после записи (минуя кэш страниц)')
+    parser.add_argument('--verify-uncached', action='store_true',
+                        help='Перечитать копию, только если хэш источника еще не сохранен (первое копирование)')
+    parser.add_argument('--digest-cache', type=str, default=None,
+                        help='Каталог кэша хэшей источников (по умолчанию: рядом с источником)')
+    parser.add_argument('--catalog', type=str, default=None,
+                        help='Файл каталога выгрузок dt_catalog.py: хэш источника берется из него и сохраняется в него')
+    parser.add_argument('--events', type=str, default=None,
+                        help='Журнал этапов restore_log.py (JSON Lines): этапы copy и verify')
+    parser.add_argument('--json', action='store_true', help='Результат в JSON')
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.source):
+        print(f"Файл {args.source} не найден")
+        sys.exit(1)
+
+    events = None
+    if args.events:
+        from restore_log import EventLog
+        events = EventLog(args.events)
+    catalog = None
+    if args.catalog:
+        from dt_catalog import DtCatalog
+        catalog = DtCatalog(args.catalog, algorithm=args.algorithm, digest_cache=args.digest_cache)
+    try:
+        result = transfer(args.source, args.target_dir, args.algorithm, args.mode, args.buffer_mb * 1048576,
+                          args.verify_target, args.digest_cache,
+                          expected_digest=catalog.digest(args.source) if catalog else None,
+                          verify_uncached=args.verify_uncached)
+        if catalog:
+            catalog.record(args.source, digest=result['digest'])
+    except (OSError, RuntimeError, ValueError) as e:
+        if events:
+            events.event('error', phase='copy', file=os.path.basename(args.source), error=str(e))
+            events.close()
+        print(f"Ошибка: {e}")
+        sys.exit(1)
+    finally:
+        if catalog:
+            catalog.close()
+
+    if events:
+        name = os.path.basename(args.source)
+        events.record_span('copy', result['copy_seconds'], result['bytes'], file=name, mode=result['mode'])
+        if result['verified']:
+            events.record_span('verify', result['verify_seconds'],
+                               result['bytes'] if result['verified_target'] else None,
+                               file=name, cached_digest=result['cached_digest'])
+        events.close()
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+        return
+    speed = result['bytes'] / 1048576 / result['copy_seconds'] if result['copy_seconds'] else 0
+    print(f"Скопирован {result['target']}: {result['bytes'] / 1048576:.1f} МБ за {result['copy_seconds']:.2f} сек "
+          f"({speed:.1f} МБ/с)")
+    checks = []
+    if result['cached_digest']:
+        checks.append("совпадает с сохраненной")
+    else:
+        checks.append("сохранена для следующих запусков")
+    if result['verified_target']:
+        checks.append("копия перечитана с диска и совпадает")
+    if not result['verified']:
+        reason = "в режиме kernel хэш считается по источнику" if result['cached_digest'] else "сохраненной суммы нет"
+        checks.append(f"КОПИЯ НЕ ПРОВЕРЕНА: {reason}, для сверки нужен --verify-target")
+    print(f"{result['algorithm'].upper()}: {result['digest']} ({'; '.join(checks)})")
+
+if __name__ == "__main__":
+    main()
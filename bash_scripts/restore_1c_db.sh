@@ -15,6 +15,7 @@ LOG_FILE_1C="$HOME/logs/1c_restore_1c.log"
 MAX_LOG_SIZE=$((5*1024*1024))  # 5MB
 LOG_LEVEL="DEBUG"               # DEBUG, INFO, WARN, ERROR
 MAX_LOG_BACKUPS=3              # Количество бэкапов
+EVENTS_FILE="$HOME/logs/1c_restore_events.jsonl"  # Этапы в JSON Lines (restore_log.py)
 
 # =============================================
 # ФУНКЦИИ (ОБНОВЛЕННЫЕ)
@@ -66,8 +67,9 @@ rotate_logs() {
 }
 
 log() {
-    local level=$1 msg=$2
-    local timestamp=$(date '+%Y-%m-%d %H:%M:%S')
+    local level=$1 msg=$2 timestamp
+    # Время без запуска date на каждую строку
+    printf -v timestamp '%(%Y-%m-%d %H:%M:%S)T' -1
     local entry="[$timestamp] [$level] $msg"
     
     # Фильтр по уровню
@@ -78,10 +80,16 @@ log() {
         "ERROR") [[ $level != "ERROR" ]] && return ;;
     esac
     
-    rotate_logs
     echo "$entry" >> "$LOG_FILE"  # Только добавление в конец
 }
 
+# Завершенный этап в журнал событий: emit_span <этап> <время начала EPOCHREALTIME> [байт]
+emit_span() {
+    [ "$USE_DT_TRANSFER" = "1" ] || return 0
+    python3 "$SCRIPT_DIR/restore_log.py" emit --events "$EVENTS_FILE" --phase "$1" --started "$2" \
+        ${3:+--bytes "$3"} || log "WARN" "Не удалось записать этап $1 в $EVENTS_FILE"
+}
+
 # =============================================
 # ИНИЦИАЛИЗАЦИЯ ЛОГА (КРИТИЧНО ВАЖНЫЙ БЛОК)
 # =============================================
@@ -95,6 +103,9 @@ else
     exec 3>/dev/null
 fi
 
+# Ротация один раз при запуске: после exec >> вывод все равно идет в открытый файл
+rotate_logs
+
 # Инициализация лога (гарантированно не перезаписывает)
 safe_log_init
 
@@ -160,17 +171,47 @@ log "INFO" "Исходная директория: $source_dir"
 log "INFO" "Целевая директория: $target_dir"
 [ -n "$PATH_1C" ] && log "INFO" "Путь к 1С: $PATH_1C"
 
-# Проверка зависимостей
-for cmd in rsync md5sum; do
-    command -v "$cmd" &>/dev/null || {
-        log "ERROR" "Не установлена утилита: $cmd"
-        exit 1
-    }
-done
+# Общие поля событий этого запуска (restore_log.py, dt_transfer.py)
+export RESTORE_RUN_ID="$(date '+%Y%m%d_%H%M%S')_$$" RESTORE_INFOBASE="$IB_NAME" RESTORE_SERVER="$SERVER_NAME"
+
+# Проверка зависимостей: копирование с проверкой за одно чтение (dt_transfer.py),
+# без python3 - прежний путь md5sum + rsync + md5sum
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+USE_DT_TRANSFER=0
+if command -v python3 &>/dev/null && [ -f "$SCRIPT_DIR/dt_transfer.py" ]; then
+    USE_DT_TRANSFER=1
+else
+    for cmd in rsync md5sum; do
+        command -v "$cmd" &>/dev/null || {
+            log "ERROR" "Не установлена утилита: $cmd"
+            exit 1
+        }
+    done
+fi
 
 # Поиск самого нового .dt файла
-log "INFO" "Поиск самого нового .dt файла в $source_dir"
-youngest_file=$(find "$source_dir" -maxdepth 1 -type f -name "*.dt" -printf "%T@ %p\n" | sort -n | tail -1 | cut -d' ' -f2-)
+# CATALOG_DB в конфигурации - выгрузка и ее MD5 берутся из каталога dt_catalog.py
+# EPOCHREALTIME пишется с разделителем локали (в ru_RU - запятая)
+find_started=${EPOCHREALTIME/,/.}
+if [ "$USE_DT_TRANSFER" = "1" ] && [ -n "$CATALOG_DB" ]; then
+    log "INFO" "Поиск самого нового .dt файла в $source_dir по каталогу $CATALOG_DB"
+    # Код 1 - выгрузка не найдена, 2 - ошибка каталога; stdout - только путь, ошибки читаются из stderr отдельно
+    catalog_errors=$(mktemp)
+    youngest_file=$(python3 "$SCRIPT_DIR/dt_catalog.py" newest --dir "$source_dir" --db "$CATALOG_DB" 2>"$catalog_errors")
+    catalog_code=$?
+    catalog_error=$(<"$catalog_errors")
+    rm -f "$catalog_errors"
+    if [ $catalog_code -gt 1 ]; then
+        log "ERROR" "Ошибка каталога выгрузок $CATALOG_DB: $catalog_error"
+        exit 1
+    elif [ $catalog_code -eq 1 ]; then
+        youngest_file=""
+    fi
+else
+    log "INFO" "Поиск самого нового .dt файла в $source_dir"
+    youngest_file=$(find "$source_dir" -maxdepth 1 -type f -name "*.dt" -printf "%T@ %p\n" | sort -n | tail -1 | cut -d' ' -f2-)
+fi
+emit_span find "$find_started"
 
 if [ -z "$youngest_file" ]; then
     log "INFO" "Файлы .dt не найдены"
@@ -181,47 +222,62 @@ filename=$(basename "$youngest_file")
 file_size=$(du -h "$youngest_file" | cut -f1)
 
 log "INFO" "Найден файл: $filename (Размер: $file_size)"
-log "INFO" "Вычисление контрольной суммы..."
-src_checksum=$(md5sum "$youngest_file" | awk '{print $1}')
-log "INFO" "MD5: $src_checksum"
+if [ "$USE_DT_TRANSFER" = "1" ]; then
+    # --verify-uncached: без сохраненной суммы источника (первое копирование) копия перечитывается с диска
+    log "INFO" "Копирование в $target_dir с подсчетом MD5 за одно чтение..."
+    transfer_output=$(python3 "$SCRIPT_DIR/dt_transfer.py" "$youngest_file" "$target_dir" --verify-uncached ${CATALOG_DB:+--catalog "$CATALOG_DB"} --events "$EVENTS_FILE" 2>&1) || {
+        log "ERROR" "Ошибка копирования: $transfer_output"
+        exit 1
+    }
+    while IFS= read -r line; do
+        log "INFO" "$line"
+    done <<< "$transfer_output"
+else
+    log "INFO" "Вычисление контрольной суммы..."
+    src_checksum=$(md5sum "$youngest_file" | awk '{print $1}')
+    log "INFO" "MD5: $src_checksum"
 
-# Копирование файла
-mkdir -p "$target_dir" || {
-    log "ERROR" "Ошибка создания целевой директории"
-    exit 1
-}
+    # Копирование файла
+    mkdir -p "$target_dir" || {
+        log "ERROR" "Ошибка создания целевой директории"
+        exit 1
+    }
 
-log "INFO" "Копирование в $target_dir..."
-{
-    rsync -ah "$youngest_file" "$target_dir/" &
-    RSYNC_PID=$!
+    log "INFO" "Копирование в $target_dir..."
+    {
+        rsync -ah "$youngest_file" "$target_dir/" &
+        RSYNC_PID=$!
     
-    # Выводим сообщение каждую минуту
-    while kill -0 $RSYNC_PID 2>/dev/null; do
-        echo "$(date): Копирование выполняется..."
-        sleep 180
-    done
+        # Выводим сообщение каждую минуту
+        while kill -0 $RSYNC_PID 2>/dev/null; do
+            echo "$(date): Копирование выполняется..."
+            sleep 180
+        done
     
-    wait $RSYNC_PID
-} || {
-    log "ERROR" "Ошибка копирования"
-    exit 1
-}
+        wait $RSYNC_PID
+    } || {
+        log "ERROR" "Ошибка копирования"
+        exit 1
+    }
 
-# Проверка целостности
-dest_checksum=$(md5sum "$target_dir/$filename" | awk '{print $1}')
-if [ "$src_checksum" != "$dest_checksum" ]; then
-    log "ERROR" "Контрольные суммы не совпадают!"
-    log "INFO" "Исходная: $src_checksum"
-    log "INFO" "Копия: $dest_checksum"
-    exit 1
+    # Проверка целостности
+    dest_checksum=$(md5sum "$target_dir/$filename" | awk '{print $1}')
+    if [ "$src_checksum" != "$dest_checksum" ]; then
+        log "ERROR" "Контрольные суммы не совпадают!"
+        log "INFO" "Исходная: $src_checksum"
+        log "INFO" "Копия: $dest_checksum"
+        exit 1
+    fi
 fi
 
 # set -x
 # xhost
 # Загрузка в 1С
 log "INFO" "Загрузка dt"
-"$PATH_1C/ibcmd" infobase restore --db-server="$SERVER_NAME" --dbms=PostgreSQL --db-name="$IB_NAME" --db-user="$PG_USER" --db-pwd="$PG_PWD" --user=""$DB_USER"" --password=""$DB_PASS"" "$target_dir/$filename"
+# Загрузка как этап restore в журнале событий (код возврата сохраняется)
+restore_span=()
+[ "$USE_DT_TRANSFER" = "1" ] && restore_span=(python3 "$SCRIPT_DIR/restore_log.py" run --events "$EVENTS_FILE" --phase restore --bytes "$(stat -c%s "$target_dir/$filename")" --)
+"${restore_span[@]}" "$PATH_1C/ibcmd" infobase restore --db-server="$SERVER_NAME" --dbms=PostgreSQL --db-name="$IB_NAME" --db-user="$PG_USER" --db-pwd="$PG_PWD" --user=""$DB_USER"" --password=""$DB_PASS"" "$target_dir/$filename"
 # set +x
 
 if [ $? -eq 0 ]; then
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Журнал событий восстановления в JSON Lines: этапы (find, copy, verify, restore) с длительностью, объемом и скоростью
+
+log() в restore_1c_db.sh на каждую строку запускает date и stat (rotate_logs), а вывод ibcmd идет в отдельный
+журнал без времени этапов - по нему не понять, что замедлило ночное восстановление. Здесь события пишутся
+через буфер, размер журнала проверяется при сбросе буфера (а не stat на каждую строку), ротация - по размеру,
+как в rotate_logs (<журнал>.1 ... <журнал>.N).
+
+Общие поля событий (run, infobase, server) берутся из окружения RESTORE_RUN_ID, RESTORE_INFOBASE, RESTORE_SERVER,
+поэтому события скрипта, dt_transfer.py и ibcmd одного запуска складываются в один запуск.
+
+summary - сравнение длительности этапов по ночам.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+from datetime import datetime
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Журнал по умолчанию (рядом с LOG_FILE скриптов восстановления)
+DEFAULT_EVENTS_FILE = os.path.join(os.path.expanduser('~'), 'logs', '1c_restore_events.jsonl')
+
+# Ротация: размер и количество архивов (как MAX_LOG_SIZE и MAX_LOG_BACKUPS в restore_1c_db.sh)
+MAX_BYTES = 5 * 1024 * 1024
+MAX_BACKUPS = 3
+
+# Буфер записи и максимальный интервал сброса на диск, сек
+BUFFER_SIZE = 64 * 1024
+FLUSH_SECONDS = 5
+
+# Переменные окружения с общими полями событий
+CONTEXT_ENV = {'run': 'RESTORE_RUN_ID', 'infobase': 'RESTORE_INFOBASE', 'server': 'RESTORE_SERVER'}
+
+PHASES = ('find', 'copy', 'verify', 'restore')
+
+# Отклонение этапа от медианы прошлых ночей, при котором он отмечается в summary
+SLOW_FACTOR = 1.5
+
+def env_context():
+    """
+    Общие поля событий из окружения
+    """
+    context = {key: os.environ[name] for key, name in CONTEXT_ENV.items() if os.environ.get(name)}
+    context.setdefault('run', f"{datetime.now():%Y%m%d_%H%M%S}_{os.getpid()}")
+    return context
+
+# ============================================================================
+# Запись
+# ============================================================================
+class EventLog:
+    """
+    Буферизованная запись событий JSON Lines с ротацией по размеру
+    Потокобезопасна (один экземпляр на все потоки restore_scheduler.py)
+    """
+
+    def __init__(self, path=DEFAULT_EVENTS_FILE, max_bytes=MAX_BYTES, backups=MAX_BACKUPS, context=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.context = env_context() if context is None else context
+        self.lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # Строки, еще не записанные в файл, и их размер
+        self.pending = []
+        self.pending_bytes = 0
+        self.lock_file = open(self.path + '.lock', 'a')
+        self.file = None
+        self.open()
+
+    def open(self):
+        self.file = open(self.path, 'ab', buffering=0)
+        self.flushed = time.monotonic()
+
+    def rotate(self):
+        """
+        Ротация по размеру (как rotate_logs в restore_1c_db.sh)
+        """
+        self.file.close()
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.open()
+
+    def write_pending(self):
+        """
+        Записывает накопленные строки (вызывается под self.lock)
+        Журнал пишут несколько процессов (скрипт, dt_transfer.py, restore_log.py run), поэтому запись идет
+        под блокировкой <журнал>.lock, а размер и inode журнала берутся с диска: ограничение max_bytes
+        общее для всех писателей, журнал, уже повернутый другим процессом, только переоткрывается
+        """
+        if not self.pending:
+            return
+        if fcntl:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+        try:
+            opened = os.fstat(self.file.fileno())
+            try:
+                current = os.stat(self.path)
+            except FileNotFoundError:
+                current = None
+            if not current or (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino):
+                self.file.close()
+                self.open()
+            size = current.st_size if current else 0
+            chunk = []
+            for line in self.pending:
+                if size and size + len(line) > self.max_bytes:
+                    self.file.write(b''.join(chunk))
+                    chunk = []
+                    self.rotate()
+                    size = 0
+                chunk.append(line)
+                size += len(line)
+            self.file.write(b''.join(chunk))
+        finally:
+            if fcntl:
+                fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+        self.pending = []
+        self.pending_bytes = 0
+        self.flushed = time.monotonic()
+
+    def event(self, kind, **fields):
+        """
+        Записывает событие
+        :param kind: Тип события (span, start, finish, error, ...)
+        """
+        now = time.time()
+        record = {'ts': round(now, 3), 'time': datetime.fromtimestamp(now).isoformat(timespec='seconds'),
+                  'event': kind, **self.context, **fields}
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        with self.lock:
+            self.pending.append(line)
+            self.pending_bytes += len(line)
+            if self.pending_bytes >= BUFFER_SIZE or time.monotonic() - self.flushed >= FLUSH_SECONDS:
+                self.write_pending()
+
+    def record_span(self, phase, seconds, bytes=None, status='ok', **fields):
+        """
+        Записывает завершенный этап
+        :param seconds: Длительность, сек
+        :param bytes: Объем данных этапа (для скорости)
+        """
+        span = {'phase': phase, 'seconds': round(seconds, 3), 'status': status}
+        if bytes is not None:
+            span['bytes'] = bytes
+            span['mb_per_sec'] = round(bytes / 1048576 / seconds, 1) if seconds else None
+        self.event('span', **span, **fields)
+
+    @contextmanager
+    def span(self, phase, bytes=None, **fields):
+        """
+        Этап как контекст: длительность и статус записываются при выходе
+        Внутри можно задать span['bytes'] и другие поля
+        """
+        span = {'bytes': bytes, **fields}
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span['status'], span['error'] = 'error', str(e) or type(e).__name__
+            raise
+        finally:
+            self.record_span(phase, time.perf_counter() - start, **span)
+
+    def flush(self):
+        with self.lock:
+            self.write_pending()
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.write_pending()
+                self.file.close()
+                self.file = None
+                self.lock_file.close()
+
+# ============================================================================
+# Сводка по ночам
+# ============================================================================
+def read_events(path, backups=MAX_BACKUPS):
+    """
+    События журнала и его архивов (от старых к новым), поврежденные строки пропускаются
+    """
+    paths = [f"{path}.{index}" for index in range(backups, 0, -1)] + [path]
+    for name in paths:
+        if not os.path.isfile(name):
+            continue
+        with open(name, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+def median(values):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+def nightly_summary(events, infobase=None, nights=14):
+    """
+    Длительность этапов по ночам: ночь - дата начала запуска (события одного run относятся к одной ночи)
+    :return: Список словарей (night, runs, infobases, errors, phases: {этап: {seconds, bytes, max_seconds}}),
+             от старых к новым
+    """
+    run_nights = {}
+    result = {}
+    for event in events:
+        if event.get('event') != 'span' or (infobase and event.get('infobase') != infobase):
+            continue
+        run = event.get('run', '')
+        night = run_nights.setdefault(run, datetime.fromtimestamp(event.get('ts', 0)).strftime('%Y-%m-%d'))
+        item = result.setdefault(night, {'night': night, 'runs': set(), 'infobases': set(), 'errors': 0, 'phases': {}})
+        item['runs'].add(run)
+        if event.get('infobase'):
+            item['infobases'].add(event['infobase'])
+        if event.get('status') == 'error':
+            item['errors'] += 1
+        phase = item['phases'].setdefault(event.get('phase'), {'seconds': 0.0, 'bytes': 0, 'max_seconds': 0.0})
+        phase['seconds'] += event.get('seconds') or 0
+        phase['bytes'] += event.get('bytes') or 0
+        phase['max_seconds'] = max(phase['max_seconds'], event.get('seconds') or 0)
+
+    rows = [result[night] for night in sorted(result)][-nights:]
+    for row in rows:
+        row['runs'], row['infobases'] = len(row['runs']), len(row['infobases'])
+    return rows
+
+def slow_phases(rows):
+    """
+    Этапы последней ночи, которые дольше медианы прошлых ночей в SLOW_FACTOR раз
+    :return: Список (этап, секунд, медиана)
+    """
+    if len(rows) < 2:
+        return []
+    last, previous = rows[-1], rows[:-1]
+    result = []
+    for phase, values in last['phases'].items():
+        typical = median([row['phases'][phase]['seconds'] for row in previous if phase in row['phases']])
+        if typical and values['seconds'] > typical * SLOW_FACTOR:
+            result.append((phase, values['seconds'], typical))
+    return result
+
+def print_summary(rows):
+    phases = [phase for phase in PHASES if any(phase in row['phases'] for row in rows)]
+    phases += sorted({phase for row in rows for phase in row['phases']} - set(phases) - {None})
+    print(f"{'Ночь':<10} {'Баз':>4} {'Ошибок':>6} " + ' '.join(f'{phase:>10}' for phase in phases)
+          + f" {'Итого':>10} {'copy МБ/с':>9}")
+    print('-' * (24 + 11 * (len(phases) + 1) + 10))
+    for row in rows:
+        cells = ' '.join(f"{row['phases'][phase]['seconds']:>10.1f}" if phase in row['phases'] else f"{'-':>10}"
+                         for phase in phases)
+        total = sum(values['seconds'] for values in row['phases'].values())
+        copy = row['phases'].get('copy')
+        speed = f"{copy['bytes'] / 1048576 / copy['seconds']:>9.1f}" if copy and copy['seconds'] else f"{'-':>9}"
+        print(f"{row['night']:<10} {row['infobases']:>4} {row['errors']:>6} {cells} {total:>10.1f} {speed}")
+    for phase, seconds, typical in slow_phases(rows):
+        print(f"⚠️  {rows[-1]['night']}: {phase} {seconds:.1f} сек при обычных {typical:.1f} сек "
+              f"(x{seconds / typical:.1f})")
+
+# ============================================================================
+# Основная функция
+# ============================================================================
+def epoch_seconds(value):
+    """
+    Секунды эпохи из EPOCHREALTIME: bash пишет его с десятичным разделителем локали (запятая в ru_RU)
+    """
+    return float(value.replace(',', '.'))
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Журнал этапов восстановления (JSON Lines) и сравнение ночей',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  %(prog)s summary                                         # этапы по ночам за 14 ночей
+  %(prog)s summary --ib Бухгалтерия --nights 30
+  %(prog)s emit --phase find --started 1735689600.25       # этап от времени начала (EPOCHREALTIME) до сейчас
+  %(prog)s run --phase restore --bytes 1073741824 -- /opt/1cv8/x86_64/8.3.27.1606/ibcmd infobase restore ...
+        """
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    summary_parser = subparsers.add_parser('summary', help='Длительность этапов по ночам')
+    summary_parser.add_argument('--ib', type=str, default=None, help='Только эта база')
+    summary_parser.add_argument('--nights', type=int, default=14, help='Количество ночей (по умолчанию: 14)')
+    summary_parser.add_argument('--json', action='store_true', help='Вывод в JSON')
+
+    emit_parser = subparsers.add_parser('emit', help='Записать завершенный этап')
+    emit_parser.add_argument('--phase', required=True, help='Этап')
+    emit_group = emit_parser.add_mutually_exclusive_group(required=True)
+    emit_group.add_argument('--seconds', type=float, help='Длительность, сек')
+    emit_group.add_argument('--started', type=epoch_seconds, help='Время начала (секунды эпохи), длительность - до сейчас')
+    emit_parser.add_argument('--bytes', type=int, default=None, help='Объем данных, байт')
+    emit_parser.add_argument('--status', choices=('ok', 'error'), default='ok', help='Результат этапа')
+
+    run_parser = subparsers.add_parser('run', help='Выполнить команду как этап (код возврата сохраняется)')
+    run_parser.add_argument('--phase', required=True, help='Этап')
+    run_parser.add_argument('--bytes', type=int, default=None, help='Объем данных, байт')
+    run_parser.add_argument('cmd', nargs=argparse.REMAINDER, help='Команда после --')
+
+    for subparser in (summary_parser, emit_parser, run_parser):
+        subparser.add_argument('--events', type=str, default=DEFAULT_EVENTS_FILE,
+                               help=f'Журнал событий (по умолчанию: {DEFAULT_EVENTS_FILE})')
+    args = parser.parse_args()
+
+    if args.command == 'summary':
+        rows = nightly_summary(read_events(args.events), args.ib, args.nights)
+        if not rows:
+            print(f"Нет этапов в {args.events}")
+            sys.exit(1)
+        if args.json:
+            print(json.dumps(rows, ensure_ascii=False, indent=1))
+        else:
+            print_summary(rows)
+        return
+
+    events = EventLog(args.events)
+    try:
+        if args.command == 'emit':
+            seconds = args.seconds if args.seconds is not None else time.time() - args.started
+            events.record_span(args.phase, seconds, args.bytes, args.status)
+            return
+        command = args.cmd[1:] if args.cmd[:1] == ['--'] else args.cmd
+        if not command:
+            print("Не указана команда")
+            sys.exit(1)
+        code = 1
+        try:
+            with events.span(args.phase, args.bytes) as span:
+                code = subprocess.call(command)
+                span['exit_code'] = code
+                if code:
+                    span['status'] = 'error'
+        except OSError as e:
+            print(f"Ошибка: {e}")
+    finally:
+        events.close()
+    sys.exit(code)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+"""
+Параллельное восстановление нескольких баз 1С из .dt (вместо restore_1c_db.sh -c <cfg> по очереди)
+
+Читает каталог конфигураций .cfg/.conf в формате restore_1c_db.sh (SERVER_NAME, IB_NAME, DB_USER, DB_PASS,
+PG_USER, PG_PWD, source_dir, target_dir, PATH_1C) и восстанавливает базы одновременно через
+ibcmd infobase restore со следующими ограничениями:
+- не больше --per-server восстановлений на один сервер PostgreSQL;
+- не больше --per-disk одновременных копирований на один диск (источник и приемник);
+- одна и та же выгрузка в один каталог копируется один раз и используется всеми базами, удаляется после последней;
+  каждая выгрузка копируется в свой подкаталог target_dir/<хэш пути выгрузки>, поэтому одноименные .dt
+  из разных source_dir не перезаписывают друг друга.
+
+По каждой базе фиксируется время этапов: find (поиск выгрузки), copy, verify (сверка хэша), restore.
+"""
+
+import os
+import sys
+import json
+import time
+import shlex
+import hashlib
+import argparse
+import threading
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
+from dt_transfer import transfer, DEFAULT_ALGORITHM
+from dt_catalog import DtCatalog
+from restore_log import EventLog
+
+# Путь к платформе по умолчанию (как в restore_1c_db.sh)
+DEFAULT_PATH_1C = '/opt/1cv8/x86_64/8.3.27.1606'
+
+# Каталог журналов ibcmd (как LOG_FILE в restore_1c_db.sh)
+DEFAULT_LOG_DIR = os.path.join(os.path.expanduser('~'), 'logs', 'restore')
+
+# Расширения файлов конфигурации
+CONFIG_EXTENSIONS = ('.cfg', '.conf')
+
+# Переменные конфигурации: параметр задания -> имена в restore_1c_db.sh и в config_example.conf
+CONFIG_KEYS = {
+    'server': ('SERVER_NAME', 'SERVER'),
+    'infobase': ('IB_NAME', 'DB_NAME'),
+    'user': ('DB_USER',),
+    'password': ('DB_PASS',),
+    'pg_user': ('PG_USER',),
+    'pg_password': ('PG_PWD',),
+    'source_dir': ('source_dir', 'SOURCE_DIR'),
+    'target_dir': ('target_dir', 'LOCAL_DIR'),
+    'path_1c': ('PATH_1C',),
+    'ibcmd': ('IBCMD_PATH',),
+    'password_file': ('PASSWORD_FILE',),
+}
+REQUIRED_KEYS = ('server', 'infobase', 'user', 'source_dir', 'target_dir')
+
+PHASES = ('find', 'copy', 'verify', 'restore')
+
+# ============================================================================
+# Конфигурации
+# ============================================================================
+def parse_shell_config(path):
+    """
+    Разбирает файл присваиваний оболочки (KEY="value") без выполнения
+    Подстановки $VAR и ${VAR} раскрываются по ранее заданным переменным и окружению
+    :return: Словарь переменных
+    """
+    variables = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('export '):
+                line = line[len('export '):].strip()
+            name, separator, value = line.partition('=')
+            if not separator or not name.isidentifier():
+                continue
+            try:
+                parts = shlex.split(value, comments=True)
+            except ValueError:
+                continue
+            value = parts[0] if parts else ''
+            if '$' in value:
+                environment = os.environ.copy()
+                environment.update(variables)
+                for key in sorted(environment, key=len, reverse=True):
+                    value = value.replace('${' + key + '}', environment[key]).replace('$' + key, environment[key])
+            variables[name] = value
+    return variables
+
+class RestoreJob:
+    """
+    Восстановление одной базы по файлу конфигурации
+    """
+
+    def __init__(self, config_path, variables):
+        self.config_path = config_path
+        values = {}
+        for key, names in CONFIG_KEYS.items():
+            values[key] = next((variables[name] for name in names if variables.get(name)), '')
+        missing = [key for key in REQUIRED_KEYS if not values[key]]
+        if missing:
+            raise ValueError(f"{config_path}: не заданы {', '.join(CONFIG_KEYS[key][0] for key in missing)}")
+        if not values['password'] and values['password_file']:
+            with open(values['password_file'], 'r', encoding='utf-8') as f:
+                values['password'] = f.read().strip()
+
+        self.server = values['server']
+        self.infobase = values['infobase']
+        self.user = values['user']
+        self.password = values['password']
+        self.pg_user = values['pg_user']
+        self.pg_password = values['pg_password']
+        self.source_dir = values['source_dir']
+        self.target_dir = values['target_dir']
+        self.ibcmd = values['ibcmd'] or os.path.join(values['path_1c'] or DEFAULT_PATH_1C, 'ibcmd')
+
+        self.dump = None
+        self.digest = None
+        self.timings = {}
+        self.bytes = 0
+        self.shared_copy = False
+        self.transfer_seconds = 0.0
+        self.status = 'pending'
+        self.error = None
+        self.log_file = None
+
+    @property
+    def name(self):
+        return f"{self.server}/{self.infobase}"
+
+    def restore_command(self, dump_path):
+        return [
+            self.ibcmd, 'infobase', 'restore',
+            f'--db-server={self.server}', '--dbms=PostgreSQL', f'--db-name={self.infobase}',
+            f'--db-user={self.pg_user}', f'--db-pwd={self.pg_password}',
+            f'--user={self.user}', f'--password={self.password}', dump_path,
+        ]
+
+    def result(self):
+        return {
+            'config': self.config_path,
+            'server': self.server,
+            'infobase': self.infobase,
+            'dump': self.dump,
+            'digest': self.digest,
+            'bytes': self.bytes,
+            'shared_copy': self.shared_copy,
+            'status': self.status,
+            'error': self.error,
+            'log_file': self.log_file,
+            'timings': {phase: round(seconds, 3) for phase, seconds in self.timings.items()},
+        }
+
+def load_jobs(config_dir):
+    """
+    Задания по всем .cfg/.conf каталога
+    :return: Кортеж (список заданий, список ошибок разбора)
+    """
+    jobs, errors = [], []
+    for name in sorted(os.listdir(config_dir)):
+        path = os.path.join(config_dir, name)
+        if not name.endswith(CONFIG_EXTENSIONS) or not os.path.isfile(path):
+            continue
+        try:
+            jobs.append(RestoreJob(path, parse_shell_config(path)))
+        except (OSError, ValueError) as e:
+            errors.append(str(e))
+    return jobs, errors
+
+def find_newest_dump(source_dir):
+    """
+    Самый новый .dt в каталоге (как find -maxdepth 1 | sort -n | tail -1)
+    :return: Путь или None
+    """
+    newest, newest_mtime = None, None
+    with os.scandir(source_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith('.dt') and entry.is_file():
+                mtime = entry.stat().st_mtime_ns
+                if newest_mtime is None or mtime > newest_mtime:
+                    newest, newest_mtime = entry.path, mtime
+    return newest
+
+def copy_target(dump, target_dir):
+    """
+    Путь копии выгрузки: target_dir/<короткий хэш пути выгрузки>/<имя .dt>
+    :return: Кортеж (каталог копии, путь копии)
+    """
+    key = hashlib.sha1(os.path.realpath(dump).encode('utf-8')).hexdigest()[:16]
+    directory = os.path.join(os.path.realpath(target_dir), key)
+    return directory, os.path.join(directory, os.path.basename(dump))
+
+def mask_command(command):
+    return [part.split('=', 1)[0] + '=***' if part.startswith(('--password=', '--db-pwd=')) else part
+            for part in command]
+
+# ============================================================================
+# Планировщик
+# ============================================================================
+class RestoreScheduler:
+    """
+    Параллельное выполнение заданий с ограничениями по серверам и дискам
+    """
+
+    def __init__(self, jobs, per_server=2, per_disk=1, log_dir=DEFAULT_LOG_DIR, keep=False,
+                 algorithm=DEFAULT_ALGORITHM, transfer_mode='buffer', verify_target=False, digest_cache=None,
+                 catalog=None, events=None):
+        self.jobs = jobs
+        self.per_server = per_server
+        self.per_disk = per_disk
+        self.log_dir = log_dir
+        self.keep = keep
+        self.algorithm = algorithm
+        self.transfer_mode = transfer_mode
+        self.verify_target = verify_target
+        self.digest_cache = digest_cache
+        # Каталог выгрузок dt_catalog.py (только из основного потока: поиск и сохранение хэшей)
+        self.catalog = catalog
+        self.refreshed_dirs = set()
+        # Журнал этапов restore_log.py
+        self.events = events
+        self.lock = threading.Lock()
+        self.server_limits = {}
+        self.disk_limits = {}
+        # Путь копии -> [Future копирования, количество заданий, еще не закончивших работу]
+        self.copies = {}
+
+    def server_limit(self, server):
+        with self.lock:
+            return self.server_limits.setdefault(server, threading.Semaphore(self.per_server))
+
+    def disk_limits_for(self, *paths):
+        """
+        Семафоры дисков (по st_dev) в одном порядке для всех потоков - без взаимных блокировок
+        """
+        devices = sorted({os.stat(path).st_dev for path in paths})
+        with self.lock:
+            return [self.disk_limits.setdefault(device, threading.Semaphore(self.per_disk)) for device in devices]
+
+    def find(self, job):
+        start = time.perf_counter()
+        if self.catalog:
+            if job.source_dir not in self.refreshed_dirs:
+                self.catalog.update_dir(job.source_dir)
+                self.refreshed_dirs.add(job.source_dir)
+            row = self.catalog.newest(job.source_dir)
+            job.dump, job.digest = (row['path'], row['digest']) if row else (None, None)
+        else:
+            job.dump = find_newest_dump(job.source_dir)
+        job.timings['find'] = time.perf_counter() - start
+        if job.dump:
+            job.bytes = os.path.getsize(job.dump)
+
+    def plan_copies(self):
+        """
+        Общие копии: каждая выгрузка копируется в каталог назначения один раз
+        """
+        for job in self.jobs:
+            if job.dump:
+                entry = self.copies.setdefault(copy_target(job.dump, job.target_dir)[1], [None, 0])
+                entry[1] += 1
+
+    def copy(self, job):
+        """
+        Копирует выгрузку или дожидается копии, которую делает другое задание
+        :return: Результат transfer
+        """
+        directory, key = copy_target(job.dump, job.target_dir)
+        with self.lock:
+            entry = self.copies[key]
+            owner = entry[0] is None
+            if owner:
+                entry[0] = Future()
+        future = entry[0]
+        if not owner:
+            job.shared_copy = True
+            return future.result()
+
+        try:
+            os.makedirs(directory, exist_ok=True)
+            limits = self.disk_limits_for(os.path.dirname(job.dump), directory)
+            for limit in limits:
+                limit.acquire()
+            try:
+                result = transfer(job.dump, directory, self.algorithm, self.transfer_mode,
+                                  verify_target=self.verify_target, digest_cache=self.digest_cache,
+                                  expected_digest=job.digest, verify_uncached=True)
+            finally:
+                for limit in reversed(limits):
+                    limit.release()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        future.set_result(result)
+        return result
+
+    def release_copy(self, job):
+        """
+        Удаляет общую копию (и ее подкаталог) после последнего задания, которое ее использует
+        """
+        directory, key = copy_target(job.dump, job.target_dir)
+        with self.lock:
+            self.copies[key][1] -= 1
+            last = self.copies[key][1] == 0
+        if last and not self.keep and os.path.exists(key):
+            os.remove(key)
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+
+    def restore(self, job, target):
+        os.makedirs(self.log_dir, exist_ok=True)
+        job.log_file = os.path.join(self.log_dir, f"{job.infobase}_{datetime.now():%Y%m%d_%H%M%S}.log")
+        command = job.restore_command(target)
+        with self.server_limit(job.server):
+            start = time.perf_counter()
+            with open(job.log_file, 'w', encoding='utf-8') as log:
+                log.write(' '.join(shlex.quote(part) for part in mask_command(command)) + '\n')
+                log.flush()
+                code = subprocess.call(command, stdout=log, stderr=subprocess.STDOUT)
+            job.timings['restore'] = time.perf_counter() - start
+        self.span(job, 'restore', job.timings['restore'], job.bytes, status='error' if code else 'ok', exit_code=code)
+        if code != 0:
+            raise RuntimeError(f"ibcmd завершился с кодом {code}, журнал: {job.log_file}")
+
+    def span(self, job, phase, seconds, bytes=None, **fields):
+        """
+        Записывает этап задания в журнал событий
+        """
+        if self.events:
+            self.events.record_span(phase, seconds, bytes, infobase=job.infobase, server=job.server, **fields)
+
+    def run_job(self, job):
+        try:
+            start = time.perf_counter()
+            result = self.copy(job)
+            target = result['target']
+            job.digest = result['digest']
+            job.transfer_seconds = result['copy_seconds'] + result['verify_seconds']
+            if job.shared_copy:
+                # Ожидание копии, которую выполнило другое задание
+                job.timings['copy'] = time.perf_counter() - start
+                job.timings['verify'] = 0.0
+                self.span(job, 'copy_wait', job.timings['copy'], file=os.path.basename(job.dump))
+            else:
+                job.timings['copy'] = result['copy_seconds']
+                job.timings['verify'] = result['verify_seconds']
+                self.span(job, 'copy', result['copy_seconds'], result['bytes'], file=os.path.basename(job.dump))
+                if result['verified']:
+                    self.span(job, 'verify', result['verify_seconds'],
+                              result['bytes'] if result['verified_target'] else None,
+                              cached_digest=result['cached_digest'])
+            self.restore(job, target)
+            job.status = 'done'
+        except Exception as e:
+            job.status = 'error'
+            job.error = str(e)
+            if self.events:
+                self.events.event('error', infobase=job.infobase, server=job.server, error=job.error)
+        finally:
+            self.release_copy(job)
+        return job
+
+    def run(self, on_done=None):
+        """
+        Выполняет все задания
+        :param on_done: Функция (задание), вызывается по завершении каждого
+        :return: Список заданий
+        """
+        for job in self.jobs:
+            try:
+                self.find(job)
+            except OSError as e:
+                job.status, job.error = 'error', str(e)
+                continue
+            self.span(job, 'find', job.timings['find'], file=os.path.basename(job.dump) if job.dump else None)
+            if not job.dump:
+                job.status, job.error = 'skipped', f"Файлы .dt не найдены в {job.source_dir}"
+        self.plan_copies()
+
+        runnable = sorted((job for job in self.jobs if job.status == 'pending'), key=lambda job: -job.bytes)
+        if not runnable:
+            return self.jobs
+        with ThreadPoolExecutor(max_workers=len(runnable)) as executor:
+            futures = [executor.submit(self.run_job, job) for job in runnable]
+            for future in as_completed(futures):
+                if on_done:
+                    on_done(future.result())
+        if self.catalog:
+            for job in runnable:
+                if job.digest and not job.shared_copy:
+                    self.catalog.record(job.dump, digest=job.digest)
+        return self.jobs
+
+# ============================================================================
+# Вывод
+# ============================================================================
+def print_plan(jobs):
+    copies = {}
+    for job in jobs:
+        if job.dump:
+            copies.setdefault(copy_target(job.dump, job.target_dir)[1], []).append(job.infobase)
+    print(f"{'База':<40} {'Выгрузка':<50} {'МБ':>10}")
+    for job in jobs:
+        dump = os.path.basename(job.dump) if job.dump else (job.error or '-')
+        print(f"{job.name:<40} {dump:<50} {job.bytes / 1048576:>10.1f}")
+    print(f"\nКопирований: {len(copies)} на {sum(1 for job in jobs if job.dump)} баз")
+    for target, infobases in copies.items():
+        if len(infobases) > 1:
+            print(f"  общая копия {target}: {', '.join(infobases)}")
+
+def print_summary(jobs, elapsed):
+    print(f"\n{'База':<40} " + ' '.join(f'{phase:>9}' for phase in PHASES) + f" {'Итого':>9}  Статус")
+    print('-' * (40 + 10 * (len(PHASES) + 1) + 10))
+    for job in sorted(jobs, key=lambda job: -sum(job.timings.values())):
+        cells = ' '.join(f"{job.timings[phase]:>9.1f}" if phase in job.timings else f"{'-':>9}" for phase in PHASES)
+        status = {'done': 'готово', 'error': 'ошибка', 'skipped': 'пропущено', 'pending': '-'}[job.status]
+        shared = ' (общая копия)' if job.shared_copy else ''
+        print(f"{job.name:<40} {cells} {sum(job.timings.values()):>9.1f}  {status}{shared}")
+        if job.error:
+            print(f"    {job.error}")
+    longest = max((sum(job.timings.values()) for job in jobs), default=0)
+    # По очереди каждая база копировала бы выгрузку сама
+    serial = sum(job.timings.get('find', 0) + job.timings.get('restore', 0) + job.transfer_seconds for job in jobs)
+    print(f"\nОбщее время: {elapsed:.1f} сек (самая долгая база: {longest:.1f} сек, по очереди было бы ~{serial:.1f} сек)")
+
+# ============================================================================
+# Основная функция
+# ============================================================================
+def main():
+    parser = argparse.ArgumentParser(
+        description='Параллельное восстановление баз 1С из .dt по каталогу конфигураций restore_1c_db.sh',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  %(prog)s /cloud/repo/example_1C/build --dry-run
+  %(prog)s /cloud/repo/example_1C/build --per-server 2 --per-disk 1 --report restore.json
+  %(prog)s /cloud/repo/example_1C/build --only OB_test1csrv.cfg,ZUP_test.cfg --keep
+  %(prog)s /cloud/repo/example_1C/build --catalog /var/lib/1c/dt_catalog.db
+  %(prog)s /cloud/repo/example_1C/build --events ~/logs/1c_restore_events.jsonl
+        """
+    )
+    parser.add_argument('config_dir', help='Каталог с файлами .cfg/.conf')
+    parser.add_argument('--only', type=str, default=None, help='Только эти файлы конфигурации (через запятую)')
+    parser.add_argument('--per-server', type=int, default=2,
+                        help='Восстановлений одновременно на один сервер PostgreSQL (по умолчанию: 2)')
+    parser.add_argument('--per-disk', type=int, default=1,
+                        help='Копирований одновременно на один диск (по умолчанию: 1)')
+    parser.add_argument('--log-dir', type=str, default=DEFAULT_LOG_DIR,
+                        help=f'Каталог журналов ibcmd (по умолчанию: {DEFAULT_LOG_DIR})')
+    parser.add_argument('--transfer-mode', choices=('buffer', 'kernel'), default='buffer',
+                        help='Режим копирования dt_transfer.py (по умолчанию: buffer)')
+    parser.add_argument('--verify-target', action='store_true', help='Перечитывать копию с диска после записи')
+    parser.add_argument('--digest-cache', type=str, default=None, help='Каталог кэша хэшей выгрузок')
+    parser.add_argument('--catalog', type=str, default=None,
+                        help='Файл каталога выгрузок dt_catalog.py: выгрузка и ее хэш берутся из него')
+    parser.add_argument('--events', type=str, default=None,
+                        help='Журнал этапов restore_log.py (JSON Lines) для сравнения ночей')
+    parser.add_argument('--keep', action='store_true', help='Не удалять копии .dt после восстановления')
+    parser.add_argument('--report', type=str, default=None, help='Сохранить результаты в JSON')
+    parser.add_argument('--dry-run', action='store_true', help='Показать план без копирования и восстановления')
+    args = parser.parse_args()
+
+    jobs, errors = load_jobs(args.config_dir)
+    for error in errors:
+        print(f"Ошибка конфигурации: {error}")
+    if args.only:
+        wanted = {name.strip() for name in args.only.split(',')}
+        jobs = [job for job in jobs if os.path.basename(job.config_path) in wanted]
+    if not jobs:
+        print(f"Конфигурации .cfg/.conf не найдены в {args.config_dir}")
+        sys.exit(1)
+
+    catalog = DtCatalog(args.catalog, digest_cache=args.digest_cache) if args.catalog else None
+    events = EventLog(args.events) if args.events and not args.dry_run else None
+    scheduler = RestoreScheduler(jobs, args.per_server, args.per_disk, args.log_dir, args.keep,
+                                 transfer_mode=args.transfer_mode, verify_target=args.verify_target,
+                                 digest_cache=args.digest_cache, catalog=catalog, events=events)
+    if args.dry_run:
+        for job in jobs:
+            try:
+                scheduler.find(job)
+            except OSError as e:
+                job.error = str(e)
+        print_plan(jobs)
+        return
+
+    print(f"Баз: {len(jobs)}, серверов: {len({job.server for job in jobs})}, "
+          f"ограничения: {args.per_server} на сервер, {args.per_disk} копирования на диск")
+    start_time = time.time()
+    scheduler.run(on_done=lambda job: print(
+        f"{'✅' if job.status == 'done' else '❌'} {job.name}: {sum(job.timings.values()):.1f} сек", flush=True))
+    elapsed = time.time() - start_time
+    if catalog:
+        catalog.close()
+    if events:
+        events.event('finish', seconds=round(elapsed, 3), jobs=len(jobs),
+                     errors=sum(1 for job in jobs if job.status == 'error'))
+        events.close()
+    print_summary(jobs, elapsed)
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({'started': datetime.fromtimestamp(start_time).isoformat(timespec='seconds'),
+                       'seconds': round(elapsed, 3), 'jobs': [job.result() for job in jobs]},
+                      f, ensure_ascii=False, indent=1)
+        print(f"Результаты сохранены в {args.report}")
+    sys.exit(1 if any(job.status == 'error' for job in jobs) or errors else 0)
+
+if __name__ == "__main__":
+    main()
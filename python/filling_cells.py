@@ -1,43 +1,539 @@
+import os
+import sys
+import csv
+import glob
+import json
+import time
+import shutil
+import hashlib
+import zipfile
+import argparse
+import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.utils import get_column_letter
+from openpyxl import load_workbook, Workbook
 
-def fill_empty_cells(input_file, input_sheet, columns_to_fill):
+try:
+    import python_calamine
+except ImportError:
+    python_calamine = None
+
+# Максимальная ширина колонки при автоширине
+MAX_COLUMN_WIDTH = 50
+
+# Размер блока при потоковом копировании XML листа и расчете хэша
+XML_CHUNK_SIZE = 1024 * 1024
+
+# Суффикс файла с отметкой об обработке (рядом с выходным файлом)
+STATE_SUFFIX = '.fill.json'
+
+# Движки чтения: streaming - построчно через openpyxl read_only, openpyxl и calamine - лист целиком в DataFrame
+ENGINES = ('auto', 'streaming', 'openpyxl', 'calamine')
+
+# Дополнительные табличные форматы (пишутся рядом с .xlsx)
+TABLE_FORMATS = ('csv', 'parquet', 'feather')
+
+# Форматы, для которых нужен лист целиком в DataFrame
+FRAME_FORMATS = ('parquet', 'feather')
+
+# Строк в блоке при записи DataFrame в .xlsx
+FRAME_CHUNK_ROWS = 65536
+
+def output_names(input_file, input_sheet, output_dir=None):
+    """
+    Имена выходного файла и листа: output_<файл> рядом с исходным (или в output_dir), output_<лист>
+    """
+    directory, name = os.path.split(input_file)
+    return os.path.join(output_dir or directory, 'output_' + name), 'output_' + input_sheet
+
+def table_output_name(output_file, input_sheet, table_format):
+    """
+    Имя табличного файла рядом с выходным .xlsx: output_<файл>_<лист>.<формат>
+    """
+    return f"{os.path.splitext(output_file)[0]}_{input_sheet}.{table_format}"
+
+def resolve_engine(engine, formats=()):
+    """
+    Выбор движка чтения
+    auto - calamine, если установлен python-calamine, иначе потоковый openpyxl
+    (или openpyxl через pandas, если нужны Parquet/Feather)
+    :return: Имя движка без auto
+    """
+    frame_formats = set(formats) & set(FRAME_FORMATS)
+    if engine == 'auto':
+        if python_calamine is not None:
+            return 'calamine'
+        return 'openpyxl' if frame_formats else 'streaming'
+    if engine == 'calamine' and python_calamine is None:
+        raise ValueError("Движок calamine недоступен, установите: pip install python-calamine")
+    if engine == 'streaming' and frame_formats:
+        raise ValueError("Parquet/Feather не пишутся в потоковом режиме, используйте --engine openpyxl или calamine")
+    return engine
+
+def fill_empty_cells(input_file, input_sheet, columns_to_fill, streaming=False, engine='openpyxl', formats=()):
     """
     Заполняет пустые ячейки значениями сверху
+    :param streaming: Потоковый режим (openpyxl read_only/write_only), память не зависит от числа строк
+    :param engine: Движок чтения (openpyxl, calamine, auto)
+    :param formats: Дополнительные форматы результата (csv, parquet, feather)
+    """
+    engine = resolve_engine('streaming' if streaming else engine, formats)
+    return fill_workbook(input_file, {input_sheet: columns_to_fill}, engine=engine, formats=formats)
+
+def fill_workbook(input_file, sheets, output_file=None, engine='openpyxl', formats=()):
+    """
+    Заполняет пустые ячейки значениями сверху на нескольких листах книги
+    :param input_file: Исходный файл .xlsx
+    :param sheets: Словарь {лист: список колонок для заполнения}
+    :param output_file: Выходной файл (по умолчанию output_<файл>)
+    :param engine: Движок чтения: streaming, openpyxl или calamine
+    :param formats: Дополнительные форматы результата (csv, parquet, feather)
+    :return: Словарь {лист: количество строк с заголовком}
+    """
+    output_file = output_file or output_names(input_file, next(iter(sheets)))[0]
+    if engine == 'streaming':
+        rows = fill_sheets_streaming(input_file, sheets, output_file, formats)
+    else:
+        rows = fill_sheets_frame(input_file, sheets, output_file, engine, formats)
+    print(f"Готово! Файл сохранен как '{output_file}'")
+    return rows
+
+# ============================================================================
+# Обработка через DataFrame (openpyxl, calamine)
+# ============================================================================
+def read_frames(input_file, sheets, engine):
+    """
+    Читает листы в DataFrame за одно открытие файла
+    :return: Словарь {лист: DataFrame}
+    """
+    return pd.read_excel(input_file, sheet_name=list(sheets), engine=engine)
+
+def fill_frame(df, columns_to_fill):
+    """
+    Заполнение значениями сверху одной векторной операцией по всем выбранным колонкам
+    """
+    columns = [col for col in columns_to_fill if col in df.columns]
+    if columns:
+        df[columns] = df[columns].ffill()
+    return df
+
+def frame_column_widths(df):
+    """
+    Ширины колонок по самому длинному значению (включая заголовок)
+    :return: Словарь {номер колонки (с 1): ширина}
+    """
+    widths = {}
+    for index, col in enumerate(df.columns, 1):
+        lengths = df[col].dropna().astype(str).str.len()
+        length = max(len(str(col)), int(lengths.max()) if len(lengths) else 0)
+        if length > 0:
+            widths[index] = min(length + 2, MAX_COLUMN_WIDTH)
+    return widths
+
+def write_frames_xlsx(frames, input_file, output_file):
+    """
+    Пишет DataFrame в .xlsx блоками через write_only, ширины вписываются после сохранения
+    """
+    widths_by_sheet = {}
+    target = Workbook(write_only=True)
+    for number, (input_sheet, df) in enumerate(frames.items(), 1):
+        output_sheet = target.create_sheet(output_names(input_file, input_sheet)[1])
+        output_sheet.append([str(col) for col in df.columns])
+        for offset in range(0, len(df), FRAME_CHUNK_ROWS):
+            chunk = df.iloc[offset:offset + FRAME_CHUNK_ROWS].astype(object)
+            for row in chunk.where(chunk.notna(), None).itertuples(index=False, name=None):
+                output_sheet.append(row)
+        widths_by_sheet[f'xl/worksheets/sheet{number}.xml'] = frame_column_widths(df)
+    target.save(output_file)
+    set_column_widths(output_file, widths_by_sheet)
+
+def arrow_frame(df):
+    """
+    Подготовка к Parquet/Feather: имена колонок строками, колонки со смешанными
+    типами (число и текст в одной колонке Excel) приводятся к строкам
+    """
+    df = df.rename(columns=str)
+    for col in df.columns:
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True) in ('mixed', 'mixed-integer'):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+def csv_value(value):
+    """
+    Значение ячейки для CSV в одном виде для всех движков: пустые - пустая строка,
+    дата без времени - 2024-01-02, целое число (в том числе 1.0 из DataFrame) - 1
+    """
+    if value is None or value is pd.NaT or value is pd.NA or (isinstance(value, float) and value != value):
+        return ''
+    if isinstance(value, datetime.datetime):
+        if value.time() == datetime.time():
+            return value.date().isoformat()
+        return value.isoformat(sep=' ')
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return value
+
+def write_table(df, path, table_format):
+    """
+    Пишет лист в табличный формат: csv, parquet или feather
+    """
+    if table_format == 'csv':
+        with open(path, 'w', encoding='utf-8', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(df.columns)
+            for row in df.itertuples(index=False, name=None):
+                writer.writerow([csv_value(value) for value in row])
+    elif table_format == 'parquet':
+        arrow_frame(df).to_parquet(path, index=False)
+    elif table_format == 'feather':
+        arrow_frame(df).reset_index(drop=True).to_feather(path)
+    else:
+        raise ValueError(f"Неизвестный формат: {table_format}")
+
+def fill_sheets_frame(input_file, sheets, output_file, engine='openpyxl', formats=()):
+    """
+    Чтение листов в DataFrame выбранным движком, векторное заполнение, запись .xlsx и табличных форматов
     """
-    # Чтение данных
-    df = pd.read_excel(input_file, sheet_name=input_sheet)
-    
-    # Заполнение указанных столбцов
-    for col in columns_to_fill:
-        if col in df.columns:
-            df[col] = df[col].ffill()
-    
-    name_output_file = 'output_' + input_file # название выходного файла
-    name_output_sheet = 'output_' + input_sheet # название выходного листа
-
-    # Сохранение с автошириной
-    with pd.ExcelWriter(name_output_file, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name=name_output_sheet, index=False)
-        
-        worksheet = writer.sheets[name_output_sheet]
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            
-            for cell in column:
-                if cell.value:
-                    max_length = max(max_length, len(str(cell.value)))
-            
-            if max_length > 0:
-                worksheet.column_dimensions[column_letter].width = min(max_length + 2, 50)
-    
-    print(f"Готово! Файл сохранен как '{name_output_file}'")
-
-# Использование
-fill_empty_cells(
-    input_file='tblPurifications.xlsx', # имя обрабатываемого файла
-    input_sheet='ТехнСерии_2',  # лист для чтения
-    columns_to_fill=['Каталожный №'] # название колонки, которую надо заполнить. берется из первой строки колонки
-)
\ No newline at end of file
+    frames = read_frames(input_file, sheets, engine)
+    for input_sheet, columns_to_fill in sheets.items():
+        fill_frame(frames[input_sheet], columns_to_fill)
+
+    write_frames_xlsx(frames, input_file, output_file)
+    for input_sheet, df in frames.items():
+        for table_format in formats:
+            write_table(df, table_output_name(output_file, input_sheet, table_format), table_format)
+    return {input_sheet: len(df) + 1 for input_sheet, df in frames.items()}
+
+# ============================================================================
+# Потоковая обработка (openpyxl read_only/write_only)
+# ============================================================================
+def fill_sheets_streaming(input_file, sheets, output_file, formats=()):
+    """
+    Потоковое заполнение пустых ячеек значениями сверху
+    Листы читаются построчно (read_only) и сразу пишутся (write_only), ширина колонок
+    считается по ходу записи и вписывается в готовый файл; CSV пишется в том же проходе
+    """
+    rows = {}
+    widths_by_sheet = {}
+    source = load_workbook(input_file, read_only=True, data_only=True)
+    try:
+        target = Workbook(write_only=True)
+        for number, (input_sheet, columns_to_fill) in enumerate(sheets.items(), 1):
+            output_sheet = target.create_sheet(output_names(input_file, input_sheet)[1])
+            csv_file = None
+            if 'csv' in formats:
+                csv_file = open(table_output_name(output_file, input_sheet, 'csv'), 'w', encoding='utf-8', newline='')
+            try:
+                rows[input_sheet], widths = copy_sheet_filled(
+                    source[input_sheet], output_sheet, set(columns_to_fill),
+                    csv.writer(csv_file) if csv_file else None
+                )
+            finally:
+                if csv_file:
+                    csv_file.close()
+            # Листы книги write_only сохраняются как sheet1.xml, sheet2.xml... в порядке создания
+            widths_by_sheet[f'xl/worksheets/sheet{number}.xml'] = {
+                index + 1: min(length + 2, MAX_COLUMN_WIDTH) for index, length in widths.items()
+            }
+        target.save(output_file)
+    finally:
+        source.close()
+
+    set_column_widths(output_file, widths_by_sheet)
+    return rows
+
+def copy_sheet_filled(worksheet, output_sheet, columns_to_fill, csv_writer=None):
+    """
+    Копирует лист построчно, заполняя пустые ячейки указанных колонок значением сверху
+    :param csv_writer: csv.writer для одновременной записи CSV (необязательно)
+    :return: Кортеж (количество строк, словарь {индекс колонки: максимальная длина значения})
+    """
+    fill_indexes = []
+    last_values = {}
+    widths = {}
+    row_count = 0
+    for row_number, row in enumerate(worksheet.iter_rows(values_only=True)):
+        values = list(row)
+        if row_number == 0:
+            # Первая строка - заголовки колонок
+            fill_indexes = [index for index, name in enumerate(values)
+                            if name is not None and str(name) in columns_to_fill]
+        else:
+            for index in fill_indexes:
+                if index >= len(values):
+                    values.extend([None] * (index + 1 - len(values)))
+                if values[index] is None or values[index] == '':
+                    values[index] = last_values.get(index)
+                else:
+                    last_values[index] = values[index]
+
+        for index, value in enumerate(values):
+            if value:
+                length = len(str(value))
+                if length > widths.get(index, 0):
+                    widths[index] = length
+
+        output_sheet.append(values)
+        if csv_writer:
+            csv_writer.writerow([csv_value(value) for value in values])
+        row_count += 1
+    return row_count, widths
+
+def set_column_widths(xlsx_file, widths_by_sheet):
+    """
+    Вписывает ширины колонок в готовый xlsx без загрузки листов в память:
+    XML листа копируется потоком, элемент <cols> вставляется перед <sheetData>
+    :param widths_by_sheet: Словарь {путь XML листа в архиве: {номер колонки (с 1): ширина}}
+    """
+    if not any(widths_by_sheet.values()):
+        return
+    marker = b'<sheetData'
+
+    tmp_file = xlsx_file + '.tmp'
+    try:
+        with zipfile.ZipFile(xlsx_file) as src, zipfile.ZipFile(tmp_file, 'w', zipfile.ZIP_DEFLATED) as dst:
+            for item in src.infolist():
+                info = zipfile.ZipInfo(item.filename, item.date_time)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                widths = widths_by_sheet.get(item.filename)
+                with src.open(item) as reader, dst.open(info, 'w') as writer:
+                    if not widths:
+                        shutil.copyfileobj(reader, writer, XML_CHUNK_SIZE)
+                        continue
+                    cols = ''.join(f'<col min="{column}" max="{column}" width="{width}" customWidth="1"/>'
+                                   for column, width in sorted(widths.items()))
+                    cols = f'<cols>{cols}</cols>'.encode('utf-8')
+                    pending = b''
+                    inserted = False
+                    while True:
+                        chunk = reader.read(XML_CHUNK_SIZE)
+                        if not chunk:
+                            writer.write(pending)
+                            break
+                        data = pending + chunk
+                        position = -1 if inserted else data.find(marker)
+                        if position != -1:
+                            writer.write(data[:position] + cols + data[position:])
+                            inserted = True
+                            pending = b''
+                        elif inserted:
+                            writer.write(data)
+                            pending = b''
+                        else:
+                            # Хвост блока может содержать начало маркера
+                            writer.write(data[:-len(marker)])
+                            pending = data[-len(marker):]
+        os.replace(tmp_file, xlsx_file)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+# ============================================================================
+# Пакетная обработка
+# ============================================================================
+def file_hash(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(XML_CHUNK_SIZE), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+def is_up_to_date(input_file, output_file, options, outputs=()):
+    """
+    Выходные файлы актуальны: есть отметка с теми же параметрами и исходный файл не изменился
+    (совпадают размер и время изменения, либо, если время изменилось, хэш содержимого)
+    :return: Кортеж (актуален ли, хэш исходного файла или None, если не считался)
+    """
+    state_file = output_file + STATE_SUFFIX
+    if not all(os.path.exists(path) for path in (output_file, state_file, *outputs)):
+        return False, None
+    try:
+        with open(state_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return False, None
+    if state.get('options') != options:
+        return False, None
+
+    stat = os.stat(input_file)
+    if state.get('size') == stat.st_size and state.get('mtime_ns') == stat.st_mtime_ns:
+        return True, None
+    digest = file_hash(input_file)
+    return state.get('sha256') == digest, digest
+
+def save_state(input_file, output_file, options, digest=None):
+    stat = os.stat(input_file)
+    state = {
+        'input': os.path.abspath(input_file),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': digest or file_hash(input_file),
+        'options': options,
+    }
+    with open(output_file + STATE_SUFFIX, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+
+def workbook_sheets(input_file, sheet_specs, default_columns):
+    """
+    Листы и колонки для файла
+    :param sheet_specs: Список (лист, колонки или None); пустой - все листы книги
+    :return: Словарь {лист: колонки}
+    """
+    if sheet_specs:
+        return {sheet: columns if columns is not None else default_columns for sheet, columns in sheet_specs}
+    source = load_workbook(input_file, read_only=True)
+    try:
+        return {sheet: default_columns for sheet in source.sheetnames}
+    finally:
+        source.close()
+
+def process_file(input_file, sheet_specs, default_columns, output_dir=None, engine='streaming', formats=(),
+                 force=False):
+    """
+    Обрабатывает одну книгу в рабочем процессе
+    :return: Словарь: file, output, status (done, skipped, error), seconds, rows, error
+    """
+    start = time.perf_counter()
+    output_file = output_names(input_file, '', output_dir)[0]
+    result = {'file': input_file, 'output': output_file, 'rows': 0, 'error': None}
+    try:
+        sheets = workbook_sheets(input_file, sheet_specs, default_columns)
+        options = {'sheets': sheets, 'engine': engine, 'formats': list(formats)}
+        outputs = [table_output_name(output_file, sheet, table_format) for sheet in sheets for table_format in formats]
+        up_to_date, digest = (False, None) if force else is_up_to_date(input_file, output_file, options, outputs)
+        if up_to_date:
+            result['status'] = 'skipped'
+            if digest is not None:
+                # Файл тронут, но содержимое то же - запоминаем новое время изменения
+                save_state(input_file, output_file, options, digest)
+        else:
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+            rows = fill_workbook(input_file, sheets, output_file, engine=engine, formats=formats)
+            save_state(input_file, output_file, options, digest)
+            result['status'] = 'done'
+            result['rows'] = sum(rows.values())
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = str(e)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def expand_inputs(patterns):
+    """
+    Файлы по маскам (поддерживается **), без собственных выходных файлов output_*
+    """
+    files = []
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True) if glob.has_magic(pattern) else [pattern]
+        for path in sorted(matches):
+            name = os.path.basename(path)
+            if name.startswith(('output_', '~$')) or not os.path.isfile(path) or path in files:
+                continue
+            files.append(path)
+    return files
+
+def output_dirs(files, output_dir):
+    """
+    Каталоги результатов для файлов: относительные каталоги входных файлов повторяются
+    внутри output_dir, чтобы одноимённые книги из разных каталогов не перезаписывали друг друга
+    :param files: Список входных файлов
+    :param output_dir: Каталог результатов или None (результат рядом с исходным файлом)
+    :return: Словарь {файл: каталог результата или None}
+    """
+    if not output_dir:
+        return {path: None for path in files}
+    directories = {path: os.path.dirname(os.path.abspath(path)) for path in files}
+    base = os.path.commonpath(list(directories.values()))
+    return {path: os.path.normpath(os.path.join(output_dir, os.path.relpath(directory, base)))
+            for path, directory in directories.items()}
+
+def parse_sheet_spec(value):
+    """
+    Лист или Лист:Колонка1,Колонка2
+    :return: Кортеж (лист, список колонок или None)
+    """
+    sheet, separator, columns = value.partition(':')
+    if not separator:
+        return sheet, None
+    return sheet, [column.strip() for column in columns.split(',') if column.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Заполнение пустых ячеек Excel значениями сверху для набора книг',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  python filling_cells.py tblPurifications.xlsx --sheet ТехнСерии_2 --columns "Каталожный №"
+  python filling_cells.py "exports/**/*.xlsx" --columns "Каталожный №,Серия" --workers 4
+  python filling_cells.py *.xlsx --sheet "ТехнСерии_1:Каталожный №" --sheet "ТехнСерии_2:Каталожный №,Серия"
+  python filling_cells.py *.xlsx --columns "Каталожный №" --formats csv,parquet
+  python filling_cells.py *.xlsx --columns "Каталожный №" --engine openpyxl --force
+        """
+    )
+    parser.add_argument('files', nargs='+', help='Файлы или маски (в кавычках для **)')
+    parser.add_argument('--sheet', action='append', default=[],
+                        help='Лист или Лист:Колонка1,Колонка2 (можно несколько; по умолчанию все листы)')
+    parser.add_argument('--columns', action='append', default=[],
+                        help='Колонки для заполнения через запятую (для листов без своего списка)')
+    parser.add_argument('--output-dir', type=str, default=None,
+                        help='Каталог результатов (по умолчанию рядом с исходным файлом); '
+                             'подкаталоги входных файлов повторяются внутри него')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Количество процессов (по умолчанию: число ядер)')
+    parser.add_argument('--engine', choices=ENGINES, default='auto',
+                        help='Движок чтения: calamine (python-calamine), openpyxl (pandas), streaming '
+                             '(построчно, память не зависит от числа строк); auto - calamine, если '
+                             'установлен, иначе streaming (по умолчанию: auto)')
+    parser.add_argument('--formats', type=str, default='',
+                        help=f'Дополнительные форматы рядом с .xlsx через запятую: {", ".join(TABLE_FORMATS)}')
+    parser.add_argument('--force', action='store_true', help='Обработать даже актуальные файлы')
+    args = parser.parse_args()
+
+    default_columns = [column.strip() for value in args.columns for column in value.split(',') if column.strip()]
+    sheet_specs = [parse_sheet_spec(value) for value in args.sheet]
+    if not default_columns and not any(columns for _, columns in sheet_specs):
+        print("Укажите колонки: --columns или --sheet Лист:Колонки")
+        sys.exit(1)
+
+    formats = [value.strip() for value in args.formats.split(',') if value.strip()]
+    unknown = [value for value in formats if value not in TABLE_FORMATS]
+    if unknown:
+        parser.error(f"неизвестные форматы: {', '.join(unknown)}")
+    try:
+        engine = resolve_engine(args.engine, formats)
+    except ValueError as e:
+        parser.error(str(e))
+
+    files = expand_inputs(args.files)
+    if not files:
+        print("Файлы не найдены")
+        sys.exit(1)
+
+    print(f"Движок чтения: {engine}" + (f", форматы: xlsx, {', '.join(formats)}" if formats else ""))
+    start_time = time.time()
+    targets = output_dirs(files, args.output_dir)
+    results = []
+    with ProcessPoolExecutor(max_workers=min(args.workers, len(files))) as executor:
+        futures = [executor.submit(process_file, path, sheet_specs, default_columns,
+                                   targets[path], engine, formats, args.force) for path in files]
+        for future in as_completed(futures):
+            results.append(future.result())
+
+    print(f"\n{'Файл':<50} {'Статус':<10} {'Строк':>10} {'Время, с':>10}")
+    print('-' * 83)
+    for result in sorted(results, key=lambda item: -item['seconds']):
+        status = {'done': 'готово', 'skipped': 'актуален', 'error': 'ошибка'}[result['status']]
+        print(f"{result['file'][-50:]:<50} {status:<10} {result['rows']:>10} {result['seconds']:>10.2f}")
+        if result['error']:
+            print(f"    {result['error']}")
+
+    counts = {status: sum(1 for result in results if result['status'] == status)
+              for status in ('done', 'skipped', 'error')}
+    print(f"\nОбработано: {counts['done']}, пропущено (актуальны): {counts['skipped']}, "
+          f"ошибок: {counts['error']}. Общее время: {time.time() - start_time:.2f} сек")
+    sys.exit(1 if counts['error'] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Сравнение движков filling_cells.py на сгенерированном листе
+
+generate - создает книгу .xlsx с листом заданного размера (по умолчанию 1 млн строк), где
+колонки "Каталожный №" и "Серия" заполнены только в первой строке группы, как в выгрузках.
+
+run - для каждого движка (streaming, openpyxl, calamine) замеряет чтение, заполнение, запись
+.xlsx и табличных форматов, общее время и пиковую память (RSS). Каждый движок замеряется
+в отдельном процессе, чтобы пиковая память не смешивалась.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import resource
+import argparse
+import subprocess
+from datetime import datetime, timedelta
+from openpyxl import Workbook
+import filling_cells
+
+# Лист и колонки для заполнения в сгенерированной книге
+BENCH_SHEET = 'Данные'
+BENCH_COLUMNS = ['Каталожный №', 'Серия']
+HEADERS = BENCH_COLUMNS + ['Наименование', 'Количество', 'Цена', 'Дата']
+
+# Строк в группе (заполнена только первая строка группы)
+GROUP_ROWS = (1, 12)
+
+# ============================================================================
+# Генератор
+# ============================================================================
+def generate_workbook(output, rows=1000000, seed=1):
+    """
+    Создает книгу с одним листом: заголовок и rows строк данных
+    :return: Размер файла, байт
+    """
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(BENCH_SHEET)
+    sheet.append(HEADERS)
+
+    left = 0
+    group = 0
+    for number in range(rows):
+        if left == 0:
+            group += 1
+            left = rng.randint(*GROUP_ROWS)
+            article, series = f'К-{group:07d}', f'Серия {rng.randint(1, 500)}'
+        else:
+            article = series = None
+        left -= 1
+        sheet.append([article, series, f'Товар {rng.randint(1, 20000)}', rng.randint(1, 100),
+                      round(rng.uniform(10, 10000), 2), start + timedelta(minutes=number)])
+    workbook.save(output)
+    return os.path.getsize(output)
+
+# ============================================================================
+# Замеры
+# ============================================================================
+def peak_rss_mb():
+    """
+    Пиковая память процесса, МБ (Linux: ru_maxrss в КБ)
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_case(engine, input_file, formats):
+    """
+    Один замер в текущем процессе
+    :return: Словарь результата, время этапов в секундах
+    """
+    sheets = {BENCH_SHEET: BENCH_COLUMNS}
+    output_file = filling_cells.output_names(input_file, BENCH_SHEET)[0]
+    result = {'engine': engine}
+
+    start = time.perf_counter()
+    if engine == 'streaming':
+        rows = filling_cells.fill_sheets_streaming(input_file, sheets, output_file,
+                                                   [value for value in formats if value == 'csv'])
+        result['rows'] = rows[BENCH_SHEET]
+    else:
+        stage = time.perf_counter()
+        frames = filling_cells.read_frames(input_file, sheets, engine)
+        result['read'] = time.perf_counter() - stage
+
+        stage = time.perf_counter()
+        filling_cells.fill_frame(frames[BENCH_SHEET], BENCH_COLUMNS)
+        result['fill'] = time.perf_counter() - stage
+
+        stage = time.perf_counter()
+        filling_cells.write_frames_xlsx(frames, input_file, output_file)
+        result['xlsx'] = time.perf_counter() - stage
+
+        for table_format in formats:
+            stage = time.perf_counter()
+            filling_cells.write_table(frames[BENCH_SHEET],
+                                      filling_cells.table_output_name(output_file, BENCH_SHEET, table_format),
+                                      table_format)
+            result[table_format] = time.perf_counter() - stage
+        result['rows'] = len(frames[BENCH_SHEET]) + 1
+    result['seconds'] = time.perf_counter() - start
+    result['rss_mb'] = peak_rss_mb()
+    return {key: round(value, 3) if isinstance(value, float) else value for key, value in result.items()}
+
+def run_isolated(engine, input_file, formats):
+    """
+    Замер в отдельном процессе интерпретатора (чистая пиковая память)
+    """
+    script = os.path.abspath(__file__)
+    result = subprocess.run(
+        [sys.executable, script, 'case', engine, os.path.abspath(input_file), '--formats', ','.join(formats)],
+        cwd=os.path.dirname(script), capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Замер {engine} завершился с ошибкой: {result.stderr.strip()}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def print_results(results, formats):
+    stages = ['read', 'fill', 'xlsx'] + list(formats)
+    print(f"\n{'Движок':<10} " + ' '.join(f'{stage:>8}' for stage in stages) + f" {'Всего':>8} {'RSS, МБ':>8}")
+    print('-' * (10 + 9 * (len(stages) + 2)))
+    for result in results:
+        cells = ' '.join(f"{result[stage]:>8.2f}" if stage in result else f"{'-':>8}" for stage in stages)
+        print(f"{result['engine']:<10} {cells} {result['seconds']:>8.2f} {result['rss_mb']:>8.0f}")
+    print("Время в секундах; streaming читает, заполняет и пишет .xlsx (и CSV) за один проход")
+
+# ============================================================================
+# Основная функция
+# ============================================================================
+def main():
+    parser = argparse.ArgumentParser(
+        description='Сравнение движков filling_cells.py на сгенерированном листе',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  %(prog)s generate /tmp/bench.xlsx                   # 1 млн строк
+  %(prog)s generate /tmp/bench.xlsx --rows 200000
+  %(prog)s run /tmp/bench.xlsx --output bench.json
+  %(prog)s run /tmp/bench.xlsx --engines openpyxl,calamine --formats parquet
+        """
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = subparsers.add_parser('generate', help='Создать книгу для замеров')
+    generate_parser.add_argument('output', help='Файл .xlsx')
+    generate_parser.add_argument('--rows', type=int, default=1000000, help='Строк данных (по умолчанию: 1000000)')
+    generate_parser.add_argument('--seed', type=int, default=1, help='Начальное значение генератора (по умолчанию: 1)')
+
+    run_parser = subparsers.add_parser('run', help='Выполнить замеры')
+    run_parser.add_argument('input', help='Книга, созданная командой generate')
+    run_parser.add_argument('--engines', type=str, default='streaming,openpyxl,calamine',
+                            help='Движки через запятую (по умолчанию: streaming,openpyxl,calamine)')
+    run_parser.add_argument('--formats', type=str, default='csv,parquet,feather',
+                            help='Табличные форматы через запятую (по умолчанию: csv,parquet,feather)')
+    run_parser.add_argument('--output', type=str, default=None, help='Файл результатов JSON')
+
+    case_parser = subparsers.add_parser('case')   # служебная: один замер в отдельном процессе
+    case_parser.add_argument('engine')
+    case_parser.add_argument('input')
+    case_parser.add_argument('--formats', type=str, default='')
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        start = time.time()
+        size = generate_workbook(args.output, args.rows, args.seed)
+        print(f"Создан {args.output}: {args.rows} строк, {size / 1048576:.1f} МБ, "
+              f"время: {time.time() - start:.2f} сек")
+        return
+
+    formats = [value.strip() for value in args.formats.split(',') if value.strip()]
+    if args.command == 'case':
+        print(json.dumps(run_case(args.engine, args.input, formats)))
+        return
+
+    unknown = [value for value in formats if value not in filling_cells.TABLE_FORMATS]
+    if unknown:
+        print(f"Неизвестные форматы: {', '.join(unknown)}")
+        sys.exit(1)
+
+    engines = []
+    for engine in (value.strip() for value in args.engines.split(',')):
+        if engine not in filling_cells.ENGINES or engine == 'auto':
+            print(f"Неизвестный движок: {engine}")
+            sys.exit(1)
+        if engine == 'calamine' and filling_cells.python_calamine is None:
+            print("Движок calamine пропущен: python-calamine не установлен")
+            continue
+        engines.append(engine)
+
+    print(f"Книга: {args.input}, {os.path.getsize(args.input) / 1048576:.1f} МБ")
+    results = []
+    for engine in engines:
+        try:
+            results.append(run_isolated(engine, args.input, formats))
+        except RuntimeError as e:
+            print(f"Ошибка: {e}")
+            sys.exit(1)
+        print(f"{engine:<10} {results[-1]['seconds']:>8.2f} сек, RSS {results[-1]['rss_mb']:.0f} МБ", flush=True)
+    print_results(results, formats)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'timestamp': datetime.now().isoformat(timespec='seconds'),
+                       'input': os.path.abspath(args.input), 'results': results}, f, ensure_ascii=False, indent=1)
+        print(f"Результаты сохранены в {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,70 +1,13 @@
 #!/usr/bin/env python3
 import logging
-from logging.handlers import RotatingFileHandler
 from datetime import datetime
-from jira import JIRA
 import os
 import sys
+import argparse
 from dotenv import load_dotenv
+from jira_common import setup_logging, connect_jira, find_issues, RequestStats
 
-# Загрузка переменных
-load_dotenv('/cloud/repo/example_1C/python/jira_assigne.env')
-
-# Настройка путей для логов
-LOG_DIR = os.getenv('LOG_DIR', '/tmp')
-LOG_FILE = os.getenv('LOG_FILE', 'jira_script.log')
-
-# Создаем директорию для логов если не существует
-os.makedirs(LOG_DIR, exist_ok=True)
-
-# Полный путь к лог-файлу
-LOG_PATH = os.path.join(LOG_DIR, LOG_FILE)
-
-# Настройка логирования
-def setup_logging():
-    logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
-    
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    
-    file_handler = RotatingFileHandler(
-        LOG_PATH,
-        maxBytes=5*1024*1024,
-        backupCount=5,
-        encoding='utf-8'
-    )
-    file_handler.setFormatter(formatter)
-    
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
-    
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
-    return logger
-
-logger = setup_logging()
-
-def find_issues(jira_client, jql_query, expand_fields=None):
-    """
-    Поиск задач в Jira по JQL запросу
-    :param jira_client: Объект клиента Jira
-    :param jql_query: JQL запрос для поиска
-    :return: Список найденных задач или None в случае ошибки
-    """
-    try:
-        logger.info(f"Поиск задач по запросу: {jql_query}")
-        
-        if expand_fields:
-            issues = jira_client.search_issues(jql_query, expand=expand_fields)
-        else:
-            issues = jira_client.search_issues(jql_query)
-            
-        logger.info(f"Найдено {len(issues)} задач")
-        return issues
-    except Exception as e:
-        logger.error(f"Ошибка при поиске задач: {str(e)}")
-        return None
+logger = logging.getLogger()
 
 def update_labels_to_2line(jira_client, jql_query):
     """
@@ -129,14 +72,64 @@ def clear_assignee(jira_client, jql_query):
     
     return processed_count, error_count
 
-def reassign_to_last_human(jira_client, jql_query):
+# Максимальный возраст зеркала по умолчанию, минут: с более старым история берется из Jira
+MIRROR_MAX_AGE_MINUTES = 60
+
+def last_human_from_changelog(changelog):
+    """
+    Последний назначенный человек по истории изменений задачи (expand=changelog)
+    :return: Отображаемое имя или None
+    """
+    if not changelog or not changelog.histories:
+        return None
+    for history in reversed(changelog.histories):
+        for item in history.items:
+            if item.field == 'assignee':
+                if (item.toString and 
+                    item.toString != "Не назначен" and
+                    item.toString.lower() != "robot"):
+                    logger.debug(f"Найден кандидат: {item.toString}")
+                    return item.toString
+    return None
+
+def open_fresh_mirror(mirror_db, max_age_minutes=MIRROR_MAX_AGE_MINUTES):
+    """
+    Открывает зеркало (jira_sync.py), если последняя синхронизация не старше max_age_minutes
+    :return: Соединение или None (зеркало не найдено или устарело - используется история из Jira)
+    """
+    from jira_sync import open_mirror, get_state
+    if not os.path.isfile(mirror_db):
+        logger.warning(f"Зеркало {mirror_db} не найдено, история назначений берется из Jira")
+        return None
+    mirror = open_mirror(mirror_db)
+    last_sync = get_state(mirror, 'last_sync')
+    age_minutes = (datetime.now() - datetime.fromisoformat(last_sync)).total_seconds() / 60 if last_sync else None
+    if age_minutes is None or age_minutes > max_age_minutes:
+        logger.warning(f"Зеркало {mirror_db} устарело (последняя синхронизация: {last_sync or 'нет'}, "
+                       f"допустимо {max_age_minutes} мин), история назначений берется из Jira")
+        mirror.close()
+        return None
+    logger.info(f"История назначений берется из зеркала: {mirror_db} (синхронизация {last_sync})")
+    return mirror
+
+def reassign_to_last_human(jira_client, jql_query, mirror_db=None, mirror_max_age=MIRROR_MAX_AGE_MINUTES):
     """
     Переназначение задач на последнего ответственного пользователя
+    :param mirror_db: Путь к локальному зеркалу (jira_sync.py). Если указан и зеркало свежее, история
+                      изменений берется из зеркала и задачи ищутся без expand=changelog
+    :param mirror_max_age: Максимальный возраст зеркала, минут
     """
-    issues = find_issues(jira_client, jql_query, expand_fields='changelog')
+    mirror = open_fresh_mirror(mirror_db, mirror_max_age) if mirror_db else None
+    if mirror:
+        from jira_sync import mirror_last_human_assignee
+        issues = find_issues(jira_client, jql_query)
+    else:
+        issues = find_issues(jira_client, jql_query, expand_fields='changelog')
     
     if not issues:
         logger.info(f"Не найдено задач по запросу: {jql_query}")
+        if mirror:
+            mirror.close()
         return 0, 0
     
     reassigned_count = 0
@@ -145,21 +138,18 @@ def reassign_to_last_human(jira_client, jql_query):
     for issue in issues:
         logger.info(f"\nАнализ задачи: {issue.key}")
         
-        changelog = issue.changelog
-        last_human_assignee = None
-        
-        if changelog and changelog.histories:
-            for history in reversed(changelog.histories):
-                for item in history.items:
-                    if item.field == 'assignee':
-                        if (item.toString and 
-                            item.toString != "Не назначен" and
-                            item.toString.lower() != "robot"):
-                            last_human_assignee = item.toString
-                            logger.debug(f"Найден кандидат: {last_human_assignee}")
-                            break
-                if last_human_assignee:
-                    break
+        if not mirror:
+            last_human_assignee = last_human_from_changelog(issue.changelog)
+        elif mirror.execute('SELECT 1 FROM issues WHERE key = ?', (issue.key,)).fetchone():
+            last_human_assignee = mirror_last_human_assignee(mirror, issue.key)
+        else:
+            logger.warning(f"ПРЕДУПРЕЖДЕНИЕ: Задача {issue.key} не найдена в зеркале, история берется из Jira")
+            try:
+                last_human_assignee = last_human_from_changelog(
+                    jira_client.issue(issue.key, expand='changelog').changelog)
+            except Exception as e:
+                logger.error(f"ОШИБКА: Не удалось получить историю {issue.key}: {str(e)}")
+                last_human_assignee = None
         
         if last_human_assignee:
             try:
@@ -172,6 +162,9 @@ def reassign_to_last_human(jira_client, jql_query):
             logger.warning(f"ПРОПУСК: Для задачи {issue.key} не найден подходящий пользователь")
             skipped_count += 1
     
+    if mirror:
+        mirror.close()
+    
     return reassigned_count, skipped_count
 
 def transition_issues_to_todo(jira_client, jql_query):
@@ -224,9 +217,36 @@ def transition_issues_to_todo(jira_client, jql_query):
     
     return success_count, error_count
 
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description='Обслуживание задач Jira: переназначение с robot, метки 2линия, возврат в To Do',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  %(prog)s                                        # история назначений из Jira (expand=changelog)
+  %(prog)s --mirror jira_mirror.db                # из зеркала jira_sync.py, если оно свежее
+  %(prog)s --mirror jira_mirror.db --mirror-max-age 180
+        """
+    )
+    parser.add_argument('--mirror', type=str, default=None,
+                        help='Брать историю назначений из зеркала SQLite (см. jira_sync.py)')
+    parser.add_argument('--mirror-max-age', type=int, default=MIRROR_MAX_AGE_MINUTES,
+                        help=f'Максимальный возраст зеркала, минут; более старое не используется '
+                             f'(по умолчанию: {MIRROR_MAX_AGE_MINUTES})')
+    return parser.parse_args()
+
 def main():
+    args = parse_arguments()
+    
+    # Загрузка переменных и настройка логирования (LOG_DIR, LOG_FILE)
+    load_dotenv('/cloud/repo/example_1C/python/jira_assigne.env')
+    setup_logging()
+    
     logger.info("=== Запуск скрипта работы с Jira ===")
     
+    # Статистика запросов к Jira по эндпоинтам (поиск, переходы, назначение и т.д.)
+    request_stats = RequestStats()
+    
     try:
         # Загрузка переменных окружения
         load_dotenv('jira_assigne.env')
@@ -234,18 +254,16 @@ def main():
         
         # Подключение к Jira
         try:
-            jira = JIRA(
-                server=os.getenv('JIRA_SERVER'),
-                token_auth=os.getenv('JIRA_ACCESS_TOKEN')
-            )
-            logger.info(f"Успешное подключение к Jira: {os.getenv('JIRA_SERVER')}")
+            jira = connect_jira(request_stats=request_stats)
         except Exception as e:
             logger.error(f"Ошибка подключения к Jira: {str(e)}")
             sys.exit(1)
         
         # 1. Переназначение задач, назначенных на robot
         robot_jql = 'resolved is EMPTY AND assignee = robot'
-        reassigned_count, skipped_count = reassign_to_last_human(jira, robot_jql)
+        reassigned_count, skipped_count = reassign_to_last_human(
+            jira, robot_jql, mirror_db=args.mirror, mirror_max_age=args.mirror_max_age
+        )
         logger.info(f"\nИтоги переназначения:")
         logger.info(f"Успешно переназначено: {reassigned_count}")
         logger.info(f"Пропущено: {skipped_count}")
@@ -279,6 +297,14 @@ def main():
         if 'jira' in locals():
             jira.close()
             logger.info("Сессия Jira закрыта")
+        
+        request_stats.log_summary()
+        prom_path = os.getenv('JIRA_PROM_TEXTFILE')
+        if prom_path:
+            try:
+                request_stats.write_prometheus(prom_path, job='jira_assigne')
+            except Exception as e:
+                logger.error(f"Ошибка записи метрик Prometheus: {str(e)}")
         logger.info("=== Завершение работы скрипта ===\n")
 
 if __name__ == "__main__":
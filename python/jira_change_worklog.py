@@ -5,15 +5,18 @@
 """
 
 import logging
-from logging.handlers import RotatingFileHandler
 from datetime import datetime, timezone
-from jira import JIRA
 import os
 import sys
 import argparse
-from dotenv import load_dotenv
 import re
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import dateutil.parser
+from jira_common import setup_logging, load_env, connect_jira
+
+logger = logging.getLogger()
 
 # ============================================================================
 # Парсинг аргументов командной строки
@@ -27,6 +30,7 @@ def parse_arguments():
   %(prog)s                    # Обработать только первый найденный worklog
   %(prog)s --all              # Обработать все найденные worklog
   %(prog)s --source SUP-7998 --target IW-405 --all
+  %(prog)s --all --workers 8  # Параллельный перенос (журнал в BACKUP_DIR)
   
 По умолчанию скрипт работает только с первым найденным worklog.
 Для обработки всех worklog используйте параметр --all
@@ -65,6 +69,20 @@ def parse_arguments():
         help='Тестовый режим: только показать найденные worklog без переноса'
     )
     
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=4,
+        help='Количество параллельных переносов при --all (по умолчанию: 4)'
+    )
+    
+    parser.add_argument(
+        '--journal',
+        type=str,
+        default=None,
+        help='Файл журнала переноса (по умолчанию: BACKUP_DIR/worklog_transfer_<source>_<target>.jsonl)'
+    )
+    
     parser.add_argument(
         '--env-file',
         type=str,
@@ -74,93 +92,38 @@ def parse_arguments():
     
     return parser.parse_args()
 
-args = parse_arguments()
-
 # ============================================================================
 # Настройка путей и проверка директорий
 # ============================================================================
-
-# Загрузка переменных окружения
-env_file = args.env_file
-if not os.path.exists(env_file):
-    # Пробуем найти в директории скрипта
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    env_path = os.path.join(script_dir, env_file)
-    if os.path.exists(env_path):
-        env_file = env_path
-    else:
-        print(f"ОШИБКА: Файл .env не найден: {env_file}")
-        print(f"Искали по пути: {env_path}")
-        sys.exit(1)
-
-load_dotenv(env_file)
-
-# Получаем настройки из .env
-LOG_DIR = os.getenv('LOG_DIR', '/tmp')
-LOG_FILE = os.getenv('LOG_FILE', 'jira_script.log')
-BACKUP_DIR = os.getenv('BACKUP_DIR', '/tmp/jira_backup')
-
-# Создаем необходимые директории
-directories_to_create = [LOG_DIR, BACKUP_DIR]
-for directory in directories_to_create:
-    try:
-        os.makedirs(directory, exist_ok=True)
-        print(f"Директория создана/проверена: {directory}")
-    except Exception as e:
-        print(f"ОШИБКА: Не удалось создать директорию {directory}: {e}")
-        sys.exit(1)
-
-# Полный путь к лог-файлу
-LOG_PATH = os.path.join(LOG_DIR, LOG_FILE)
-
-# ============================================================================
-# Настройка логирования
-# ============================================================================
-def setup_logging():
-    logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
-    
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    
-    file_handler = RotatingFileHandler(
-        LOG_PATH,
-        maxBytes=5*1024*1024,
-        backupCount=5,
-        encoding='utf-8'
-    )
-    file_handler.setFormatter(formatter)
+def prepare_environment(env_file):
+    """
+    Загружает переменные окружения, создает директории логов и бэкапов,
+    настраивает логирование
+    :param env_file: Файл с переменными окружения
+    :return: Кортеж (путь к загруженному .env, директория бэкапов)
+    """
+    env_file = load_env(env_file, required=True)
     
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
+    # Получаем настройки из .env
+    log_dir = os.getenv('LOG_DIR', '/tmp')
+    log_file = os.getenv('LOG_FILE', 'jira_script.log')
+    backup_dir = os.getenv('BACKUP_DIR', '/tmp/jira_backup')
     
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # Создаем необходимые директории
+    for directory in [log_dir, backup_dir]:
+        try:
+            os.makedirs(directory, exist_ok=True)
+            print(f"Директория создана/проверена: {directory}")
+        except Exception as e:
+            print(f"ОШИБКА: Не удалось создать директорию {directory}: {e}")
+            sys.exit(1)
     
-    return logger
-
-logger = setup_logging()
+    setup_logging(os.path.join(log_dir, log_file))
+    return env_file, backup_dir
 
 # ============================================================================
 # Вспомогательные функции
 # ============================================================================
-def find_issues(jira_client, jql_query, expand_fields=None):
-    """
-    Поиск задач в Jira по JQL запросу
-    """
-    try:
-        logger.info(f"Поиск задач по запросу: {jql_query}")
-        
-        if expand_fields:
-            issues = jira_client.search_issues(jql_query, expand=expand_fields)
-        else:
-            issues = jira_client.search_issues(jql_query)
-            
-        logger.info(f"Найдено {len(issues)} задач")
-        return issues
-    except Exception as e:
-        logger.error(f"Ошибка при поиске задач: {str(e)}")
-        return None
-
 def get_current_user(jira_client):
     """
     Получает информацию о текущем пользователе
@@ -175,31 +138,34 @@ def get_current_user(jira_client):
         logger.error(f"Ошибка при получении текущего пользователя: {str(e)}")
         return None
 
-def delete_worklog_safe(jira_client, issue_key, worklog_id):
+def delete_worklog_safe(jira_client, issue_key, worklog_id, worklogs_by_id=None):
     """
     Безопасное удаление worklog с проверкой существования
+    :param worklogs_by_id: Уже загруженные worklog задачи {id: worklog}.
+                           Если не указан - worklog задачи загружаются заново
     """
     try:
-        issue = jira_client.issue(issue_key)
-        worklogs = jira_client.worklogs(issue)
+        if worklogs_by_id is None:
+            issue = jira_client.issue(issue_key)
+            worklogs_by_id = {str(worklog.id): worklog for worklog in jira_client.worklogs(issue)}
         
         # Ищем worklog по ID
-        for worklog in worklogs:
-            if str(worklog.id) == str(worklog_id):
-                # Получаем информацию о worklog перед удалением
-                comment = worklog.comment if hasattr(worklog, 'comment') and worklog.comment else ""
-                time_spent = worklog.timeSpentSeconds
-                
-                # Удаляем worklog
-                worklog.delete()
-                
-                logger.info(f"Удален worklog {worklog_id} из задачи {issue_key}")
-                logger.info(f"  Комментарий удаленного: {comment[:50]}...")
-                logger.info(f"  Время удаленного: {time_spent} секунд")
-                return True
+        worklog = worklogs_by_id.get(str(worklog_id))
+        if worklog is None:
+            logger.warning(f"Worklog {worklog_id} не найден в задаче {issue_key}")
+            return False
         
-        logger.warning(f"Worklog {worklog_id} не найден в задаче {issue_key}")
-        return False
+        # Получаем информацию о worklog перед удалением
+        comment = worklog.comment if hasattr(worklog, 'comment') and worklog.comment else ""
+        time_spent = worklog.timeSpentSeconds
+        
+        # Удаляем worklog
+        worklog.delete()
+        
+        logger.info(f"Удален worklog {worklog_id} из задачи {issue_key}")
+        logger.info(f"  Комментарий удаленного: {comment[:50]}...")
+        logger.info(f"  Время удаленного: {time_spent} секунд")
+        return True
         
     except Exception as e:
         logger.error(f"Ошибка при удалении worklog {worklog_id}: {str(e)}")
@@ -312,6 +278,8 @@ def transfer_worklogs_with_test_text(jira_client, source_issue_key, target_issue
             logger.info(f"В исходной задаче {source_issue_key} нет записей worklog")
             return 0, 0
         
+        worklogs_by_id = {str(worklog.id): worklog for worklog in worklogs}
+        
         transferred_count = 0
         deleted_count = 0
         found_count = 0
@@ -396,7 +364,7 @@ def transfer_worklogs_with_test_text(jira_client, source_issue_key, target_issue
                 
                 # Удаляем исходный worklog, если указано
                 if delete_original:
-                    if delete_worklog_safe(jira_client, source_issue_key, original_worklog_id):
+                    if delete_worklog_safe(jira_client, source_issue_key, original_worklog_id, worklogs_by_id):
                         deleted_count += 1
                     else:
                         logger.warning(f"  Не удалось удалить исходный worklog {original_worklog_id}")
@@ -438,10 +406,235 @@ def transfer_worklogs_with_test_text(jira_client, source_issue_key, target_issue
         logger.error(f"Ошибка при переносе worklog: {str(e)}")
         return 0, 0
 
+# ============================================================================
+# Пакетный перенос с журналом
+# ============================================================================
+
+# Состояния переноса одного worklog в журнале
+JOURNAL_ADDING = 'adding'    # начато создание копии в целевой задаче
+JOURNAL_ADDED = 'added'      # копия создана
+JOURNAL_KEPT = 'added_kept'  # копия создана, исходный оставлен (--no-delete), удалит следующий запуск с удалением
+JOURNAL_DONE = 'done'        # исходный worklog удален
+
+def is_test_worklog(worklog, username):
+    """
+    Проверяет, что worklog принадлежит пользователю и содержит текст "тест"
+    """
+    worklog_author = worklog.author.name if hasattr(worklog.author, 'name') else str(worklog.author)
+    if worklog_author != username:
+        return False
+    comment = worklog.comment if hasattr(worklog, 'comment') and worklog.comment else ""
+    return bool(re.search(r'\bтест(?:[аы]|ов|ом|ами|ах)?\b', comment.lower()))
+
+def load_journal(journal_path):
+    """
+    Читает журнал переноса и возвращает последнее состояние каждого worklog
+    :param journal_path: Путь к файлу журнала (JSON Lines)
+    :return: Словарь {id исходного worklog: последняя запись журнала}
+    """
+    states = {}
+    if not os.path.exists(journal_path):
+        return states
+    
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Оборванная последняя строка после аварийного завершения
+                logger.warning(f"Пропущена поврежденная строка журнала: {line[:80]}")
+                continue
+            states[str(record['source_id'])] = record
+    
+    return states
+
+def append_journal(journal_file, journal_lock, record):
+    """
+    Записывает шаг переноса в журнал и сбрасывает его на диск
+    """
+    record['time'] = datetime.now(timezone.utc).isoformat()
+    with journal_lock:
+        journal_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        journal_file.flush()
+        os.fsync(journal_file.fileno())
+
+def transfer_note_for(source_issue_key, comment):
+    """
+    Формирует комментарий копии worklog с пометкой о переносе
+    """
+    transfer_note = f"[Перенесено из {source_issue_key}]"
+    return f"{transfer_note}\n\n{comment}" if comment else transfer_note
+
+def find_existing_copy(target_worklogs, worklog, new_comment):
+    """
+    Ищет в целевой задаче копию worklog, созданную прерванным запуском
+    :return: ID найденной копии или None
+    """
+    started = format_jira_datetime(worklog.started)
+    for candidate in target_worklogs:
+        if (candidate.timeSpentSeconds == worklog.timeSpentSeconds and
+                (getattr(candidate, 'comment', '') or '') == new_comment and
+                format_jira_datetime(candidate.started) == started):
+            return str(candidate.id)
+    return None
+
+def transfer_one_worklog(jira_client, worklog, target_issue, source_issue_key, delete_original,
+                         state, target_worklogs, journal_file, journal_lock):
+    """
+    Переносит один worklog: создает копию в целевой задаче и удаляет исходный.
+    Каждый шаг фиксируется в журнале, уже выполненные шаги пропускаются
+    :param state: Последняя запись журнала для этого worklog или None
+    :param target_worklogs: Worklog целевой задачи (только при восстановлении после сбоя)
+    :return: Кортеж (перенесен ли worklog, удален ли исходный)
+    """
+    source_id = str(worklog.id)
+    comment = worklog.comment if hasattr(worklog, 'comment') and worklog.comment else ""
+    new_comment = transfer_note_for(source_issue_key, comment)
+    status = state['state'] if state else None
+    new_id = state.get('target_id') if state else None
+    
+    if status == JOURNAL_ADDING:
+        # Предыдущий запуск прервался во время создания копии - проверяем, не создана ли она
+        new_id = find_existing_copy(target_worklogs or [], worklog, new_comment)
+        if new_id:
+            logger.info(f"Worklog {source_id}: найдена копия {new_id} от прерванного запуска")
+            append_journal(journal_file, journal_lock,
+                           {'source_id': source_id, 'state': JOURNAL_ADDED, 'target_id': new_id})
+            status = JOURNAL_ADDED
+    
+    transferred = False
+    if status not in (JOURNAL_ADDED, JOURNAL_KEPT, JOURNAL_DONE):
+        append_journal(journal_file, journal_lock, {'source_id': source_id, 'state': JOURNAL_ADDING})
+        new_worklog = jira_client.add_worklog(
+            issue=target_issue,
+            timeSpentSeconds=worklog.timeSpentSeconds,
+            comment=new_comment,
+            started=format_jira_datetime(worklog.started)
+        )
+        new_id = str(new_worklog.id)
+        append_journal(journal_file, journal_lock,
+                       {'source_id': source_id, 'state': JOURNAL_ADDED, 'target_id': new_id})
+        logger.info(f"УСПЕХ: Worklog {source_id} перенесен в {target_issue.key} (новый ID {new_id})")
+        transferred = True
+    
+    deleted = False
+    if delete_original:
+        worklog.delete()
+        logger.info(f"Удален worklog {source_id} из задачи {source_issue_key}")
+        deleted = True
+        append_journal(journal_file, journal_lock,
+                       {'source_id': source_id, 'state': JOURNAL_DONE, 'target_id': new_id})
+    elif status != JOURNAL_KEPT:
+        append_journal(journal_file, journal_lock,
+                       {'source_id': source_id, 'state': JOURNAL_KEPT, 'target_id': new_id})
+    
+    return transferred, deleted
+
+def transfer_worklogs_batch(jira_client, source_issue_key, target_issue_key, journal_path,
+                            delete_original=True, workers=4):
+    """
+    Переносит все worklog текущего пользователя с текстом "тест" параллельно.
+    Worklog исходной задачи загружаются один раз, каждый шаг записывается в журнал,
+    поэтому прерванный запуск можно повторить без дублирования списаний времени
+    
+    :param jira_client: Объект клиента Jira
+    :param source_issue_key: Ключ исходной задачи
+    :param target_issue_key: Ключ целевой задачи
+    :param journal_path: Путь к файлу журнала
+    :param delete_original: Удалять ли исходный worklog после переноса
+    :param workers: Количество параллельных переносов
+    :return: Кортеж (количество перенесенных, количество удаленных)
+    """
+    logger.info(f"\n=== Пакетный перенос worklog из {source_issue_key} в {target_issue_key} ===")
+    logger.info(f"Журнал переноса: {journal_path}")
+    
+    current_username = get_current_user(jira_client)
+    if not current_username:
+        logger.error("Не удалось определить текущего пользователя")
+        return 0, 0
+    
+    try:
+        target_issue = jira_client.issue(target_issue_key)
+        logger.info(f"Целевая задача: {target_issue.key} - {target_issue.fields.summary}")
+    except Exception as e:
+        logger.error(f"Ошибка: Целевая задача {target_issue_key} не найдена: {str(e)}")
+        return 0, 0
+    
+    # Единственная загрузка worklog исходной задачи
+    try:
+        worklogs_by_id = {
+            str(worklog.id): worklog
+            for worklog in jira_client.worklogs(source_issue_key)
+            if is_test_worklog(worklog, current_username)
+        }
+    except Exception as e:
+        logger.error(f"Ошибка: Не удалось получить worklog задачи {source_issue_key}: {str(e)}")
+        return 0, 0
+    
+    states = load_journal(journal_path)
+    # Перенесенные без удаления исходного остаются в работе для запуска с удалением
+    finished = (JOURNAL_DONE,) if delete_original else (JOURNAL_DONE, JOURNAL_KEPT)
+    pending = {
+        worklog_id: worklog for worklog_id, worklog in worklogs_by_id.items()
+        if states.get(worklog_id, {}).get('state') not in finished
+    }
+    logger.info(f"Найдено worklog текущего пользователя с текстом 'тест': {len(worklogs_by_id)}")
+    logger.info(f"Уже перенесено по журналу: {len(worklogs_by_id) - len(pending)}")
+    
+    # Worklog целевой задачи нужны только для проверки прерванных созданий
+    target_worklogs = None
+    if any(states.get(worklog_id, {}).get('state') == JOURNAL_ADDING for worklog_id in pending):
+        target_worklogs = jira_client.worklogs(target_issue_key)
+    
+    transferred_count = 0
+    deleted_count = 0
+    error_count = 0
+    journal_lock = threading.Lock()
+    
+    with open(journal_path, 'a', encoding='utf-8') as journal_file:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(
+                    transfer_one_worklog, jira_client, worklog, target_issue, source_issue_key,
+                    delete_original, states.get(worklog_id), target_worklogs,
+                    journal_file, journal_lock
+                ): worklog_id
+                for worklog_id, worklog in pending.items()
+            }
+            
+            for future in as_completed(futures):
+                worklog_id = futures[future]
+                try:
+                    transferred, deleted = future.result()
+                    transferred_count += int(transferred)
+                    deleted_count += int(deleted)
+                except Exception as e:
+                    logger.error(f"ОШИБКА: Не удалось перенести worklog {worklog_id}: {str(e)}")
+                    error_count += 1
+    
+    logger.info(f"\n{'='*60}")
+    logger.info("ИТОГИ ПАКЕТНОГО ПЕРЕНОСА:")
+    logger.info(f"Исходная задача: {source_issue_key}")
+    logger.info(f"Целевая задача: {target_issue_key}")
+    logger.info(f"Успешно перенесено: {transferred_count}")
+    if delete_original:
+        logger.info(f"Удалено из исходной задачи: {deleted_count}")
+    logger.info(f"Ошибок: {error_count}")
+    if error_count:
+        logger.info("Для продолжения переноса запустите скрипт повторно с теми же параметрами")
+    
+    return transferred_count, deleted_count
+
 # ============================================================================
 # Основная функция
 # ============================================================================
 def main():
+    args = parse_arguments()
+    env_file, backup_dir = prepare_environment(args.env_file)
+    
     logger.info("="*60)
     logger.info("ЗАПУСК СКРИПТА ПЕРЕНОСА WORKLOG В JIRA")
     logger.info("="*60)
@@ -453,6 +646,7 @@ def main():
     logger.info(f"  Обработка всех: {'ДА' if args.all else 'НЕТ (только первый)'}")
     logger.info(f"  Удаление исходных: {'НЕТ' if args.no_delete else 'ДА'}")
     logger.info(f"  Тестовый режим: {'ДА' if args.test_only else 'НЕТ'}")
+    logger.info(f"  Параллельных переносов: {args.workers}")
     logger.info(f"  Файл .env: {env_file}")
     
     try:
@@ -460,24 +654,33 @@ def main():
         
         # Подключение к Jira
         try:
-            jira = JIRA(
-                server=os.getenv('JIRA_SERVER'),
-                token_auth=os.getenv('JIRA_ACCESS_TOKEN')
-            )
-            logger.info(f"Успешное подключение к Jira: {os.getenv('JIRA_SERVER')}")
+            jira = connect_jira(pool_size=max(args.workers, 1))
         except Exception as e:
             logger.error(f"Ошибка подключения к Jira: {str(e)}")
             sys.exit(1)
         
         # Выполняем перенос worklog
-        transferred, deleted = transfer_worklogs_with_test_text(
-            jira, 
-            args.source, 
-            args.target,
-            delete_original=not args.no_delete,
-            process_all=args.all,
-            test_only=args.test_only
-        )
+        if args.all and not args.test_only:
+            journal_path = args.journal or os.path.join(
+                backup_dir, f"worklog_transfer_{args.source}_{args.target}.jsonl"
+            )
+            transferred, deleted = transfer_worklogs_batch(
+                jira,
+                args.source,
+                args.target,
+                journal_path,
+                delete_original=not args.no_delete,
+                workers=args.workers
+            )
+        else:
+            transferred, deleted = transfer_worklogs_with_test_text(
+                jira, 
+                args.source, 
+                args.target,
+                delete_original=not args.no_delete,
+                process_all=args.all,
+                test_only=args.test_only
+            )
         
         if not args.test_only and transferred == 0:
             logger.warning("Не было перенесено ни одного worklog")
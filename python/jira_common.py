@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+Общие функции для скриптов работы с Jira: логирование, загрузка .env,
+подключение с пулом keep-alive соединений, поиск задач, гистограммы задержек
+и статистика HTTP-запросов к Jira
+"""
+
+import logging
+from logging.handlers import RotatingFileHandler
+from jira import JIRA
+from requests.adapters import HTTPAdapter
+import os
+import sys
+import bisect
+import random
+import re
+import time
+import threading
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+
+logger = logging.getLogger()
+
+# Границы корзин гистограммы задержек, мс
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+# ============================================================================
+# Логирование и окружение
+# ============================================================================
+def setup_logging(log_path=None):
+    """
+    Настраивает корневой логгер: файл с ротацией и консоль.
+    Повторный вызов не добавляет обработчики, поэтому функции разных скриптов
+    можно вызывать в одном процессе
+    :param log_path: Путь к лог-файлу (по умолчанию: LOG_DIR/LOG_FILE из окружения)
+    """
+    if logger.handlers:
+        return logger
+
+    if log_path is None:
+        log_dir = os.getenv('LOG_DIR', '/tmp')
+        os.makedirs(log_dir, exist_ok=True)
+        log_path = os.path.join(log_dir, os.getenv('LOG_FILE', 'jira_script.log'))
+
+    logger.setLevel(logging.INFO)
+
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+
+    file_handler = RotatingFileHandler(
+        log_path,
+        maxBytes=5*1024*1024,
+        backupCount=5,
+        encoding='utf-8'
+    )
+    file_handler.setFormatter(formatter)
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+
+    logger.addHandler(file_handler)
+    logger.addHandler(console_handler)
+
+    return logger
+
+def load_env(env_file, required=False):
+    """
+    Загружает переменные окружения из файла; если файла нет в текущей
+    директории, ищет его рядом со скриптом
+    :param env_file: Имя или путь к .env файлу
+    :param required: Завершать работу, если файл не найден
+    :return: Путь к загруженному файлу или None
+    """
+    if not os.path.exists(env_file):
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        env_path = os.path.join(script_dir, env_file)
+        if os.path.exists(env_path):
+            env_file = env_path
+        elif required:
+            print(f"ОШИБКА: Файл .env не найден: {env_file}")
+            print(f"Искали по пути: {env_path}")
+            sys.exit(1)
+        else:
+            return None
+
+    load_dotenv(env_file)
+    return env_file
+
+# ============================================================================
+# Подключение к Jira
+# ============================================================================
+def connect_jira(server=None, token=None, pool_size=16, request_stats=None):
+    """
+    Создает клиент Jira с пулом keep-alive соединений
+    :param server: Адрес Jira (по умолчанию: JIRA_SERVER)
+    :param token: Токен доступа (по умолчанию: JIRA_ACCESS_TOKEN)
+    :param pool_size: Размер пула соединений (не меньше числа потоков, работающих с клиентом)
+    :param request_stats: Объект RequestStats для сбора статистики HTTP-запросов
+    :return: Объект клиента Jira
+    """
+    server = server or os.getenv('JIRA_SERVER')
+    jira = JIRA(
+        server=server,
+        token_auth=token or os.getenv('JIRA_ACCESS_TOKEN')
+    )
+
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    jira._session.mount('https://', adapter)
+    jira._session.mount('http://', adapter)
+
+    if request_stats is not None:
+        request_stats.instrument(jira._session)
+
+    logger.info(f"Успешное подключение к Jira: {server}")
+    return jira
+
+def find_issues(jira_client, jql_query, expand_fields=None):
+    """
+    Поиск задач в Jira по JQL запросу
+    :param jira_client: Объект клиента Jira
+    :param jql_query: JQL запрос для поиска
+    :return: Список найденных задач или None в случае ошибки
+    """
+    try:
+        logger.info(f"Поиск задач по запросу: {jql_query}")
+
+        if expand_fields:
+            issues = jira_client.search_issues(jql_query, expand=expand_fields)
+        else:
+            issues = jira_client.search_issues(jql_query)
+
+        logger.info(f"Найдено {len(issues)} задач")
+        return issues
+    except Exception as e:
+        logger.error(f"Ошибка при поиске задач: {str(e)}")
+        return None
+
+# ============================================================================
+# Гистограммы задержек
+# ============================================================================
+class LatencyHistogram:
+    """
+    Гистограмма задержек с фиксированными корзинами (LATENCY_BUCKETS_MS)
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, q):
+        """
+        Оценка перцентиля по верхней границе корзины, мс
+        """
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(LATENCY_BUCKETS_MS[index], self.max) if index < len(LATENCY_BUCKETS_MS) else self.max
+        return self.max
+
+    def format_bars(self, width=30):
+        """
+        Строки текстовой гистограммы
+        """
+        peak = max(self.counts) or 1
+        lines = []
+        lower = 0
+        for index, bucket_count in enumerate(self.counts):
+            upper = LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else None
+            label = f"{lower}-{upper} мс" if upper is not None else f">{lower} мс"
+            if bucket_count:
+                bar = '#' * max(1, bucket_count * width // peak)
+                lines.append(f"    {label:>16} | {bar} {bucket_count}")
+            lower = upper
+        return lines
+
+class CallStats:
+    """
+    Потокобезопасный набор гистограмм задержек по именам вызовов
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def log_summary(self, title="Задержки вызовов Jira"):
+        logger.info(f"\n=== {title} ===")
+        for name, histogram in sorted(self.histograms.items()):
+            logger.info(
+                f"{name}: вызовов {histogram.count}, среднее {histogram.total / histogram.count:.0f} мс, "
+                f"p50 {histogram.percentile(50):.0f} мс, p95 {histogram.percentile(95):.0f} мс, "
+                f"макс {histogram.max:.0f} мс"
+            )
+            for line in histogram.format_bars():
+                logger.info(line)
+
+class TimedJira:
+    """
+    Обертка над клиентом Jira, замеряющая длительность каждого вызова метода
+    """
+
+    def __init__(self, jira_client, stats):
+        self._jira = jira_client
+        self._stats = stats
+
+    def __getattr__(self, name):
+        attr = getattr(self._jira, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                self._stats.record(name, time.perf_counter() - start)
+
+        return timed
+
+# ============================================================================
+# Статистика HTTP-запросов к Jira
+# ============================================================================
+
+# Максимум сохраненных замеров на эндпоинт для расчета перцентилей
+LATENCY_SAMPLE_SIZE = 10000
+
+class EndpointStats:
+    """
+    Статистика одного эндпоинта: запросы, байты, ответы по кодам, повторы, задержки
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+        self.retries = 0
+        self.errors = 0
+        self.statuses = {}
+        self.histogram = LatencyHistogram()
+        self.samples = []
+
+    def add_sample(self, ms):
+        # Reservoir sampling: память не растет при длинных запусках
+        if len(self.samples) < LATENCY_SAMPLE_SIZE:
+            self.samples.append(ms)
+        else:
+            index = random.randrange(self.histogram.count)
+            if index < LATENCY_SAMPLE_SIZE:
+                self.samples[index] = ms
+
+    def percentile(self, q):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+class RequestStats:
+    """
+    Слой хуков на сессии Jira: считает запросы, объем ответов, задержки
+    и повторы (ResilientSession) по нормализованным эндпоинтам REST API
+    """
+
+    ID_SEGMENT = re.compile(r'^\d+$')
+    KEY_SEGMENT = re.compile(r'^[A-Z][A-Z0-9_]*-\d+$')
+
+    def __init__(self):
+        self.endpoints = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.started = time.time()
+
+    @classmethod
+    def endpoint_of(cls, url):
+        """
+        Нормализует URL запроса: /rest/api/2/issue/SUP-1/worklog/10 -> api/2/issue/{key}/worklog/{id}
+        """
+        path = urlparse(url).path
+        if '/rest/' in path:
+            path = path.split('/rest/', 1)[1]
+        segments = []
+        for index, segment in enumerate(path.strip('/').split('/')):
+            if index < 2:
+                # api/2, agile/1.0 - версия API не нормализуется
+                pass
+            elif cls.KEY_SEGMENT.match(segment):
+                segment = '{key}'
+            elif cls.ID_SEGMENT.match(segment):
+                segment = '{id}'
+            segments.append(segment)
+        return '/'.join(segments)
+
+    def get(self, method, endpoint):
+        key = (method, endpoint)
+        stats = self.endpoints.get(key)
+        if stats is None:
+            stats = self.endpoints[key] = EndpointStats()
+        return stats
+
+    def on_response(self, response, *args, **kwargs):
+        """
+        Хук requests: вызывается на каждую попытку запроса, получившую ответ
+        Тело ответа здесь не читается (потоковые ответы остаются нетронутыми)
+        """
+        request = response.request
+        endpoint = self.endpoint_of(request.url)
+        ms = response.elapsed.total_seconds() * 1000
+
+        with self.lock:
+            stats = self.get(request.method, endpoint)
+            stats.requests += 1
+            stats.statuses[response.status_code] = stats.statuses.get(response.status_code, 0) + 1
+            stats.histogram.record(ms / 1000)
+            stats.add_sample(ms)
+
+    def instrument(self, session):
+        """
+        Подключает хук ответа и обертки над session.send (каждая попытка, в том числе
+        завершившаяся ConnectionError, и объем ответа) и session.request (повторы ResilientSession)
+        """
+        session.hooks['response'].append(self.on_response)
+        original_send = session.send
+        original_request = session.request
+
+        def send(prepared, **kwargs):
+            self.local.attempts = getattr(self.local, 'attempts', 0) + 1
+            response = original_send(prepared, **kwargs)
+            if kwargs.get('stream'):
+                # Потоковое тело не читаем - объем по заголовку
+                size = int(response.headers.get('Content-Length') or 0)
+            else:
+                # Тело уже прочитано requests
+                size = len(response.content or b'')
+            with self.lock:
+                self.get(prepared.method, self.endpoint_of(prepared.url)).bytes += size
+            return response
+
+        session.send = send
+
+        def request(method, url, **kwargs):
+            self.local.attempts = 0
+            try:
+                return original_request(method, url, **kwargs)
+            except Exception:
+                with self.lock:
+                    self.get(method.upper(), self.endpoint_of(url)).errors += 1
+                raise
+            finally:
+                attempts = self.local.attempts
+                if attempts > 1:
+                    with self.lock:
+                        self.get(method.upper(), self.endpoint_of(url)).retries += attempts - 1
+
+        session.request = request
+        return session
+
+    def log_summary(self, title="Статистика запросов к Jira"):
+        elapsed = time.time() - self.started
+        total_requests = sum(stats.requests for stats in self.endpoints.values())
+        total_bytes = sum(stats.bytes for stats in self.endpoints.values())
+
+        logger.info(f"\n=== {title} ===")
+        logger.info(f"Запросов: {total_requests}, получено: {total_bytes / 1024:.1f} КБ, "
+                    f"время работы: {elapsed:.1f} сек, "
+                    f"нагрузка: {total_requests / elapsed if elapsed else 0:.2f} запр/сек")
+        logger.info(f"{'Метод':<7} {'Эндпоинт':<45} {'Запр':>6} {'КБ':>9} {'p50':>7} {'p95':>7} "
+                    f"{'p99':>7} {'Повт':>5} {'Ошиб':>5}")
+        for (method, endpoint), stats in sorted(self.endpoints.items(),
+                                                key=lambda item: -item[1].histogram.total):
+            logger.info(
+                f"{method:<7} {endpoint[:45]:<45} {stats.requests:>6} {stats.bytes / 1024:>9.1f} "
+                f"{stats.percentile(50):>5.0f}мс {stats.percentile(95):>5.0f}мс {stats.percentile(99):>5.0f}мс "
+                f"{stats.retries:>5} {stats.errors:>5}"
+            )
+
+    def write_prometheus(self, path, job='jira_automation'):
+        """
+        Записывает метрики в формате Prometheus textfile (для node_exporter).
+        Файл заменяется атомарно через переименование
+        """
+        lines = [
+            '# HELP jira_requests_total HTTP requests to Jira by endpoint and status.',
+            '# TYPE jira_requests_total counter',
+        ]
+        for (method, endpoint), stats in sorted(self.endpoints.items()):
+            for status, count in sorted(stats.statuses.items()):
+                lines.append(f'jira_requests_total{{job="{job}",method="{method}",endpoint="{endpoint}",'
+                             f'status="{status}"}} {count}')
+
+        lines += ['# HELP jira_response_bytes_total Response body bytes received from Jira.',
+                  '# TYPE jira_response_bytes_total counter']
+        for (method, endpoint), stats in sorted(self.endpoints.items()):
+            lines.append(f'jira_response_bytes_total{{job="{job}",method="{method}",endpoint="{endpoint}"}} '
+                         f'{stats.bytes}')
+
+        lines += ['# HELP jira_request_retries_total Retried attempts of Jira requests.',
+                  '# TYPE jira_request_retries_total counter']
+        for (method, endpoint), stats in sorted(self.endpoints.items()):
+            lines.append(f'jira_request_retries_total{{job="{job}",method="{method}",endpoint="{endpoint}"}} '
+                         f'{stats.retries}')
+
+        lines += ['# HELP jira_request_duration_seconds Jira request latency.',
+                  '# TYPE jira_request_duration_seconds histogram']
+        for (method, endpoint), stats in sorted(self.endpoints.items()):
+            labels = f'job="{job}",method="{method}",endpoint="{endpoint}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS_MS, stats.histogram.counts):
+                cumulative += count
+                lines.append(f'jira_request_duration_seconds_bucket{{{labels},le="{bound / 1000}"}} {cumulative}')
+            lines.append(f'jira_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.histogram.count}')
+            lines.append(f'jira_request_duration_seconds_sum{{{labels}}} {stats.histogram.total / 1000}')
+            lines.append(f'jira_request_duration_seconds_count{{{labels}}} {stats.histogram.count}')
+
+        lines += ['# HELP jira_automation_last_run_timestamp_seconds Unix time of the last automation run.',
+                  '# TYPE jira_automation_last_run_timestamp_seconds gauge',
+                  f'jira_automation_last_run_timestamp_seconds{{job="{job}"}} {time.time():.0f}']
+
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(temp_path, path)
+        logger.info(f"Метрики Prometheus записаны в {path}")
@@ -1,71 +1,17 @@
 #!/usr/bin/env python3
 import logging
-from logging.handlers import RotatingFileHandler
 from datetime import datetime
-from jira import JIRA
-import os
 import sys
+import argparse
+import csv
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 import re
+from jira_common import setup_logging, connect_jira
 
-# Загрузка переменных
-load_dotenv('jira_change_worklog.env')
-
-# Настройка путей для логов
-LOG_DIR = os.getenv('LOG_DIR', '/tmp')
-LOG_FILE = os.getenv('LOG_FILE', 'jira_script.log')
-
-# Создаем директорию для логов если не существует
-os.makedirs(LOG_DIR, exist_ok=True)
-
-# Полный путь к лог-файлу
-LOG_PATH = os.path.join(LOG_DIR, LOG_FILE)
-
-# Настройка логирования
-def setup_logging():
-    logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
-    
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-    
-    file_handler = RotatingFileHandler(
-        LOG_PATH,
-        maxBytes=5*1024*1024,
-        backupCount=5,
-        encoding='utf-8'
-    )
-    file_handler.setFormatter(formatter)
-    
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
-    
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
-    return logger
-
-logger = setup_logging()
-
-def find_issues(jira_client, jql_query, expand_fields=None):
-    """
-    Поиск задач в Jira по JQL запросу
-    :param jira_client: Объект клиента Jira
-    :param jql_query: JQL запрос для поиска
-    :return: Список найденных задач или None в случае ошибки
-    """
-    try:
-        logger.info(f"Поиск задач по запросу: {jql_query}")
-        
-        if expand_fields:
-            issues = jira_client.search_issues(jql_query, expand=expand_fields)
-        else:
-            issues = jira_client.search_issues(jql_query)
-            
-        logger.info(f"Найдено {len(issues)} задач")
-        return issues
-    except Exception as e:
-        logger.error(f"Ошибка при поиске задач: {str(e)}")
-        return None
+logger = logging.getLogger()
 
 def print_worklogs_with_test_text(jira_client, issue_key):
     """
@@ -128,7 +74,297 @@ def print_worklogs_with_test_text(jira_client, issue_key):
     except Exception as e:
         logger.error(f"Ошибка при получении worklog для задачи {issue_key}: {str(e)}")
 
+# Регулярное выражение по умолчанию: слово "тест" во всех формах
+DEFAULT_PATTERN = r'\bтест(?:[аы]|ов|ом|ами|ах)?\b'
+
+# Максимальное количество ID в одном запросе worklog/list (ограничение Jira)
+WORKLOG_LIST_CHUNK = 1000
+
+# Поля выходного отчета
+OUTPUT_FIELDS = ['issue', 'id', 'author', 'author_name', 'started', 'time_spent_seconds', 'comment']
+
+def build_worklog_jql(base_jql, text=None, author=None, date_from=None):
+    """
+    Дополняет JQL условиями по worklog, чтобы отбор кандидатов выполнялся на сервере
+    :param base_jql: Исходный JQL запрос (например, project = SUP)
+    :param text: Текст для поиска в комментарии worklog (worklogComment ~)
+    :param author: Автор worklog (worklogAuthor =)
+    :param date_from: Дата worklog не ранее указанной (worklogDate >=), формат YYYY-MM-DD
+    :return: Итоговый JQL запрос
+    """
+    conditions = [f"({base_jql})"] if base_jql else []
+    
+    if text:
+        escaped = text.replace('\\', '\\\\').replace('"', '\\"')
+        conditions.append(f'worklogComment ~ "{escaped}"')
+    if author:
+        conditions.append(f'worklogAuthor = "{author}"')
+    if date_from:
+        conditions.append(f'worklogDate >= "{date_from}"')
+    
+    return ' AND '.join(conditions)
+
+def search_issue_keys(jira_client, jql_query):
+    """
+    Поиск задач по JQL с загрузкой всех страниц, без лишних полей
+    :param jira_client: Объект клиента Jira
+    :param jql_query: JQL запрос для поиска
+    :return: Словарь {id задачи: ключ задачи} или None в случае ошибки
+    """
+    try:
+        logger.info(f"Поиск задач по запросу: {jql_query}")
+        issues = jira_client.search_issues(jql_query, maxResults=False, fields='key')
+        logger.info(f"Найдено {len(issues)} задач")
+        return {str(issue.id): issue.key for issue in issues}
+    except Exception as e:
+        logger.error(f"Ошибка при поиске задач: {str(e)}")
+        return None
+
+def worklog_to_record(raw, issue_key):
+    """
+    Преобразует worklog (словарь из REST API) в строку отчета
+    """
+    author = raw.get('author') or {}
+    return {
+        'issue': issue_key,
+        'id': str(raw.get('id', '')),
+        'author': author.get('displayName') or author.get('name', ''),
+        'author_name': author.get('name', ''),
+        'started': raw.get('started', ''),
+        'time_spent_seconds': raw.get('timeSpentSeconds', 0),
+        'comment': raw.get('comment') or '',
+    }
+
+def fetch_issue_worklogs(jira_client, issue_key):
+    """
+    Загружает worklog одной задачи
+    :return: Кортеж (ключ задачи, список словарей worklog)
+    """
+    worklogs = jira_client.worklogs(issue_key)
+    return issue_key, [worklog.raw for worklog in worklogs]
+
+def iter_worklogs_by_issues(jira_client, issue_keys, workers):
+    """
+    Параллельно загружает worklog задач и отдает их по мере готовности
+    :param jira_client: Объект клиента Jira
+    :param issue_keys: Список ключей задач
+    :param workers: Количество потоков
+    :return: Генератор кортежей (ключ задачи, словарь worklog)
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(fetch_issue_worklogs, jira_client, key): key for key in issue_keys}
+        
+        for future in as_completed(futures):
+            issue_key = futures[future]
+            try:
+                _, worklogs = future.result()
+            except Exception as e:
+                logger.error(f"ОШИБКА: Не удалось получить worklog задачи {issue_key}: {str(e)}")
+                continue
+            for raw in worklogs:
+                yield issue_key, raw
+
+def iter_updated_worklog_ids(jira_client, since_ms):
+    """
+    Обходит worklog/updated начиная с указанного момента
+    :param jira_client: Объект клиента Jira
+    :param since_ms: Момент времени в миллисекундах (epoch)
+    :return: Генератор ID worklog
+    """
+    since = since_ms
+    while True:
+        page = jira_client._get_json('worklog/updated', params={'since': since})
+        for value in page.get('values', []):
+            yield value['worklogId']
+        
+        if page.get('lastPage', True) or page.get('until') is None:
+            break
+        since = page['until']
+
+def fetch_worklog_list(jira_client, worklog_ids):
+    """
+    Загружает worklog пачкой через worklog/list
+    :param worklog_ids: Список ID (не более WORKLOG_LIST_CHUNK)
+    :return: Список словарей worklog
+    """
+    url = jira_client._get_url('worklog/list')
+    response = jira_client._session.post(url, data=json.dumps({'ids': worklog_ids}))
+    return response.json()
+
+def iter_worklogs_bulk(jira_client, issues_by_id, since_ms, workers):
+    """
+    Загружает измененные с since_ms worklog через bulk API и оставляет только
+    принадлежащие найденным задачам
+    :param jira_client: Объект клиента Jira
+    :param issues_by_id: Словарь {id задачи: ключ задачи}
+    :param since_ms: Момент времени в миллисекундах (epoch)
+    :param workers: Количество потоков
+    :return: Генератор кортежей (ключ задачи, словарь worklog)
+    """
+    def chunks():
+        chunk = []
+        for worklog_id in iter_updated_worklog_ids(jira_client, since_ms):
+            chunk.append(worklog_id)
+            if len(chunk) >= WORKLOG_LIST_CHUNK:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    
+    def finished(future):
+        try:
+            worklogs = future.result()
+        except Exception as e:
+            logger.error(f"ОШИБКА: Не удалось получить пачку worklog: {str(e)}")
+            return
+        for raw in worklogs:
+            issue_key = issues_by_id.get(str(raw.get('issueId')))
+            if issue_key:
+                yield issue_key, raw
+    
+    # Пачки отправляются в пул по мере обхода worklog/updated, готовые отдаются по порядку,
+    # не дожидаясь конца обхода; одновременно в работе не больше 2 x workers пачек
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for chunk in chunks():
+            pending.append(executor.submit(fetch_worklog_list, jira_client, chunk))
+            while pending and (pending[0].done() or len(pending) >= workers * 2):
+                yield from finished(pending.popleft())
+        while pending:
+            yield from finished(pending.popleft())
+
+def open_writer(output_format, stream):
+    """
+    Создает функцию потоковой записи строк отчета в CSV или JSON Lines
+    :param output_format: csv или json
+    :param stream: Открытый текстовый поток
+    :return: Функция записи одной строки
+    """
+    if output_format == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=OUTPUT_FIELDS)
+        writer.writeheader()
+        
+        def write(record):
+            writer.writerow(record)
+            stream.flush()
+    else:
+        def write(record):
+            stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+            stream.flush()
+    
+    return write
+
+def search_worklogs(jira_client, jql_query, pattern, write, workers=8, since_ms=None, started_from=None):
+    """
+    Ищет worklog по регулярному выражению во всех задачах, найденных по JQL
+    :param jira_client: Объект клиента Jira
+    :param jql_query: JQL запрос (желательно уже с условиями worklogComment/worklogAuthor)
+    :param pattern: Скомпилированное регулярное выражение для комментария
+    :param write: Функция записи строки отчета
+    :param workers: Количество потоков загрузки worklog
+    :param since_ms: Если указан - использовать bulk API worklog/updated + worklog/list
+    :param started_from: Дата начала worklog не ранее указанной, формат YYYY-MM-DD
+    :return: Кортеж (количество просмотренных worklog, количество найденных)
+    """
+    issues_by_id = search_issue_keys(jira_client, jql_query)
+    
+    if not issues_by_id:
+        logger.info(f"Не найдено задач по запросу: {jql_query}")
+        return 0, 0
+    
+    if since_ms is not None:
+        logger.info(f"Загрузка worklog через bulk API (since={since_ms})")
+        worklogs = iter_worklogs_bulk(jira_client, issues_by_id, since_ms, workers)
+    else:
+        logger.info(f"Загрузка worklog по задачам в {workers} потоков")
+        worklogs = iter_worklogs_by_issues(jira_client, list(issues_by_id.values()), workers)
+    
+    scanned_count = 0
+    matched_count = 0
+    
+    for issue_key, raw in worklogs:
+        # worklogDate в JQL отбирает задачи, в которых есть такие worklog, а не сами worklog
+        if started_from and (raw.get('started') or '')[:10] < started_from:
+            continue
+        scanned_count += 1
+        comment = raw.get('comment') or ''
+        if pattern.search(comment):
+            matched_count += 1
+            write(worklog_to_record(raw, issue_key))
+    
+    logger.info(f"Просмотрено worklog: {scanned_count}, найдено: {matched_count}")
+    return scanned_count, matched_count
+
+def parse_since(value):
+    """
+    Преобразует дату YYYY-MM-DD в миллисекунды epoch для worklog/updated
+    """
+    return int(datetime.strptime(value, '%Y-%m-%d').timestamp() * 1000)
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description='Поиск worklog по тексту комментария в задачах Jira',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  %(prog)s                                   # worklog с текстом "тест" в задаче SUP-7998
+  %(prog)s --issue SUP-1234
+  %(prog)s --jql "project = SUP" --text тест --format csv --output test.csv
+  %(prog)s --jql "project in (SUP, IW)" --author ivanov --since 2024-01-01
+  %(prog)s --jql "project = SUP" --started-from 2024-01-01
+  %(prog)s --mirror jira_mirror.db --projects SUP IW  # без запросов к Jira
+        """
+    )
+    parser.add_argument('--issue', type=str, default=None,
+                        help='Одна задача (старый режим вывода в лог, по умолчанию: SUP-7998)')
+    parser.add_argument('--jql', type=str, default=None,
+                        help='JQL запрос для отбора задач')
+    parser.add_argument('--pattern', type=str, default=DEFAULT_PATTERN,
+                        help='Регулярное выражение для комментария (по умолчанию: слово "тест")')
+    parser.add_argument('--text', type=str, default=None,
+                        help='Текст для серверного отбора задач (worklogComment ~)')
+    parser.add_argument('--author', type=str, default=None,
+                        help='Автор worklog для серверного отбора (worklogAuthor)')
+    parser.add_argument('--since', type=str, default=None,
+                        help='Дата YYYY-MM-DD: worklog измененные с этой даты, через bulk API')
+    parser.add_argument('--started-from', type=str, default=None,
+                        help='Дата YYYY-MM-DD: worklog, начатые с этой даты (worklogDate)')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='Количество потоков загрузки worklog (по умолчанию: 8)')
+    parser.add_argument('--format', type=str, choices=['csv', 'json'], default='csv',
+                        help='Формат вывода: csv или json (JSON Lines), по умолчанию: csv')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Файл отчета (по умолчанию: вывод в stdout)')
+    parser.add_argument('--mirror', type=str, default=None,
+                        help='Искать в локальном зеркале SQLite (см. jira_sync.py) вместо Jira')
+    parser.add_argument('--projects', nargs='*', default=None,
+                        help='Проекты для поиска в зеркале (по умолчанию: все)')
+    return parser.parse_args()
+
+def search_worklogs_in_mirror(db_path, pattern, write, projects=None, author=None):
+    """
+    Ищет worklog по регулярному выражению в локальном зеркале
+    :return: Количество найденных worklog
+    """
+    from jira_sync import open_mirror, mirror_find_worklogs
+    
+    conn = open_mirror(db_path)
+    try:
+        matched_count = 0
+        for record in mirror_find_worklogs(conn, pattern, projects, author):
+            matched_count += 1
+            write(record)
+        return matched_count
+    finally:
+        conn.close()
+
 def main():
+    args = parse_arguments()
+    
+    # Загрузка переменных и настройка логирования (LOG_DIR, LOG_FILE)
+    load_dotenv('jira_change_worklog.env')
+    setup_logging()
+    
     logger.info("=== Запуск скрипта работы с Jira ===")
     
     try:
@@ -136,19 +372,61 @@ def main():
         load_dotenv('jira_assigne.env')
         logger.info("Переменные окружения загружены")
         
+        if args.mirror:
+            # Поиск в локальном зеркале без подключения к Jira
+            stream = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+            try:
+                write = open_writer(args.format, stream)
+                matched = search_worklogs_in_mirror(
+                    args.mirror, args.pattern, write,
+                    projects=args.projects,
+                    author=args.author
+                )
+            finally:
+                if args.output:
+                    stream.close()
+            logger.info(f"Найдено worklog в зеркале {args.mirror}: {matched}")
+            return
+        
         # Подключение к Jira
         try:
-            jira = JIRA(
-                server=os.getenv('JIRA_SERVER'),
-                token_auth=os.getenv('JIRA_ACCESS_TOKEN')
-            )
-            logger.info(f"Успешное подключение к Jira: {os.getenv('JIRA_SERVER')}")
+            jira = connect_jira(pool_size=args.workers)
         except Exception as e:
             logger.error(f"Ошибка подключения к Jira: {str(e)}")
             sys.exit(1)
         
-        # 1. Вывод worklog из задачи SUP-7998 с текстом "тест"
-        print_worklogs_with_test_text(jira, "SUP-7998")
+        if not args.jql:
+            # 1. Вывод worklog одной задачи с текстом "тест"
+            print_worklogs_with_test_text(jira, args.issue or "SUP-7998")
+        else:
+            # 2. Поиск worklog по JQL с потоковым выводом отчета
+            jql_query = build_worklog_jql(
+                args.jql,
+                text=args.text,
+                author=args.author,
+                date_from=args.started_from
+            )
+            pattern = re.compile(args.pattern, re.IGNORECASE)
+            since_ms = parse_since(args.since) if args.since else None
+            
+            stream = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+            try:
+                write = open_writer(args.format, stream)
+                scanned, matched = search_worklogs(
+                    jira, jql_query, pattern, write,
+                    workers=args.workers,
+                    since_ms=since_ms,
+                    started_from=args.started_from
+                )
+            finally:
+                if args.output:
+                    stream.close()
+            
+            logger.info(f"\nИтоги поиска:")
+            logger.info(f"Просмотрено worklog: {scanned}")
+            logger.info(f"Найдено worklog: {matched}")
+            if args.output:
+                logger.info(f"Отчет сохранен в {args.output}")
         
     except Exception as e:
         logger.error(f"Общая ошибка: {str(e)}")
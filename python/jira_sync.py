@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Локальное зеркало задач, истории изменений и worklog Jira в SQLite
+Первая синхронизация загружает все задачи проектов, последующие - только изменения:
+задачи по условию updated >= lastSync, worklog через курсор worklog/updated
+"""
+
+import logging
+from datetime import datetime, timedelta
+import os
+import sys
+import argparse
+import json
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+from jira_common import setup_logging, connect_jira
+
+# Максимальное количество ID в одном запросе worklog/list (ограничение Jira)
+WORKLOG_LIST_CHUNK = 1000
+
+# Размер страницы поиска задач
+SEARCH_PAGE_SIZE = 100
+
+# Значения assignee, которые не считаются человеком
+NOT_HUMAN_ASSIGNEES = ('Не назначен', 'robot')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS issues (
+    id          TEXT PRIMARY KEY,
+    key         TEXT UNIQUE NOT NULL,
+    project     TEXT NOT NULL,
+    summary     TEXT,
+    status      TEXT,
+    assignee    TEXT,
+    labels      TEXT,
+    resolved    TEXT,
+    updated     TEXT
+);
+CREATE INDEX IF NOT EXISTS issues_project ON issues(project);
+CREATE INDEX IF NOT EXISTS issues_assignee ON issues(assignee);
+
+CREATE TABLE IF NOT EXISTS changelog (
+    history_id  TEXT NOT NULL,
+    issue_id    TEXT NOT NULL,
+    created     TEXT,
+    author      TEXT,
+    field       TEXT NOT NULL,
+    from_string TEXT,
+    to_string   TEXT,
+    item_no     INTEGER NOT NULL,
+    PRIMARY KEY (history_id, item_no)
+);
+CREATE INDEX IF NOT EXISTS changelog_issue_field ON changelog(issue_id, field, created);
+
+CREATE TABLE IF NOT EXISTS worklogs (
+    id                  TEXT PRIMARY KEY,
+    issue_id            TEXT NOT NULL,
+    author_name         TEXT,
+    author_display      TEXT,
+    started             TEXT,
+    time_spent_seconds  INTEGER,
+    comment             TEXT,
+    updated             TEXT
+);
+CREATE INDEX IF NOT EXISTS worklogs_issue ON worklogs(issue_id);
+CREATE INDEX IF NOT EXISTS worklogs_author ON worklogs(author_name);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    name    TEXT PRIMARY KEY,
+    value   TEXT
+);
+"""
+
+logger = logging.getLogger()
+
+# ============================================================================
+# Работа с базой зеркала
+# ============================================================================
+def open_mirror(db_path):
+    """
+    Открывает (и при необходимости создает) базу зеркала
+    :param db_path: Путь к файлу SQLite
+    :return: Соединение sqlite3 с зарегистрированной функцией REGEXP
+    """
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(SCHEMA)
+
+    patterns = {}
+
+    def regexp(pattern, value):
+        if value is None:
+            return False
+        compiled = patterns.get(pattern)
+        if compiled is None:
+            compiled = patterns[pattern] = re.compile(pattern, re.IGNORECASE)
+        return compiled.search(value) is not None
+
+    conn.create_function('REGEXP', 2, regexp, deterministic=True)
+    return conn
+
+def get_state(conn, name, default=None):
+    row = conn.execute('SELECT value FROM sync_state WHERE name = ?', (name,)).fetchone()
+    return row[0] if row else default
+
+def set_state(conn, name, value):
+    conn.execute(
+        'INSERT INTO sync_state(name, value) VALUES (?, ?) '
+        'ON CONFLICT(name) DO UPDATE SET value = excluded.value',
+        (name, str(value))
+    )
+
+def store_issue(conn, raw):
+    """
+    Сохраняет задачу и ее историю изменений (словарь из REST API, expand=changelog)
+    """
+    fields = raw.get('fields') or {}
+    assignee = fields.get('assignee') or {}
+    status = fields.get('status') or {}
+    project = fields.get('project') or {}
+
+    conn.execute(
+        'INSERT OR REPLACE INTO issues(id, key, project, summary, status, assignee, labels, resolved, updated) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (
+            str(raw['id']), raw['key'], project.get('key', raw['key'].split('-')[0]),
+            fields.get('summary'), status.get('name'), assignee.get('name'),
+            json.dumps(fields.get('labels') or [], ensure_ascii=False),
+            fields.get('resolutiondate'), fields.get('updated'),
+        )
+    )
+
+    histories = (raw.get('changelog') or {}).get('histories') or []
+    rows = []
+    for history in histories:
+        author = history.get('author') or {}
+        for item_no, item in enumerate(history.get('items') or []):
+            rows.append((
+                str(history['id']), str(raw['id']), history.get('created'), author.get('name'),
+                item.get('field'), item.get('fromString'), item.get('toString'), item_no,
+            ))
+    if rows:
+        conn.executemany(
+            'INSERT OR REPLACE INTO changelog(history_id, issue_id, created, author, field, '
+            'from_string, to_string, item_no) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            rows
+        )
+
+def store_worklogs(conn, worklogs):
+    """
+    Сохраняет worklog (словари из REST API)
+    """
+    rows = []
+    for raw in worklogs:
+        author = raw.get('author') or {}
+        rows.append((
+            str(raw['id']), str(raw['issueId']), author.get('name'), author.get('displayName'),
+            raw.get('started'), raw.get('timeSpentSeconds'), raw.get('comment'), raw.get('updated'),
+        ))
+    conn.executemany(
+        'INSERT OR REPLACE INTO worklogs(id, issue_id, author_name, author_display, started, '
+        'time_spent_seconds, comment, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        rows
+    )
+    return len(rows)
+
+# ============================================================================
+# Загрузка данных из Jira
+# ============================================================================
+def iter_issues_raw(jira_client, jql_query):
+    """
+    Постранично загружает задачи с историей изменений
+    :return: Генератор словарей задач из REST API
+    """
+    start_at = 0
+    while True:
+        page = jira_client.search_issues(
+            jql_query,
+            startAt=start_at,
+            maxResults=SEARCH_PAGE_SIZE,
+            fields='summary,status,assignee,labels,project,resolutiondate,updated',
+            expand='changelog',
+            json_result=True
+        )
+        issues = page.get('issues', [])
+        for raw in issues:
+            yield raw
+
+        start_at += len(issues)
+        if not issues or start_at >= page.get('total', 0):
+            break
+
+def fetch_issue_worklogs(jira_client, issue_key):
+    return [worklog.raw for worklog in jira_client.worklogs(issue_key)]
+
+def iter_worklog_cursor(jira_client, endpoint, since_ms):
+    """
+    Обходит worklog/updated или worklog/deleted начиная с курсора
+    :return: Кортеж (список ID worklog, новый курсор)
+    """
+    ids = []
+    since = since_ms
+    while True:
+        page = jira_client._get_json(endpoint, params={'since': since})
+        ids.extend(value['worklogId'] for value in page.get('values', []))
+        if page.get('until') is not None:
+            since = page['until']
+        if page.get('lastPage', True):
+            break
+    return ids, since
+
+def fetch_worklog_list(jira_client, worklog_ids):
+    url = jira_client._get_url('worklog/list')
+    response = jira_client._session.post(url, data=json.dumps({'ids': worklog_ids}))
+    return response.json()
+
+def sync_projects(jira_client, conn, projects, workers=8, overlap_minutes=60):
+    """
+    Синхронизирует зеркало для указанных проектов
+    :param jira_client: Объект клиента Jira
+    :param conn: Соединение с базой зеркала
+    :param projects: Список ключей проектов
+    :param workers: Количество потоков загрузки worklog
+    :param overlap_minutes: Перекрытие окна updated >= lastSync (запас на расхождение часов)
+    :return: Кортеж (количество задач, количество worklog)
+    """
+    sync_started = datetime.now()
+    sync_started_ms = int(time.time() * 1000)
+    issues_count = 0
+    worklogs_count = 0
+
+    first_sync_issues = []
+    for project in projects:
+        last_sync = get_state(conn, f'issues_last_sync:{project}')
+        jql_query = f'project = "{project}"'
+        if last_sync:
+            jql_query += f' AND updated >= "{last_sync}"'
+
+        logger.info(f"Синхронизация задач: {jql_query}")
+        project_count = 0
+        for raw in iter_issues_raw(jira_client, jql_query):
+            store_issue(conn, raw)
+            project_count += 1
+            if not last_sync:
+                first_sync_issues.append(raw['key'])
+        conn.commit()
+        logger.info(f"Проект {project}: сохранено задач {project_count}")
+        issues_count += project_count
+
+        window_start = sync_started - timedelta(minutes=overlap_minutes)
+        set_state(conn, f'issues_last_sync:{project}', window_start.strftime('%Y/%m/%d %H:%M'))
+
+    # Первая синхронизация проекта: worklog загружаются по задачам
+    if first_sync_issues:
+        logger.info(f"Первичная загрузка worklog для {len(first_sync_issues)} задач в {workers} потоков")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(fetch_issue_worklogs, jira_client, key): key for key in first_sync_issues}
+            for future in as_completed(futures):
+                try:
+                    worklogs_count += store_worklogs(conn, future.result())
+                except Exception as e:
+                    logger.error(f"ОШИБКА: Не удалось получить worklog задачи {futures[future]}: {str(e)}")
+        conn.commit()
+
+    # Инкрементальная загрузка worklog через курсор worklog/updated
+    cursor = get_state(conn, 'worklog_cursor')
+    if cursor is not None:
+        known_issue_ids = {row[0] for row in conn.execute('SELECT id FROM issues')}
+
+        updated_ids, new_cursor = iter_worklog_cursor(jira_client, 'worklog/updated', int(cursor))
+        logger.info(f"Изменено worklog с курсора {cursor}: {len(updated_ids)}")
+        chunks = [updated_ids[i:i + WORKLOG_LIST_CHUNK] for i in range(0, len(updated_ids), WORKLOG_LIST_CHUNK)]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for worklogs in executor.map(lambda chunk: fetch_worklog_list(jira_client, chunk), chunks):
+                relevant = [raw for raw in worklogs if str(raw.get('issueId')) in known_issue_ids]
+                worklogs_count += store_worklogs(conn, relevant)
+
+        deleted_ids, _ = iter_worklog_cursor(jira_client, 'worklog/deleted', int(cursor))
+        if deleted_ids:
+            conn.executemany('DELETE FROM worklogs WHERE id = ?', [(str(i),) for i in deleted_ids])
+            logger.info(f"Удалено worklog: {len(deleted_ids)}")
+
+        set_state(conn, 'worklog_cursor', new_cursor)
+    else:
+        set_state(conn, 'worklog_cursor', sync_started_ms)
+
+    set_state(conn, 'last_sync', sync_started.isoformat(timespec='seconds'))
+    conn.commit()
+    return issues_count, worklogs_count
+
+# ============================================================================
+# Запросы к зеркалу
+# ============================================================================
+def mirror_find_worklogs(conn, pattern, projects=None, author=None):
+    """
+    Поиск worklog по регулярному выражению в комментарии
+    :param conn: Соединение с базой зеркала
+    :param pattern: Регулярное выражение (без учета регистра)
+    :param projects: Ограничение по проектам
+    :param author: Ограничение по автору (логин)
+    :return: Генератор словарей в формате отчета jira_look_text_in_worklog
+    """
+    sql = (
+        'SELECT i.key, w.id, w.author_display, w.author_name, w.started, w.time_spent_seconds, w.comment '
+        'FROM worklogs w JOIN issues i ON i.id = w.issue_id WHERE w.comment REGEXP ?'
+    )
+    params = [pattern]
+    if projects:
+        sql += f" AND i.project IN ({','.join('?' * len(projects))})"
+        params.extend(projects)
+    if author:
+        sql += ' AND w.author_name = ?'
+        params.append(author)
+    sql += ' ORDER BY i.key, w.started'
+
+    for row in conn.execute(sql, params):
+        yield {
+            'issue': row[0],
+            'id': row[1],
+            'author': row[2] or row[3] or '',
+            'author_name': row[3] or '',
+            'started': row[4] or '',
+            'time_spent_seconds': row[5] or 0,
+            'comment': row[6] or '',
+        }
+
+def mirror_last_human_assignee(conn, issue_key):
+    """
+    Последний назначенный человек по истории изменений задачи
+    (та же логика, что в reassign_to_last_human из jira_assigne.py)
+    :return: Отображаемое имя или None
+    """
+    row = conn.execute(
+        'SELECT c.to_string FROM changelog c JOIN issues i ON i.id = c.issue_id '
+        'WHERE i.key = ? AND c.field = ? AND c.to_string IS NOT NULL AND c.to_string != ? '
+        'AND lower(c.to_string) != ? '
+        'ORDER BY c.created DESC, CAST(c.history_id AS INTEGER) DESC, c.item_no LIMIT 1',
+        (issue_key, 'assignee', NOT_HUMAN_ASSIGNEES[0], NOT_HUMAN_ASSIGNEES[1])
+    ).fetchone()
+    return row[0] if row else None
+
+def mirror_issues_by_last_human(conn, last_human=None, assignee=None, unresolved=True):
+    """
+    Задачи с последним назначенным человеком
+    :param last_human: Отобрать задачи, где последний человек - указанный (displayName)
+    :param assignee: Отобрать задачи с текущим assignee (логин), например robot
+    :param unresolved: Только нерешенные задачи
+    :return: Генератор кортежей (ключ задачи, текущий assignee, последний человек)
+    """
+    sql = 'SELECT key, assignee FROM issues WHERE 1 = 1'
+    params = []
+    if assignee:
+        sql += ' AND assignee = ?'
+        params.append(assignee)
+    if unresolved:
+        sql += ' AND resolved IS NULL'
+
+    for issue_key, current in conn.execute(sql, params).fetchall():
+        human = mirror_last_human_assignee(conn, issue_key)
+        if last_human is None or human == last_human:
+            yield issue_key, current, human
+
+# ============================================================================
+# Основная функция
+# ============================================================================
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description='Локальное зеркало Jira в SQLite',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  %(prog)s sync --projects SUP IW
+  %(prog)s worklogs --pattern "тест" --projects SUP
+  %(prog)s last-assignee --assignee robot
+  %(prog)s last-assignee --last-human "Иванов Иван"
+        """
+    )
+    parser.add_argument('--db', type=str, default=None,
+                        help='Файл базы зеркала (по умолчанию: $JIRA_MIRROR_DB или jira_mirror.db)')
+    parser.add_argument('--env-file', type=str, default='jira_assigne.env',
+                        help='Файл с переменными окружения (по умолчанию: jira_assigne.env)')
+
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    sync_parser = subparsers.add_parser('sync', help='Синхронизировать зеркало')
+    sync_parser.add_argument('--projects', nargs='+', required=True, help='Ключи проектов')
+    sync_parser.add_argument('--workers', type=int, default=8, help='Потоков загрузки worklog')
+    sync_parser.add_argument('--overlap', type=int, default=60,
+                             help='Перекрытие окна синхронизации в минутах (по умолчанию: 60)')
+
+    worklogs_parser = subparsers.add_parser('worklogs', help='Worklog, содержащие текст')
+    worklogs_parser.add_argument('--pattern', type=str, required=True, help='Регулярное выражение')
+    worklogs_parser.add_argument('--projects', nargs='*', default=None, help='Ключи проектов')
+    worklogs_parser.add_argument('--author', type=str, default=None, help='Автор worklog (логин)')
+
+    assignee_parser = subparsers.add_parser('last-assignee', help='Последний назначенный человек')
+    assignee_parser.add_argument('--assignee', type=str, default=None, help='Текущий assignee (логин)')
+    assignee_parser.add_argument('--last-human', type=str, default=None, help='Последний человек (имя)')
+    assignee_parser.add_argument('--all', action='store_true', help='Включая решенные задачи')
+
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+    load_dotenv(args.env_file)
+
+    setup_logging()
+
+    db_path = args.db or os.getenv('JIRA_MIRROR_DB', 'jira_mirror.db')
+    conn = open_mirror(db_path)
+
+    try:
+        if args.command == 'sync':
+            logger.info(f"=== Синхронизация зеркала Jira: {db_path} ===")
+            try:
+                jira = connect_jira(pool_size=args.workers)
+            except Exception as e:
+                logger.error(f"Ошибка подключения к Jira: {str(e)}")
+                sys.exit(1)
+
+            try:
+                start = time.perf_counter()
+                issues_count, worklogs_count = sync_projects(
+                    jira, conn, args.projects, workers=args.workers, overlap_minutes=args.overlap
+                )
+                logger.info(f"Итоги синхронизации: задач {issues_count}, worklog {worklogs_count}, "
+                            f"время {time.perf_counter() - start:.1f} сек")
+            finally:
+                jira.close()
+
+        elif args.command == 'worklogs':
+            for record in mirror_find_worklogs(conn, args.pattern, args.projects, args.author):
+                print(json.dumps(record, ensure_ascii=False))
+
+        elif args.command == 'last-assignee':
+            for issue_key, current, human in mirror_issues_by_last_human(
+                    conn, last_human=args.last_human, assignee=args.assignee, unresolved=not args.all):
+                print(f"{issue_key}\t{current or '-'}\t{human or '-'}")
+
+    except Exception as e:
+        logger.error(f"Общая ошибка: {str(e)}")
+        sys.exit(1)
+
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Единая утилита для операций с Jira (jira-tool)
+Все операции выполняются в одном процессе через один клиент Jira с пулом
+keep-alive соединений; пакет операций можно описать в YAML и повторять по интервалу
+"""
+
+import logging
+import os
+import sys
+import argparse
+import re
+import time
+from jira_common import setup_logging, load_env, connect_jira, CallStats, TimedJira, RequestStats
+from jira_assigne import (
+    MIRROR_MAX_AGE_MINUTES, update_labels_to_2line, clear_assignee, reassign_to_last_human, transition_issues_to_todo
+)
+from jira_change_worklog import transfer_worklogs_batch
+from jira_look_text_in_worklog import (
+    DEFAULT_PATTERN, build_worklog_jql, open_writer, parse_since, search_worklogs
+)
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+logger = logging.getLogger()
+
+# Параметры операций по умолчанию (те же, что в исходных скриптах)
+OPERATION_DEFAULTS = {
+    'labels': {
+        'jql': 'resolved is EMPTY AND labels = 1Линия AND updatedDate <= startOfDay(-4)',
+    },
+    'assign': {
+        'jql': 'resolved is EMPTY AND assignee = robot',
+        'mode': 'last-human',
+        'mirror': None,
+        'mirror_max_age': MIRROR_MAX_AGE_MINUTES,
+    },
+    'transition': {
+        'jql': 'status = "In Progress" AND updatedDate <= startOfDay(-3)',
+    },
+    'worklog-move': {
+        'source': 'SUP-7998',
+        'target': 'IW-405',
+        'no_delete': False,
+        'workers': 4,
+        'journal': None,
+    },
+    'worklog-find': {
+        'jql': None,
+        'pattern': DEFAULT_PATTERN,
+        'text': None,
+        'author': None,
+        'since': None,
+        'started_from': None,
+        'workers': 8,
+        'format': 'csv',
+        'output': None,
+    },
+}
+
+# ============================================================================
+# Операции
+# ============================================================================
+def run_worklog_find(jira_client, params):
+    if not params['jql']:
+        raise ValueError("Для worklog-find нужен параметр jql")
+
+    jql_query = build_worklog_jql(
+        params['jql'],
+        text=params['text'],
+        author=params['author'],
+        date_from=params['started_from']
+    )
+    pattern = re.compile(params['pattern'], re.IGNORECASE)
+    since_ms = parse_since(params['since']) if params['since'] else None
+
+    output = params['output']
+    stream = open(output, 'w', encoding='utf-8', newline='') if output else sys.stdout
+    try:
+        write = open_writer(params['format'], stream)
+        return search_worklogs(jira_client, jql_query, pattern, write,
+                               workers=params['workers'], since_ms=since_ms,
+                               started_from=params['started_from'])
+    finally:
+        if output:
+            stream.close()
+
+def run_operation(jira_client, name, params):
+    """
+    Выполняет одну операцию
+    :param jira_client: Объект клиента Jira
+    :param name: Имя операции (labels, assign, transition, worklog-move, worklog-find)
+    :param params: Параметры операции (недостающие берутся из OPERATION_DEFAULTS)
+    :return: Результат функции операции (обычно кортеж счетчиков)
+    """
+    if name not in OPERATION_DEFAULTS:
+        raise ValueError(f"Неизвестная операция: {name}")
+
+    merged = dict(OPERATION_DEFAULTS[name])
+    for key, value in params.items():
+        key = key.replace('-', '_')
+        if key in merged and value is not None:
+            merged[key] = value
+
+    if name == 'labels':
+        return update_labels_to_2line(jira_client, merged['jql'])
+
+    if name == 'assign':
+        if merged['mode'] == 'clear':
+            return clear_assignee(jira_client, merged['jql'])
+        return reassign_to_last_human(jira_client, merged['jql'],
+                                      mirror_db=merged['mirror'], mirror_max_age=merged['mirror_max_age'])
+
+    if name == 'transition':
+        return transition_issues_to_todo(jira_client, merged['jql'])
+
+    if name == 'worklog-move':
+        journal_path = merged['journal'] or os.path.join(
+            os.getenv('BACKUP_DIR', '/tmp/jira_backup'),
+            f"worklog_transfer_{merged['source']}_{merged['target']}.jsonl"
+        )
+        os.makedirs(os.path.dirname(journal_path) or '.', exist_ok=True)
+        return transfer_worklogs_batch(
+            jira_client, merged['source'], merged['target'], journal_path,
+            delete_original=not merged['no_delete'],
+            workers=merged['workers']
+        )
+
+    return run_worklog_find(jira_client, merged)
+
+def load_batch(batch_file):
+    """
+    Читает пакет операций из YAML
+    Формат: список (или ключ operations со списком) словарей с ключом op и параметрами операции
+    :return: Список кортежей (имя операции, параметры)
+    """
+    if yaml is None:
+        logger.error("Для пакетного режима установите PyYAML: pip install pyyaml")
+        sys.exit(1)
+
+    with open(batch_file, 'r', encoding='utf-8') as f:
+        data = yaml.safe_load(f) or []
+
+    if isinstance(data, dict):
+        data = data.get('operations', [])
+
+    operations = []
+    for item in data:
+        params = dict(item)
+        name = params.pop('op')
+        if name not in OPERATION_DEFAULTS:
+            raise ValueError(f"Неизвестная операция в {batch_file}: {name}")
+        operations.append((name, params))
+    return operations
+
+def run_batch(jira_client, operations, stats):
+    """
+    Выполняет операции пакета последовательно; ошибка одной операции не останавливает остальные
+    :return: Количество операций, завершившихся ошибкой
+    """
+    failed = 0
+    for name, params in operations:
+        logger.info(f"\n=== Операция {name} {params} ===")
+        start = time.perf_counter()
+        try:
+            result = run_operation(jira_client, name, params)
+            logger.info(f"Результат {name}: {result}")
+        except Exception as e:
+            logger.error(f"ОШИБКА: Операция {name} завершилась с ошибкой: {str(e)}")
+            failed += 1
+        finally:
+            stats.record(f"операция {name}", time.perf_counter() - start)
+    return failed
+
+# ============================================================================
+# Основная функция
+# ============================================================================
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        prog='jira-tool',
+        description='Операции с Jira в одном процессе с общим пулом соединений',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Примеры использования:
+  %(prog)s assign
+  %(prog)s labels --jql "resolved is EMPTY AND labels = 1Линия"
+  %(prog)s worklog-move --source SUP-7998 --target IW-405 --workers 8
+  %(prog)s worklog-find --jql "project = SUP" --text тест --output test.csv
+  %(prog)s batch nightly.yaml
+  %(prog)s batch nightly.yaml --interval 600   # режим демона
+
+Пример nightly.yaml:
+  operations:
+    - op: assign
+    - op: labels
+    - op: transition
+      jql: status = "In Progress" AND updatedDate <= startOfDay(-5)
+        """
+    )
+    parser.add_argument('--env-file', type=str, default='jira_assigne.env',
+                        help='Файл с переменными окружения (по умолчанию: jira_assigne.env)')
+    parser.add_argument('--pool-size', type=int, default=16,
+                        help='Размер пула соединений с Jira (по умолчанию: 16)')
+    parser.add_argument('--prom-file', type=str, default=None,
+                        help='Файл метрик Prometheus textfile (по умолчанию: $JIRA_PROM_TEXTFILE)')
+
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    labels_parser = subparsers.add_parser('labels', help='Замена метки 1Линия на 2линия')
+    labels_parser.add_argument('--jql', type=str)
+
+    assign_parser = subparsers.add_parser('assign', help='Переназначение на последнего человека или очистка')
+    assign_parser.add_argument('--jql', type=str)
+    assign_parser.add_argument('--mode', choices=['last-human', 'clear'])
+    assign_parser.add_argument('--mirror', type=str, help='Локальное зеркало (jira_sync.py)')
+    assign_parser.add_argument('--mirror-max-age', type=int,
+                               help=f'Максимальный возраст зеркала, минут (по умолчанию: {MIRROR_MAX_AGE_MINUTES})')
+
+    transition_parser = subparsers.add_parser('transition', help="Перевод задач в 'To Do'")
+    transition_parser.add_argument('--jql', type=str)
+
+    move_parser = subparsers.add_parser('worklog-move', help='Пакетный перенос worklog с журналом')
+    move_parser.add_argument('--source', type=str)
+    move_parser.add_argument('--target', type=str)
+    move_parser.add_argument('--no-delete', action='store_true', default=None)
+    move_parser.add_argument('--workers', type=int)
+    move_parser.add_argument('--journal', type=str)
+
+    find_parser = subparsers.add_parser('worklog-find', help='Поиск worklog по тексту')
+    find_parser.add_argument('--jql', type=str, required=True)
+    find_parser.add_argument('--pattern', type=str)
+    find_parser.add_argument('--text', type=str)
+    find_parser.add_argument('--author', type=str)
+    find_parser.add_argument('--since', type=str)
+    find_parser.add_argument('--started-from', type=str)
+    find_parser.add_argument('--workers', type=int)
+    find_parser.add_argument('--format', choices=['csv', 'json'])
+    find_parser.add_argument('--output', type=str)
+
+    batch_parser = subparsers.add_parser('batch', help='Пакет операций из YAML')
+    batch_parser.add_argument('batch_file', type=str, help='YAML файл с операциями')
+    batch_parser.add_argument('--interval', type=int, default=0,
+                              help='Повторять пакет каждые N секунд (0 - выполнить один раз)')
+
+    return parser.parse_args()
+
+def main():
+    args = parse_arguments()
+
+    load_env(args.env_file)
+    setup_logging()
+
+    logger.info(f"=== jira-tool {args.command} ===")
+
+    if args.command == 'batch':
+        operations = load_batch(args.batch_file)
+    else:
+        params = {key: value for key, value in vars(args).items()
+                  if key not in ('command', 'env_file', 'pool_size', 'prom_file')}
+        operations = [(args.command, params)]
+
+    request_stats = RequestStats()
+    try:
+        jira = connect_jira(pool_size=args.pool_size, request_stats=request_stats)
+    except Exception as e:
+        logger.error(f"Ошибка подключения к Jira: {str(e)}")
+        sys.exit(1)
+
+    stats = CallStats()
+    client = TimedJira(jira, stats)
+    failed = 0
+
+    try:
+        while True:
+            failed = run_batch(client, operations, stats)
+            if args.command != 'batch' or not args.interval:
+                break
+            logger.info(f"Следующий запуск пакета через {args.interval} сек")
+            time.sleep(args.interval)
+
+    except KeyboardInterrupt:
+        logger.info("Прерывание пользователем")
+
+    finally:
+        stats.log_summary()
+        request_stats.log_summary()
+        prom_path = args.prom_file or os.getenv('JIRA_PROM_TEXTFILE')
+        if prom_path:
+            try:
+                request_stats.write_prometheus(prom_path, job='jira_tool')
+            except Exception as e:
+                logger.error(f"Ошибка записи метрик Prometheus: {str(e)}")
+        jira.close()
+        logger.info("Сессия Jira закрыта")
+        logger.info("=== Завершение работы jira-tool ===\n")
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()